@@ -4,6 +4,12 @@
 #define DHTPIN 14     // Digital pin connected to the DHT sensor 
 #define DHTTYPE    DHT22     // DHT 22 (AM2302)
 
+// Number of readings sent per request. 1 sends every reading right away with
+// PUT /sensor-status, more buffer readings and POST them to /sensor-status/batch.
+#define BATCH_SIZE 1
+#define READ_INTERVAL_MS 2000 // time between two readings
+#define NTP_SERVER "pool.ntp.org" // used to timestamp batched readings
+
 #ifndef STASSID
 #define STASSID "SSID"
 #define STAPSK "Password"
@@ -7,6 +7,7 @@
 #include <Esp.h>
 #include <ESP8266WiFi.h>
 #include <ESP8266HTTPClient.h>
+#include <time.h>
 #include "Config.h"
 
 // DHT22 sensor
@@ -21,6 +22,14 @@ String name = "Name";
 Adafruit_AHTX0 aht;
 DHT dht(DHTPIN, DHTTYPE);
 
+// Kept between requests so the TLS connection can be reused (keep-alive)
+WiFiClientSecure client;
+HTTPClient http;
+
+// Readings waiting to be sent when BATCH_SIZE > 1, in line protocol
+String batch = "";
+int batchCount = 0;
+
 void setup() {
   // ESP.wdtEnable(0);
   Serial.begin(115200);
@@ -46,6 +55,77 @@ void setup() {
   Serial.println("");
   Serial.print("Connected! IP address: ");
   Serial.println(WiFi.localIP());
+
+  client.setInsecure();
+  http.setReuse(true);
+  if (BATCH_SIZE > 1) {
+    configTime(0, 0, NTP_SERVER);
+  }
+}
+
+// Escapes spaces, commas and backslashes in the sensor name for line protocol
+String escapedName() {
+  String escaped = "";
+  for (unsigned int i = 0; i < name.length(); i++) {
+    char c = name[i];
+    if (c == ' ' || c == ',' || c == '\\') {
+      escaped += '\\';
+    }
+    escaped += c;
+  }
+  return escaped;
+}
+
+// Sends a request and prints the result. Returns the HTTP code, negative on error.
+int sendRequest(const char* method, const String& url, const String& body, const char* contentType) {
+  Serial.printf("[HTTP] %s...\n", method);
+  if (!http.begin(client, url)) {
+    Serial.println("[HTTP] Unable to connect");
+    return -1;
+  }
+  http.addHeader("Content-Type", contentType);
+  int httpCode = http.sendRequest(method, body);
+  // httpCode will be negative on error
+  if (httpCode > 0) {
+    // HTTP header has been send and Server response header has been handled
+    Serial.printf("[HTTP] %s... code: %d\n", method, httpCode);
+
+    if (httpCode == HTTP_CODE_OK) {
+      const String& payload = http.getString();
+      Serial.println("received payload:\n<<");
+      Serial.println(payload);
+      Serial.println(">>");
+    }
+  } else {
+    Serial.printf("[HTTP] %s... failed, error: %s\n", method, http.errorToString(httpCode).c_str());
+  }
+  http.end();
+  return httpCode;
+}
+
+void sendReading(float tf, float h) {
+  if (BATCH_SIZE <= 1) {
+    sendRequest("PUT", "https://" SERVER_IP "/sensor-status?name=" + name + "&temperature=" + String(tf) + "&humidity=" + String(h), "", "application/json");
+    return;
+  }
+
+  batch += escapedName() + " temperature=" + String(tf) + ",humidity=" + String(h);
+  time_t now = time(nullptr);
+  if (now > 1000000000) { // only once NTP has set the clock
+    batch += " " + String((unsigned long) now);
+  }
+  batch += "\n";
+  batchCount++;
+
+  if (batchCount >= BATCH_SIZE) {
+    int httpCode = sendRequest("POST", "https://" SERVER_IP "/sensor-status/batch", batch, "text/plain");
+    // Keep the readings for the next attempt unless the server answered,
+    // but never buffer more than two batches.
+    if (httpCode > 0 || batchCount >= 2 * BATCH_SIZE) {
+      batch = "";
+      batchCount = 0;
+    }
+  }
 }
 
 void loop() {
@@ -73,37 +153,9 @@ void loop() {
       Serial.println("F ");
       Serial.print("Humidity ");
       Serial.println(h);
-      WiFiClientSecure client;
-      HTTPClient http;
-
-      client.setInsecure();
-
-      Serial.print("[HTTP] begin...\n");
-      http.begin(client, "https://" SERVER_IP "/sensor-status?name=" + name + "&temperature=" + String(tf) + "&humidity=" + String(h));  // HTTP
-      http.addHeader("Content-Type", "application/json");
-
-      Serial.print("[HTTP] PUT...\n");
-      // start connection and send HTTP header and body
-      // int httpCode = http.POST("{\"hello\":\"world\"}");
-      int httpCode = http.PUT("");
-      // httpCode will be negative on error
-      if (httpCode > 0) {
-        // HTTP header has been send and Server response header has been handled
-        Serial.printf("[HTTP] PUT... code: %d\n", httpCode);
-
-        if (httpCode == HTTP_CODE_OK) {
-          const String& payload = http.getString();
-          Serial.println("received payload:\n<<");
-          Serial.println(payload);
-          Serial.println(">>");
-        }
-      } else {
-        Serial.printf("[HTTP] PUT... failed, error: %s\n", http.errorToString(httpCode).c_str());
-      }
-
-      http.end();
+      sendReading(tf, h);
     }
   }
 
-  delay(2000);
+  delay(READ_INTERVAL_MS);
 }
@@ -0,0 +1,190 @@
+"""
+Load-tests the daemon's API and control loop in one process.
+
+Runs the app with its lifespan, the Mock GPIO and a `Database` whose flushes
+discard the rows, and drives it through httpx's ASGI transport for
+`--seconds`:
+ - `--sensors` sensors each PUT /sensor-status every `--sensor-interval` seconds
+ - `--clients` dashboards each GET / and /history every `--poll-interval` seconds
+
+Reports p50/p99 latency per route in milliseconds, requests per second,
+event-loop lag from a task that sleeps 10 ms at a time, CPU utilization of
+the process and its peak RSS. The latencies include the ASGI transport but
+no network.
+
+    cd daemon
+    python benchmarks/load.py --sensors 20 --clients 5 --seconds 30 --save
+
+Runs in a temporary directory with its own config.ini, so the daemon's
+config, status.json and databases are not touched.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import results
+
+DAEMON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAG_INTERVAL = 0.01  # seconds the lag probe sleeps
+
+CONFIG = """[DATABASE]
+DB_ENABLED = True
+DB_ENGINE = postgres
+[LOGGING]
+LOG_LEVEL = WARNING
+"""
+
+
+def percentile(values: list, fraction: float) -> float:
+    """The value below which `fraction` of `values` lie, 0 without values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def fake_database(database_module, log):
+    """A `Database` that accepts rows like a connected one and discards them on flush."""
+    class FakeDatabase(database_module.Database):
+        """Keeps the write buffer busy without a Postgres server."""
+        async def connect_db(self, *_args, **_kwargs):  # pylint: disable=W0221
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+        async def disconnect_db(self):
+            if self.flush_task:
+                self.flush_task.cancel()
+
+        def is_connected(self) -> bool:
+            return True
+
+        async def flush(self):
+            batches = self.buffer.take()
+            self.flushed_rows += sum(len(rows) for rows in batches.values())
+            self.flushes += 1
+
+    return FakeDatabase(log)
+
+
+async def timed(client, latencies: dict, route: str, method: str, url: str, **kwargs):
+    """Sends one request and records its latency under `route`."""
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    latencies.setdefault(route, []).append(time.perf_counter() - start)
+    if response.status_code >= 400:
+        latencies.setdefault(f"{route} errors", []).append(0)
+
+
+async def sensor(client, latencies: dict, index: int, interval: float, deadline: float):
+    """Reports a temperature around the target every `interval` seconds."""
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.monotonic() < deadline:
+        params = {"name": f"sensor-{index}", "temperature": 71 + random.random() * 2,
+                  "humidity": 30}
+        await timed(client, latencies, "PUT /sensor-status", "PUT", "/sensor-status",
+                    params=params)
+        await asyncio.sleep(interval)
+
+
+async def dashboard(client, latencies: dict, interval: float, deadline: float):
+    """Polls the status and the history every `interval` seconds."""
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.monotonic() < deadline:
+        await timed(client, latencies, "GET /", "GET", "/")
+        await timed(client, latencies, "GET /history", "GET", "/history")
+        await asyncio.sleep(interval)
+
+
+async def lag_probe(lags: list, deadline: float):
+    """Records how much later than requested each short sleep returns."""
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(time.perf_counter() - start - LAG_INTERVAL, 0))
+
+
+async def run(daemon, args) -> dict:
+    """Runs the load against the started app and returns the measurements."""
+    import httpx  # pylint: disable=C0415
+    latencies = {}
+    lags = []
+    async with daemon.lifespan(daemon.app):
+        transport = httpx.ASGITransport(app=daemon.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            # Fill the history like a daemon that has been running for a while.
+            now = time.time()
+            interval = daemon.config.settings.control.history_interval
+            for i in range(args.history_points):
+                daemon.controller.history.append(
+                    now - (args.history_points - i) * interval, 72, 72, 0)
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            started = time.monotonic()
+            deadline = started + args.seconds
+            await asyncio.gather(
+                lag_probe(lags, deadline),
+                *(sensor(client, latencies, i, args.sensor_interval, deadline)
+                  for i in range(args.sensors)),
+                *(dashboard(client, latencies, args.poll_interval, deadline)
+                  for _ in range(args.clients)))
+            elapsed = time.monotonic() - started
+            end_usage = resource.getrusage(resource.RUSAGE_SELF)
+        flushed_rows = daemon.database.flushed_rows + daemon.database.buffer.size
+
+    cpu = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+    measurements = {}
+    requests = 0
+    for route, values in sorted(latencies.items()):
+        if route.endswith(" errors"):
+            measurements[route] = len(values)
+            continue
+        requests += len(values)
+        measurements[f"{route} p50_ms"] = percentile(values, 0.5) * 1000
+        measurements[f"{route} p99_ms"] = percentile(values, 0.99) * 1000
+    measurements["requests_per_second"] = requests / elapsed
+    measurements["db_rows_per_second"] = flushed_rows / elapsed
+    measurements["loop_lag_p50_ms"] = percentile(lags, 0.5) * 1000
+    measurements["loop_lag_p99_ms"] = percentile(lags, 0.99) * 1000
+    measurements["loop_lag_max_ms"] = max(lags, default=0) * 1000
+    measurements["cpu_percent"] = cpu / elapsed * 100
+    measurements["rss_mb"] = end_usage.ru_maxrss / 1024
+    return measurements
+
+
+def main():
+    """Runs the load test and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--sensors", type=int, default=20)
+    parser.add_argument("--sensor-interval", type=float, default=1,
+                        help="seconds between two reports of one sensor")
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--poll-interval", type=float, default=1,
+                        help="seconds between two polls of one dashboard")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--history-points", type=int, default=8640,
+                        help="history points to start with, a day by default")
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        with open("config.ini", "w", encoding="utf-8") as file:
+            file.write(CONFIG)
+        sys.path.insert(0, DAEMON_DIR)
+        # pylint: disable=C0415,W0611
+        import unittest  # selects the Mock GPIO
+        import database
+        import main as daemon
+        daemon.database = fake_database(database, daemon.log)
+        measurements = asyncio.run(run(daemon, args))
+        os.chdir(cwd)
+    results.report(f"load-{args.sensors}x{args.clients}", measurements, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Measures the memory cost of the control path per tick.
+
+A tick is what the daemon does for one sensor reading: update the sensor,
+publish the status to `/events` subscribers, drive the status, serialize the
+status for `GET /` and record a history point. Reports:
+ - us_per_tick: wall time per tick
+ - transient_bytes_per_tick: peak memory allocated within a tick and freed again
+ - retained_bytes_per_tick: memory still held after the ticks, per tick
+ - blocks_per_tick: change of allocated blocks per tick
+ - rss_mb: peak resident memory of the process
+
+    cd daemon
+    python benchmarks/memory.py --ticks 20000 --sensors 8 --save
+
+tracemalloc only sees memory allocated through Python's allocator, not
+buffers allocated inside pydantic-core's Rust code.
+
+Runs in a temporary directory so status.json and relays.json are not touched.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import results
+
+DAEMON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tick(main, index: int, sensors: int):
+    """One sensor reading through the control path."""
+    controller = main.controller
+    # Readings stay around the target so no relay switches.
+    temperature = 71.5 + (index % 10) / 10
+    controller.update_sensor_status(f"sensor-{index % sensors}", temperature, 30, time.time())
+    main._status_changed()  # pylint: disable=W0212
+    controller.drive_status()
+    controller.get_status_json()
+    controller.update_history()
+
+
+def measure(main, ticks: int, sensors: int) -> dict:
+    """Runs `ticks` ticks after a warm-up and returns the measurements."""
+    for i in range(1000):
+        tick(main, i, sensors)
+
+    start = time.perf_counter()
+    for i in range(ticks):
+        tick(main, i, sensors)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    baseline, _peak = tracemalloc.get_traced_memory()
+    transient = 0
+    for i in range(ticks):
+        tracemalloc.reset_peak()
+        before, _peak = tracemalloc.get_traced_memory()
+        tick(main, i, sensors)
+        _current, peak = tracemalloc.get_traced_memory()
+        transient += peak - before
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "us_per_tick": seconds / ticks * 1e6,
+        "transient_bytes_per_tick": transient / ticks,
+        "retained_bytes_per_tick": (current - baseline) / ticks,
+        "blocks_per_tick": (sys.getallocatedblocks() - blocks) / ticks,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    """Runs the benchmark and prints the measurements."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--ticks", type=int, default=20000)
+    parser.add_argument("--sensors", type=int, default=8)
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        sys.path.insert(0, DAEMON_DIR)
+        # pylint: disable=C0415,W0611
+        import unittest  # selects the Mock GPIO
+        import main as daemon
+        daemon.controller.set_target_temp(72)
+        measurements = measure(daemon, args.ticks, args.sensors)
+        daemon.controller.close()
+        os.chdir(cwd)
+    results.report("memory", measurements, args)
+
+
+if __name__ == "__main__":
+    main()
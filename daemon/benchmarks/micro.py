@@ -0,0 +1,98 @@
+"""
+Times the controller's hot paths in isolation.
+
+Reports microseconds per call, the median of `--repeat` rounds:
+ - drive_status: with `--sensors` live sensors and no relay change
+ - update_history: one history point
+ - write_status: serializing and submitting status.json after a change
+ - write_status_unchanged: the same call without a change
+ - get_status_json: serializing the status for `GET /` after a change
+
+    cd daemon
+    python benchmarks/micro.py --save
+
+Runs in a temporary directory so status.json and relays.json are not touched.
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import results
+
+DAEMON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def per_call(function, calls: int, repeat: int) -> float:
+    """Median microseconds per call of `function` over `repeat` rounds of `calls` calls."""
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        rounds.append((time.perf_counter() - start) / calls * 1e6)
+    return statistics.median(rounds)
+
+
+def measure(controller_module, sensors: int, calls: int, repeat: int) -> dict:
+    """Runs every microbenchmark on a fresh `Controller`."""
+    controller = controller_module.Controller(logging.getLogger("benchmark"))
+    controller.set_target_temp(72)
+    now = time.time()
+    for i in range(sensors):
+        controller.update_sensor_status(f"sensor-{i}", 71.5 + i % 10 / 10, 30, now)
+    controller.drive_status()
+    # The cycle lockout is over, so every run decides.
+    controller.last_update_time = None
+
+    def drive_status():
+        controller.last_update_time = None
+        controller.drive_status()
+
+    def changed(function):
+        def run():
+            controller.version += 1
+            controller.status.target_temp ^= 1
+            function()
+        return run
+
+    measurements = {
+        "drive_status_us": per_call(drive_status, calls, repeat),
+        "update_history_us": per_call(controller.update_history, calls, repeat),
+        # pylint: disable=W0212
+        "write_status_us": per_call(changed(controller._write_status), calls, repeat),
+        "write_status_unchanged_us": per_call(controller._write_status, calls, repeat),
+        "get_status_json_us": per_call(changed(controller.get_status_json), calls, repeat),
+    }
+    controller.close()
+    return measurements
+
+
+def main():
+    """Runs the microbenchmarks and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--sensors", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=7)
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        sys.path.insert(0, DAEMON_DIR)
+        # pylint: disable=C0415,W0611
+        import unittest  # selects the Mock GPIO
+        import controller
+        logging.getLogger("benchmark").setLevel(logging.WARNING)
+        measurements = measure(controller, args.sensors, args.calls, args.repeat)
+        os.chdir(cwd)
+    results.report("micro", measurements, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Stores benchmark results so they can be compared between commits.
+
+Every saved run is one JSON line in `results.jsonl` next to this file with
+the benchmark's name, the git commit, the time and the measurements. A run
+is compared to the latest saved run of the same benchmark on another commit,
+or on `--baseline <commit>`.
+"""
+
+import json
+import os
+import subprocess
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCHMARKS_DIR, "results.jsonl")
+
+
+def add_arguments(parser):
+    """Adds `--save` and `--baseline` to a benchmark's argument parser."""
+    parser.add_argument("--save", action="store_true",
+                        help=f"append the results to {os.path.basename(RESULTS_PATH)}")
+    parser.add_argument("--baseline", metavar="COMMIT",
+                        help="compare to the latest saved run on this commit "
+                             "instead of the latest one on another commit")
+
+
+def commit() -> str:
+    """The checked out commit, with "+" appended if the tree has changes."""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=BENCHMARKS_DIR, capture_output=True, text=True,
+                               check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return revision + ("+" if dirty else "")
+
+
+def load(path: str = RESULTS_PATH) -> list:
+    """Every saved run, oldest first."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def baseline(name: str, current: str, wanted: str = None, path: str = RESULTS_PATH):
+    """The latest saved run of benchmark `name` on `wanted`, or on any commit but `current`."""
+    for run in reversed(load(path)):
+        if run["benchmark"] != name:
+            continue
+        if run["commit"] == wanted if wanted else run["commit"] != current:
+            return run
+    return None
+
+
+def save(name: str, current: str, results: dict, path: str = RESULTS_PATH):
+    """Appends a run of benchmark `name` on commit `current`."""
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps({"benchmark": name, "commit": current,
+                               "time": time.time(), "results": results}) + "\n")
+
+
+def report(name: str, results: dict, args):
+    """
+    Prints `results`, a dict of measurement names to numbers, next to the
+    baseline run if there is one, and saves them if `--save` was given.
+    """
+    current = commit()
+    previous = baseline(name, current, args.baseline)
+    if previous is not None:
+        print(f"{'':>32}  {current:>10}  {previous['commit']:>10}  change")
+    for key, value in results.items():
+        line = f"{key:>32}: {value:10.3f}"
+        old = previous["results"].get(key) if previous else None
+        if old is not None:
+            change = f"{(value - old) / old * 100:+6.1f}%" if old else ""
+            line += f"  {old:10.3f}  {change}"
+        print(line)
+    if args.save:
+        save(name, current, results)
@@ -0,0 +1,60 @@
+"""
+Measures how well the control loop holds a target in a simulated house.
+
+Runs `simulation.simulate` for `--days` of virtual time against an outdoor
+`--trace` and reports per relay the cycles and on-hours, the hours and the
+largest distance outside the comfort band, and the mean absolute error
+from the target. Runs are deterministic, so a change in the numbers comes
+from a change in the control logic. The sensors are conditioned like the
+daemon's defaults unless `--no-conditioning` is given.
+
+    cd daemon
+    python benchmarks/simulate.py --days 7 --trace winter --save
+
+Runs in a temporary directory so status.json and relays.json are not touched.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+import results
+
+DAEMON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    """Runs the simulation and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--trace", default="winter", choices=("winter", "spring", "summer"))
+    parser.add_argument("--target", type=int, default=72)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--anticipation", type=float, default=0,
+                        help="seconds ahead along the temperature slope the controller looks")
+    parser.add_argument("--no-conditioning", action="store_true",
+                        help="aggregate the readings as they are reported")
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        sys.path.insert(0, DAEMON_DIR)
+        # pylint: disable=C0415,W0611
+        import unittest  # selects the Mock GPIO
+        import simulation
+        from filters import Conditioning
+        logging.getLogger("simulation").setLevel(logging.WARNING)
+        conditioning = None if args.no_conditioning else Conditioning()
+        measurements = simulation.simulate(args.days, args.trace, args.target, seed=args.seed,
+                                           conditioning=conditioning,
+                                           anticipation=args.anticipation)
+        os.chdir(cwd)
+    results.report(f"simulate-{args.trace}", measurements, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures how fast the daemon starts controlling the thermostat.
+
+Every run starts a fresh interpreter in a temporary directory, imports
+`main` with the Mock GPIO, runs the app's startup and reports:
+ - import_seconds: process start until `main` is imported
+ - first_drive_seconds: process start until the first `drive_status` finished
+ - rss_mb: peak resident memory of the process at that point
+
+    cd daemon
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --db-host 10.255.255.1  # unreachable Postgres
+    python benchmarks/startup.py --sqlite
+
+The config of each run is written to its temporary directory, so the
+daemon's own config.ini, status.json and databases are not touched.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DAEMON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process. `started` is the parent's clock right before the spawn.
+CHILD = """
+import asyncio, json, resource, sys, time
+started = float(sys.argv[1])
+sys.path.insert(0, sys.argv[2])
+import unittest  # selects the Mock GPIO
+import main
+imported = time.time()
+first_drive = asyncio.Event()
+drive_status = main.controller.drive_status
+
+def timed_drive_status():
+    drive_status()
+    if not first_drive.is_set():
+        first_drive.done = time.time()
+        first_drive.set()
+
+main.controller.drive_status = timed_drive_status
+
+async def run():
+    async with main.lifespan(main.app):
+        await asyncio.wait_for(first_drive.wait(), 60)
+
+asyncio.run(run())
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_drive_seconds": first_drive.done - started,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def write_config(directory: str, args):
+    """Writes the config.ini of one run."""
+    lines = ["[DATABASE]"]
+    if args.sqlite:
+        lines += ["DB_ENABLED = True", "DB_ENGINE = sqlite"]
+    elif args.db_host:
+        lines += ["DB_ENABLED = True", "DB_ENGINE = postgres", f"DB_HOST = {args.db_host}"]
+    else:
+        lines += ["DB_ENABLED = False"]
+    lines += ["[LOGGING]", "LOG_LEVEL = WARNING"]
+    with open(os.path.join(directory, "config.ini"), "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def run_once(args) -> dict:
+    """Starts the daemon once and returns its measurements."""
+    with tempfile.TemporaryDirectory() as directory:
+        write_config(directory, args)
+        env = {key: value for key, value in os.environ.items() if key != "JOURNAL_STREAM"}
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD, repr(time.time()), DAEMON_DIR],
+            cwd=directory, env=env, capture_output=True, text=True, check=True, timeout=120)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    """Runs the benchmark and prints the median of every measurement."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db-host", help="enable Postgres at this host")
+    parser.add_argument("--sqlite", action="store_true", help="enable the local SQLite database")
+    parser.add_argument("--json", action="store_true", help="print every run as JSON")
+    args = parser.parse_args()
+
+    runs = [run_once(args) for _ in range(args.runs)]
+    if args.json:
+        print(json.dumps(runs, indent=2))
+        return
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        print(f"{key:>20}: median {statistics.median(values):8.3f}  "
+              f"min {min(values):8.3f}  max {max(values):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,460 @@
-"""Handles IO of config file."""
+"""
+Handles IO of config file.
+
+`load_config` reads `CONFIG_PATH` once at startup and parses it into
+`settings`, an immutable, typed `Settings`. Code reads `config.settings`
+instead of the raw `ConfigParser`, so nothing is parsed per call. `reload`
+re-reads the file when it changed and swaps `settings` in one assignment;
+an invalid file keeps the current settings. Sections in `RESTART_SECTIONS`
+only take effect on a restart.
+"""
 
 from configparser import ConfigParser
+from dataclasses import dataclass, fields, replace
+from types import MappingProxyType
+import logging
 import os
 
+from filters import Conditioning
+from sensors import AGGREGATIONS
+
 CONFIG_PATH = "config.ini"
 config = ConfigParser()
+log = logging.getLogger("thermostat")
+
+DB_ENGINES = ("postgres", "sqlite")
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+# Settings of connections and hardware that are set up once
+RESTART_SECTIONS = ("database", "udp", "gpio", "zones")
+ZONE_PREFIX = "ZONE:"
+ZONE_PIN_KEYS = ("PUMP_PIN", "FAN_ON_PIN", "AC_PIN", "FURNACE_PIN")
+# CONTROL settings that may be 0, the others must be positive
+ZERO_ALLOWED = {"cycle_time": 0, "control_debounce": 0, "control_min_interval": 0,
+                "anticipation": 0}
+
+DEFAULTS = {
+    'DATABASE': {
+        'DB_ENABLED': 'False',
+        # postgres, or sqlite for a local database at DB_PATH
+        'DB_ENGINE': 'postgres',
+        'DB_USER': 'username',
+        'DB_PASSWORD': 'password',
+        'DB_DATABASE': 'database_name',
+        'DB_HOST': "hostname/ip",
+        'DB_POOL_MIN_SIZE': '1',
+        'DB_POOL_MAX_SIZE': '2',
+        'DB_ACQUIRE_TIMEOUT': '5',
+        'DB_STATEMENT_CACHE_SIZE': '100',
+        # Postgres only: partitioning of new tables and retention in days, 0 keeps forever
+        'DB_PARTITION_BY_MONTH': 'False',
+        'DB_RAW_RETENTION_DAYS': '0',
+        'DB_MINUTE_RETENTION_DAYS': '0',
+        # SQLite only
+        'DB_PATH': 'history.db',
+        'DB_LOCAL_FLUSH_INTERVAL': '300',
+        'DB_LOCAL_SENSOR_INTERVAL': '60',
+        'DB_RETENTION_DAYS': '35',
+    },
+    'STATUS': {
+        'STATUS_WRITE_INTERVAL': '60',
+    },
+    'SENSORS': {
+        'AGGREGATION': 'mean',
+        'TRIM_FRACTION': '0.2',
+        # readings further from the median of the last FILTER_WINDOW readings
+        # than OUTLIER_THRESHOLD times their spread are rejected, 0 accepts all
+        'FILTER_WINDOW': '5',
+        'OUTLIER_THRESHOLD': '3.5',
+        # weight of a new reading in the smoothed temperature and its slope,
+        # 1 and 1 follow the readings as they are
+        'SMOOTHING': '0.5',
+        'TREND_SMOOTHING': '0.2',
+    },
+    # Seconds
+    'CONTROL': {
+        # minimum time between two heating/cooling cycle changes
+        'CYCLE_TIME': '120',
+        # sensors that have not reported for this long are ignored
+        'SENSOR_STALE_TIMEOUT': '60',
+        'CONTROL_DEBOUNCE': '0.5',
+        'CONTROL_MIN_INTERVAL': '2',
+        'CONTROL_WATCHDOG_INTERVAL': '30',
+        'DB_HEARTBEAT_INTERVAL': '60',
+        'HISTORY_INTERVAL': '10',
+        'CONFIG_RELOAD_INTERVAL': '5',
+        # how far ahead along the temperature slope systems are switched, 0 for not at all
+        'ANTICIPATION': '0',
+    },
+    # BCM numbers of the relay pins
+    'GPIO': {
+        'PUMP_PIN': '5',
+        'FAN_ON_PIN': '6',
+        'AC_PIN': '12',
+        'FURNACE_PIN': '13',
+    },
+    'LOGGING': {
+        # DEBUG, INFO, WARNING, ERROR or CRITICAL
+        'LOG_LEVEL': 'INFO',
+        'LOG_RATE_LIMIT_INTERVAL': '60',
+        'LOG_RATE_LIMIT_BURST': '5',
+        'ACCESS_LOG': 'False',
+    },
+    'UDP': {
+        'UDP_ENABLED': 'False',
+        'UDP_HOST': '0.0.0.0',
+        'UDP_PORT': '8002',
+        'UDP_KEY': '',
+    },
+    # sensor or room name = weight in the mean
+    'SENSOR_WEIGHTS': {},
+    # sensor name = room name
+    'SENSOR_ROOMS': {},
+    # Extra zones are sections named ZONE:<name> with SENSORS, a comma
+    # separated list of sensor names, and the four *_PIN keys of [GPIO].
+}
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """The DATABASE section."""
+    enabled: bool
+    engine: str
+    user: str
+    password: str
+    database: str
+    host: str
+    pool_min_size: int
+    pool_max_size: int
+    acquire_timeout: float
+    statement_cache_size: int
+    partition_by_month: bool
+    raw_retention_days: float
+    minute_retention_days: float
+    path: str
+    local_flush_interval: float
+    local_sensor_interval: float
+    retention_days: float
+
+
+@dataclass(frozen=True)
+class SensorSettings:
+    """The SENSORS, SENSOR_WEIGHTS and SENSOR_ROOMS sections."""
+    aggregation: str
+    trim_fraction: float
+    weights: MappingProxyType
+    rooms: MappingProxyType
+    filter_window: int
+    outlier_threshold: float
+    smoothing: float
+    trend_smoothing: float
+
+    def conditioning(self) -> Conditioning:
+        """The parameters of the sensors' `filters.SensorFilter`."""
+        return Conditioning(self.filter_window, self.outlier_threshold, self.smoothing,
+                            self.trend_smoothing)
+
+
+@dataclass(frozen=True)
+class ControlSettings:
+    """The CONTROL section, in seconds."""
+    cycle_time: float
+    sensor_stale_timeout: float
+    control_debounce: float
+    control_min_interval: float
+    control_watchdog_interval: float
+    db_heartbeat_interval: float
+    history_interval: float
+    config_reload_interval: float
+    anticipation: float
+
+
+@dataclass(frozen=True)
+class GpioSettings:
+    """The GPIO section."""
+    pump_pin: int
+    fan_on_pin: int
+    ac_pin: int
+    furnace_pin: int
+
+    def pins(self) -> tuple:
+        """The pin numbers in the order of `gpio_controller.RELAYS`."""
+        return (self.pump_pin, self.fan_on_pin, self.ac_pin, self.furnace_pin)
+
+
+@dataclass(frozen=True)
+class ZoneSettings:
+    """A ZONE:<name> section."""
+    name: str
+    sensors: tuple
+    pins: tuple  # in the order of `gpio_controller.RELAYS`
+
+
+@dataclass(frozen=True)
+class LoggingSettings:
+    """The LOGGING section."""
+    level: str
+    rate_limit_interval: float
+    rate_limit_burst: int
+    access_log: bool
+
+
+@dataclass(frozen=True)
+class UdpSettings:
+    """The UDP section."""
+    enabled: bool
+    host: str
+    port: int
+    key: str
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Everything in the config file."""
+    database: DatabaseSettings
+    status_write_interval: float
+    sensors: SensorSettings
+    control: ControlSettings
+    gpio: GpioSettings
+    logging: LoggingSettings
+    udp: UdpSettings
+    zones: tuple = ()
+
+
+def parse_settings(parser: ConfigParser) -> Settings:
+    """
+    Converts a config with every key of `DEFAULTS` into `Settings`.
+    Raises ValueError naming the key of the first invalid value.
+    """
+    section = _Section(parser, "DATABASE")
+    database = DatabaseSettings(
+        enabled=section.boolean("DB_ENABLED"),
+        engine=section.choice("DB_ENGINE", DB_ENGINES),
+        user=section.string("DB_USER"),
+        password=section.string("DB_PASSWORD"),
+        database=section.string("DB_DATABASE"),
+        host=section.string("DB_HOST"),
+        pool_min_size=section.integer("DB_POOL_MIN_SIZE", minimum=0),
+        pool_max_size=section.integer("DB_POOL_MAX_SIZE", minimum=1),
+        acquire_timeout=section.number("DB_ACQUIRE_TIMEOUT"),
+        statement_cache_size=section.integer("DB_STATEMENT_CACHE_SIZE", minimum=0),
+        partition_by_month=section.boolean("DB_PARTITION_BY_MONTH"),
+        raw_retention_days=section.number("DB_RAW_RETENTION_DAYS", minimum=0),
+        minute_retention_days=section.number("DB_MINUTE_RETENTION_DAYS", minimum=0),
+        path=section.string("DB_PATH"),
+        local_flush_interval=section.number("DB_LOCAL_FLUSH_INTERVAL"),
+        local_sensor_interval=section.number("DB_LOCAL_SENSOR_INTERVAL", minimum=0),
+        retention_days=section.number("DB_RETENTION_DAYS"))
+
+    section = _Section(parser, "SENSORS")
+    weights = _Section(parser, "SENSOR_WEIGHTS")
+    sensors = SensorSettings(
+        aggregation=section.choice("AGGREGATION", AGGREGATIONS),
+        trim_fraction=section.number("TRIM_FRACTION", minimum=0, maximum=0.5),
+        weights=MappingProxyType({key: weights.number(key, minimum=0)
+                                  for key in parser["SENSOR_WEIGHTS"]}),
+        rooms=MappingProxyType(dict(parser["SENSOR_ROOMS"])),
+        filter_window=section.integer("FILTER_WINDOW", minimum=1),
+        outlier_threshold=section.number("OUTLIER_THRESHOLD", minimum=0),
+        smoothing=section.number("SMOOTHING", minimum=0.01, maximum=1),
+        trend_smoothing=section.number("TREND_SMOOTHING", minimum=0, maximum=1))
+
+    section = _Section(parser, "CONTROL")
+    control = ControlSettings(**{
+        field.name: section.number(field.name.upper(), minimum=ZERO_ALLOWED.get(field.name))
+        for field in fields(ControlSettings)})
+
+    section = _Section(parser, "GPIO")
+    gpio = GpioSettings(**{field.name: section.integer(field.name.upper(), minimum=0)
+                           for field in fields(GpioSettings)})
+    if len(set(gpio.pins())) != len(gpio.pins()):
+        raise ValueError(f"GPIO: every relay needs its own pin, got {gpio.pins()}")
+
+    zones = tuple(_parse_zone(parser, name) for name in parser.sections()
+                  if name.upper().startswith(ZONE_PREFIX))
+    _check_zones(gpio, zones)
+
+    section = _Section(parser, "LOGGING")
+    logging_settings = LoggingSettings(
+        level=section.choice("LOG_LEVEL", LOG_LEVELS, upper=True),
+        rate_limit_interval=section.number("LOG_RATE_LIMIT_INTERVAL", minimum=0),
+        rate_limit_burst=section.integer("LOG_RATE_LIMIT_BURST", minimum=1),
+        access_log=section.boolean("ACCESS_LOG"))
+
+    section = _Section(parser, "UDP")
+    udp = UdpSettings(
+        enabled=section.boolean("UDP_ENABLED"),
+        host=section.string("UDP_HOST"),
+        port=section.integer("UDP_PORT", minimum=0, maximum=65535),
+        key=section.string("UDP_KEY"))
+
+    return Settings(
+        database=database,
+        status_write_interval=_Section(parser, "STATUS").number("STATUS_WRITE_INTERVAL",
+                                                                minimum=0),
+        sensors=sensors,
+        control=control,
+        gpio=gpio,
+        logging=logging_settings,
+        udp=udp,
+        zones=zones)
+
+
+def _parse_zone(parser: ConfigParser, section_name: str) -> ZoneSettings:
+    name = section_name[len(ZONE_PREFIX):].strip()
+    if not name or "/" in name:
+        raise ValueError(f"{section_name}: invalid zone name")
+    for key in ("SENSORS",) + ZONE_PIN_KEYS:
+        if key not in parser[section_name]:
+            raise ValueError(f"{section_name}.{key} is missing")
+    section = _Section(parser, section_name)
+    sensors = tuple(sensor.strip() for sensor in section.string("SENSORS").split(",")
+                    if sensor.strip())
+    return ZoneSettings(name, sensors,
+                        tuple(section.integer(key, minimum=0) for key in ZONE_PIN_KEYS))
+
+
+def _check_zones(gpio: GpioSettings, zones: tuple):
+    """Raises ValueError if zones share a pin or a sensor."""
+    pins = list(gpio.pins())
+    sensors = []
+    for zone in zones:
+        pins.extend(zone.pins)
+        sensors.extend(sensor.lower() for sensor in zone.sensors)
+    if len(set(pins)) != len(pins):
+        raise ValueError(f"Every relay of every zone needs its own pin, got {pins}")
+    if len(set(sensors)) != len(sensors):
+        raise ValueError("A sensor can only belong to one zone")
 
 
 def load_config():
     """
-    Reads config from `CONFIG_PATH`
+    Reads config from `CONFIG_PATH` and parses it into `settings`.
     If doesn't exist, creates the file with default values.
+    Raises ValueError if a value is invalid, `settings` then keeps the defaults.
     """
-    # Default values
-    defaults = {
-        'DATABASE': {
-            'DB_ENABLED': 'False',
-            'DB_USER': 'username',
-            'DB_PASSWORD': 'password',
-            'DB_DATABASE': 'database_name',
-            'DB_HOST': "hostname/ip",
-        }
-    }
-
+    global settings, config_stamp  # pylint: disable=W0603
     # Load values if file exists
     if os.path.exists(CONFIG_PATH):
-        print("Reading config file")
+        log.info("Reading config file")
         config.read(CONFIG_PATH)
-    rewrite = False
-
-    # Fill in missing details
-    for category, items in defaults.items():
-        if category in config:
-            has_category = category in config
-            for key in items:
-                if has_category:
-                    if key not in config[category]:
-                        config[category][key] = defaults[category][key]
-                        rewrite = True
-        else:
-            config[category] = defaults[category]
-            rewrite = True
-
-    # Update the config file if necessary
-    if rewrite:
-        print("Writing config file")
+
+    # Fill in missing details and update the config file if necessary
+    if _fill_defaults(config):
+        log.info("Writing config file")
         with open(CONFIG_PATH, 'w', encoding="utf-8") as configfile:
             config.write(configfile)
 
+    config_stamp = _stamp()
+    settings = parse_settings(config)
     return config
+
+
+def reload():
+    """
+    Re-reads `CONFIG_PATH` if it changed since it was last read and replaces
+    `settings`. Returns the new settings, or None if the file is unchanged or
+    invalid. `RESTART_SECTIONS` keep their current values.
+    """
+    global settings, config_stamp  # pylint: disable=W0603
+    stamp = _stamp()
+    if stamp == config_stamp:
+        return None
+    config_stamp = stamp
+    parser = ConfigParser()
+    try:
+        parser.read(CONFIG_PATH)
+        _fill_defaults(parser)
+        new_settings = parse_settings(parser)
+    # pylint: disable=W0718
+    except Exception as e:
+        log.error("Ignoring invalid config file: %s", e)
+        return None
+    for name in RESTART_SECTIONS:
+        if getattr(new_settings, name) != getattr(settings, name):
+            log.warning("Config section %s changed, restart to apply it", name.upper())
+    new_settings = replace(new_settings,
+                           **{name: getattr(settings, name) for name in RESTART_SECTIONS})
+    if new_settings == settings:
+        return None
+    log.info("Config file reloaded")
+    settings = new_settings
+    return settings
+
+
+def _fill_defaults(parser: ConfigParser) -> bool:
+    """Adds missing sections and keys of `DEFAULTS`. Returns whether any were missing."""
+    missing = False
+    for category, items in DEFAULTS.items():
+        if category not in parser:
+            parser[category] = items
+            missing = True
+            continue
+        for key, value in items.items():
+            if key not in parser[category]:
+                parser[category][key] = value
+                missing = True
+    return missing
+
+
+def _stamp():
+    """Modification time and size of `CONFIG_PATH`, None if it does not exist."""
+    try:
+        stat = os.stat(CONFIG_PATH)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class _Section:
+    """Typed reads of one section, raising ValueError that names the key."""
+    def __init__(self, parser: ConfigParser, name: str):
+        self.section = parser[name]
+        self.name = name
+
+    def string(self, key: str) -> str:
+        """The value as it is."""
+        return self.section[key]
+
+    def boolean(self, key: str) -> bool:
+        """True, False, yes, no, on, off, 1 or 0."""
+        return self._convert(key, self.section.getboolean)
+
+    def integer(self, key: str, minimum: int = None, maximum: int = None) -> int:
+        """An integer within `minimum` and `maximum`."""
+        return self._check(key, self._convert(key, self.section.getint), minimum, maximum)
+
+    def number(self, key: str, minimum: float = None, maximum: float = None) -> float:
+        """A number within `minimum` and `maximum`, positive by default."""
+        value = self._convert(key, self.section.getfloat)
+        if minimum is None and value <= 0:
+            raise ValueError(f"{self.name}.{key} must be positive, got {value}")
+        return self._check(key, value, minimum, maximum)
+
+    def choice(self, key: str, choices: tuple, upper: bool = False) -> str:
+        """One of `choices`."""
+        value = self.section[key].upper() if upper else self.section[key]
+        if value not in choices:
+            raise ValueError(f"{self.name}.{key} must be one of {choices}, got {value}")
+        return value
+
+    def _convert(self, key: str, getter):
+        try:
+            return getter(key)
+        except ValueError as e:
+            raise ValueError(f"{self.name}.{key}: {e}") from e
+
+    def _check(self, key: str, value, minimum, maximum):
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            raise ValueError(f"{self.name}.{key} must be within {minimum} and {maximum}, "
+                             f"got {value}")
+        return value
+
+
+def _defaults() -> ConfigParser:
+    parser = ConfigParser()
+    _fill_defaults(parser)
+    return parser
+
+
+settings = parse_settings(_defaults())
+config_stamp = None
@@ -9,176 +9,391 @@ Controller class is responsible for the following things:
 """
 # pylint: disable=E0401
 
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic_core import to_json
+
+import metrics
 import models
 
 from gpio_controller import GpioController
+from history import History, downsample, pins_to_mask
+from persistence import FileWriter
+from relays import RELAYS_PATH
+from sensors import SensorRegistry
+from state import PinState, ThermostatState, UsableState, pin_state
 
 CYCLE_TIME = 2 * 60  # minutes converted to seconds
 SENSOR_STALE_TIMEOUT = 1 * 60  # minutes converted to seconds
-HISTORY_MAX_ENTRIES = 500
-DEFAULT_STATUS = models.Status(
-                    pins=models.Pins(pump=False, fan_on=False, ac=False, furnace=False),
-                    usable=models.Usable(ac=True, cooler=True, furnace=True),
-                    target_temp=72,
-                    average_temp=72,
-                    manual_override=False,
-                    sensors={})
+HISTORY_DEFAULT_SPAN = 24 * 60 * 60  # hours converted to seconds
+# Serialized histories kept per history version, the arguments come from clients.
+HISTORY_JSON_CACHE_SIZE = 8
+STATUS_PATH = "status.json"
+
+DRIVE_STATUS_SECONDS = metrics.registry.histogram(
+    "thermostat_drive_status_seconds", "Duration of one run of drive_status.")
+STATUS_WRITE_SECONDS = metrics.registry.histogram(
+    "thermostat_status_write_seconds",
+    "Time the event loop spends serializing and submitting status.json.")
+STATUS_WRITE_BYTES = metrics.registry.counter(
+    "thermostat_status_write_bytes_total", "Bytes of status.json submitted for writing.")
+SENSOR_REPORTS = metrics.registry.counter(
+    "thermostat_sensor_reports_total",
+    "Readings received per sensor named in the config, the rest as \"other\".", ("sensor",))
+
+# The pins of each `GpioController` action, shared by every status using them
+ACTION_PINS = {
+    "all_off": PinState(),
+    "ac_on": PinState(ac=True),
+    "fan_low_on": PinState(pump=True, fan_on=True),
+    "furnace_on": PinState(furnace=True),
+}
+
+
+def decide(average_temp: float, target_temp: float, pins, usable) -> tuple:
+    """
+    Decides which systems should run. Has no side effects.
+
+    Systems turn on 2 degrees away from the target and off within 1 degree
+    of it. Returns `(action, cycle_changed)` where `action` is a key of
+    `ACTION_PINS` or None to leave the pins as they are, and `cycle_changed`
+    says whether a heating/cooling cycle started or ended, which restarts
+    the `Controller.cycle_time` lockout.
+    """
+    temp_diff = average_temp - target_temp
+    if pins.ac or pins.fan_on:
+        if usable.ac:
+            if temp_diff <= 1:
+                return "all_off", True
+            return "ac_on", False
+        if usable.cooler:
+            if temp_diff <= 1:
+                return "all_off", True
+            return "fan_low_on", False
+        return "all_off", False
+    if pins.furnace:
+        if temp_diff >= -1:
+            return "all_off", True
+        return "furnace_on", False
+    if temp_diff <= -2:
+        return "furnace_on", True
+    if temp_diff >= 2:
+        if usable.ac:
+            return "ac_on", True
+        if usable.cooler:
+            return "fan_low_on", True
+        return None, False
+    return "all_off", False
+
+
+def anticipated(status, anticipation: float) -> float:
+    """
+    The average temperature of `status` extrapolated `anticipation` seconds
+    along its slope, so systems stop before overshooting the target.
+    """
+    if not anticipation or status.temperature_slope is None:
+        return status.average_temp
+    return status.average_temp + status.temperature_slope * anticipation / 3600
+
 
 class Controller:
     """Handles keeping track of status and controlling the thermostat"""
-    def __init__(self, log):
+    def __init__(self, log, clock=None, status_path: str = STATUS_PATH,
+                 stats_path: str = RELAYS_PATH, gpio_backend=None):
+        """
+        `clock` returns the current time in seconds since the epoch and
+        defaults to `time.time`; a simulation passes its own clock and GPIO
+        backend. Without `status_path` the status is not persisted.
+        """
+        # Looked up on every call so patching `time.time` keeps working.
+        self.clock = clock or (lambda: time.time())  # pylint: disable=W0108
         self.last_update_time = None
-        self.history = []
+        self.cycle_time = CYCLE_TIME
+        # Seconds ahead along the temperature slope that `decide` looks
+        self.anticipation = 0
+        self.history = History()
         self.log = log
-        self.gpio_controller = GpioController(log)
+        # Bumped by every change of `status`. Combined with `instance` it
+        # identifies a serialized status across restarts.
+        self.version = 0
+        self.instance = f"{int(self.clock()):x}"
+        self._status_json = None
+        self._status_json_version = None
+        self._history_json = {}
+        self._history_json_version = None
+        # What `_write_status` submitted last, to skip serializing it again
+        self._saved_status = None
+        self.gpio_controller = GpioController(log, stats_path, clock=clock,
+                                              backend=gpio_backend)
+        # GPIO writes and their journal messages block, so they run on their
+        # own thread. One worker keeps them in order.
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpio")
+        self.status_writer = FileWriter(status_path, log) if status_path else None
+        self.sensors = SensorRegistry(SENSOR_STALE_TIMEOUT)
+        # What sets the target, see `schedule.Schedule.active`
+        self.schedule_entry = None
 
         try:
-            with open("status.json", "r", encoding="utf-8") as file:
-                self.status = models.Status.model_validate_json(file.read())
+            if status_path is None:
+                raise FileNotFoundError
+            with open(status_path, "r", encoding="utf-8") as file:
+                saved = json.loads(file.read())
+            self.status = ThermostatState.from_dict(saved)
+            for name, sensor in saved.get("sensors", {}).items():
+                self.sensors.update(name, sensor["temperature"], sensor["humidity"],
+                                    sensor["timestamp"])
         # pylint: disable=W0718
         except Exception:
             self.log.info("No status file found. Using default values.")
-            print("No status file found. Using default values.")
-            self.status = DEFAULT_STATUS
+            self.status = ThermostatState()
 
 
     def get_status(self) -> models.Status:
         """Returns current status of thermostat including temperatures."""
-        return self.status
+        return self.status.to_model(self.sensors.as_dicts(), self.schedule_entry)
+
+
+    def get_status_dict(self) -> dict:
+        """Returns `get_status` as plain dicts, without building the pydantic model."""
+        result = self.status.as_dict()
+        result["sensors"] = self.sensors.as_dicts()
+        result["schedule"] = self.schedule_entry
+        return result
+
+
+    def get_status_json(self) -> bytes:
+        """Returns the status serialized as a `models.StatusObject`, cached per version."""
+        if self._status_json_version != self.version:
+            self._status_json = to_json({"status": self.get_status_dict()})
+            self._status_json_version = self.version
+        return self._status_json
+
+
+    def get_status_etag(self) -> str:
+        """Entity tag of `get_status_json`'s current result."""
+        return f'"{self.instance}-{self.version}"'
+
+
+    def get_history_json(self, since: float = None, until: float = None,
+                         max_points: int = None) -> bytes:
+        """
+        Returns `get_history` serialized as a `models.HistoryObject`.
+        The `HISTORY_JSON_CACHE_SIZE` most recently used results are cached
+        until the next history update.
+        """
+        if self._history_json_version != self.history.version:
+            self._history_json = {}
+            self._history_json_version = self.history.version
+        key = (since, until, max_points)
+        # Dicts keep insertion order, reinserting a hit makes the first key the least recent.
+        result = self._history_json.pop(key, None)
+        if result is None:
+            if len(self._history_json) >= HISTORY_JSON_CACHE_SIZE:
+                del self._history_json[next(iter(self._history_json))]
+            history = self.get_history(since, until, max_points)
+            latest = history[-1][0] if history else since
+            result = models.HistoryObject(
+                history=history, latest=latest).model_dump_json().encode()
+        self._history_json[key] = result
+        return result
+
+
+    def get_history_etag(self, since: float = None, until: float = None,
+                         max_points: int = None) -> str:
+        """Entity tag of `get_history_json`'s current result for the same arguments."""
+        return f'"{self.instance}-{self.history.version}-{since}-{until}-{max_points}"'
 
 
-    def get_history(self) -> list:
+    def get_history(self, since: float = None, until: float = None,
+                    max_points: int = None) -> list:
         """
-        Gets the history of the average temperatures
-        Returns a list of tuples containing timestamps and temperature.
+        Gets the history of the average temperatures with `since <= timestamp < until`.
+        Defaults to the last `HISTORY_DEFAULT_SPAN` seconds.
+        If `max_points` is given, the points are downsampled to at most that many.
+        Returns a list of (timestamp, temperature, target, pins, min, max) tuples.
         """
-        return self.history
+        if since is None:
+            since = self.clock() - HISTORY_DEFAULT_SPAN
+        points = self.history.points(since, until)
+        if max_points is not None:
+            points = downsample(points, max_points)
+        return points
 
 
-    def update_sensor_status(self, name: str, temp: float, humidity: float):
-        """Adds or updates an entry to the sensors list keyed by `name`."""
-        self.status.sensors[name] = {
-            "humidity": humidity,
-            "temperature": temp,
-            "timestamp": time.time()}
+    def update_sensor_status(self, name: str, temp: float, humidity: float,
+                             timestamp: float = None):
+        """
+        Adds or updates an entry to the sensors list keyed by `name`.
+        `timestamp` defaults to now. Readings older than the sensor's current one are ignored.
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+        self.sensors.update(name, temp, humidity, timestamp)
+        self.version += 1
+        SENSOR_REPORTS.labels(self.sensors.metric_label(name)).inc()
 
 
     def set_target_temp(self, temp: int):
         """Sets the temperature the thermostat aims for."""
-        self.log.info(f"target temp set to {temp}")
-        print(f"target temp set to {temp}")
+        self.log.info("Target temperature set to %s", temp, extra={"TARGET_TEMP": temp})
         self.status.target_temp = temp
+        self.version += 1
+
+
+    def set_schedule_entry(self, entry: dict):
+        """Sets which schedule entry, if any, sets the target."""
+        if entry != self.schedule_entry:
+            self.schedule_entry = entry
+            self.version += 1
 
 
     def set_usable(self, ac: bool, cooler: bool, furnace: bool):
         """Set which systems the thermostat can use."""
-        usable = models.Usable(ac=ac, cooler=cooler, furnace=furnace)
-        self.status.usable = usable
+        self.status.usable = UsableState(bool(ac), bool(cooler), bool(furnace))
+        self.version += 1
 
 
-    def set_manual_override(self, override: bool, pins: models.Pins):
+    def set_manual_override(self, override: bool, pins):
         """
-        Overrides the pins to manually turn them on or off.
+        Overrides the pins, a `models.Pins` or `PinState`, to manually turn them on or off.
 
         Be careful using this if the system is hooked up to a real HVAC system.
         """
+        pins = pin_state(pins)
         self.status.manual_override = override
-        self.gpio_controller.set_pins(pins.pump, pins.fan_on, pins.ac, pins.furnace)
-        self.status.pins = self.gpio_controller.pins_status
+        self._submit_io(self.gpio_controller.set_pins, *pins)
+        self.status.pins = pins
+        self.version += 1
+
+
+    def set_relay_pins(self, pins: tuple):
+        """
+        Moves the relays to other GPIO pins, see `GpioController.set_pin_numbers`,
+        and sets them up switched off if that was not done yet.
+        """
+        self._submit_io(self.gpio_controller.set_pin_numbers, pins)
+        self._submit_io(self.gpio_controller.set_up_pins)
 
 
     def drive_status(self):
         """
         This function:
         1. Calculates the average temperature for all sensors
-        2. Uses the average temperature to set pins accordingly (turning heating/cooling on/off)
+        2. Decides which systems should run (see `decide`) and hands the pin
+           changes to the GPIO thread
         3. Writes the updated status to a file
         """
+        start = time.perf_counter()
+        before = (self.status.average_temp, self.status.temperature_slope, self.status.pins,
+                  len(self.sensors))
         try:
-            self._remove_stale_sensors()
-            self.status.average_temp = self._get_average_temp()
-            if not self.status.manual_override:
-                if (self.last_update_time is None or time.time() -
-                        self.last_update_time >= CYCLE_TIME):
-                    temp_diff = self.status.average_temp - self.status.target_temp
-                    if self.status.pins.ac or self.status.pins.fan_on:
-                        if self.status.usable.ac:
-                            if temp_diff <= 1:
-                                self.gpio_controller.all_off()
-                                self.last_update_time = time.time()
-                            else:
-                                self.gpio_controller.ac_on()
-                        elif self.status.usable.cooler:
-                            if temp_diff <= 1:
-                                self.gpio_controller.all_off()
-                                self.last_update_time = time.time()
-                            else:
-                                self.gpio_controller.fan_low_on()
-                        else:
-                            self.gpio_controller.all_off()
-                    elif self.status.pins.furnace:
-                        if temp_diff >= -1:
-                            self.gpio_controller.all_off()
-                            self.last_update_time = time.time()
-                        else:
-                            self.gpio_controller.furnace_on()
-                    else:
-                        if temp_diff <= -2:
-                            self.gpio_controller.furnace_on()
-                            self.last_update_time = time.time()
-                        elif temp_diff >= 2:
-                            if self.status.usable.ac:
-                                self.gpio_controller.ac_on()
-                                self.last_update_time = time.time()
-                            elif self.status.usable.cooler:
-                                self.gpio_controller.fan_low_on()
-                                self.last_update_time = time.time()
-                        else:
-                            self.gpio_controller.all_off()
-            self.status.pins = self.gpio_controller.pins_status
+            self.sensors.expire(self.clock())
+            average_temp = self.sensors.average()
+            if average_temp is None:
+                if before[3]:
+                    self.log.warning("No sensors reporting, keeping the systems as they are")
+            else:
+                self.status.average_temp = average_temp
+                self.status.temperature_slope = self.sensors.slope()
+            if not self.status.manual_override and average_temp is not None:
+                now = self.clock()
+                if self.last_update_time is None or now - self.last_update_time >= self.cycle_time:
+                    action, cycle_changed = decide(anticipated(self.status, self.anticipation),
+                                                   self.status.target_temp,
+                                                   self.status.pins,
+                                                   self.status.usable)
+                    if action is not None:
+                        self._apply(action)
+                    if cycle_changed:
+                        self.last_update_time = now
             self._write_status()
         # pylint: disable=W0718
         except Exception as e:
-            self.log.critical(str(e))
-            print(str(e))
+            self.log.critical("Driving the status failed with: %s", e, exc_info=True)
+        finally:
+            if (self.status.average_temp, self.status.temperature_slope, self.status.pins,
+                    len(self.sensors)) != before:
+                self.version += 1
+            DRIVE_STATUS_SECONDS.observe(time.perf_counter() - start)
+
+
+    def seconds_until_next_check(self):
+        """
+        Seconds until `drive_status` has something new to do without any input:
+        the cycle lockout ends or the oldest sensor goes stale. None if neither.
+        """
+        now = self.clock()
+        deadlines = []
+        if self.last_update_time is not None and \
+                self.last_update_time + self.cycle_time > now:
+            deadlines.append(self.last_update_time + self.cycle_time)
+        next_expiry = self.sensors.next_expiry()
+        if next_expiry is not None:
+            deadlines.append(next_expiry)
+        if not deadlines:
+            return None
+        return max(min(deadlines) - now, 0)
 
 
     def update_history(self):
         """
-        Adds the current average temperature to the history list.
-        Deletes oldest entries if maximum has been reached.
+        Adds the current average temperature, target and pins to the history.
+        The oldest entries are overwritten once the history is full.
+        """
+        self.log.debug("Updating history %s", self.status.average_temp)
+        self.history.append(self.clock(), self.status.average_temp,
+                            self.status.target_temp, pins_to_mask(self.status.pins))
+
+
+    def load_history(self, rows):
+        """
+        Adds `(timestamp, temp, target, pins)` rows, oldest first, to the history.
+        Used to restore the history from a local database after a restart.
+        """
+        for timestamp, temp, target, pins in rows:
+            self.history.append(timestamp, temp, target, pins)
+
+
+    def close(self):
+        """
+        Finishes pending GPIO writes, switches the relays off and writes
+        pending changes of the status and relay files.
+        """
+        self.io_executor.shutdown()
+        self.gpio_controller.close()
+        if self.status_writer is not None:
+            self.status_writer.close()
+
+
+    def _apply(self, action: str):
+        """
+        Sets `status.pins` for `action` right away and runs the matching
+        `GpioController` method on the GPIO thread.
         """
-        self.log.info(f"Updating history {str(self.status.average_temp)}")
-        print(f"Updating history {str(self.status.average_temp)}")
-        time_obj = time.localtime()
-        time_asc = time.asctime(time_obj)
-        self.history.append((time_asc, self.status.average_temp))
-        if len(self.history) > HISTORY_MAX_ENTRIES:
-            to_remove = len(self.history) - HISTORY_MAX_ENTRIES
-            self.history = self.history[to_remove:]
+        self.status.pins = ACTION_PINS[action]
+        self._submit_io(getattr(self.gpio_controller, action))
 
 
-    def _remove_stale_sensors(self):
-        sensor_keys = self.status.sensors.keys()
-        sensors_to_remove = []
-        for key in sensor_keys:
-            if self.status.sensors[key]["timestamp"] + \
-                    SENSOR_STALE_TIMEOUT <= time.time():
-                sensors_to_remove.append(key)
-        for key in sensors_to_remove:
-            self.status.sensors.pop(key)
+    def _submit_io(self, function, *args):
+        future = self.io_executor.submit(function, *args)
+        future.add_done_callback(self._log_io_failure)
 
 
-    def _get_average_temp(self):
-        temp_sum = 0
-        sensor_keys = self.status.sensors.keys()
-        for key in sensor_keys:
-            temp_sum += self.status.sensors[key]["temperature"]
-        return temp_sum / len(sensor_keys)
+    def _log_io_failure(self, future):
+        if future.exception() is not None:
+            self.log.critical("GPIO write failed with: %s", future.exception())
 
 
     def _write_status(self):
-        with open("status.json", "w", encoding="utf-8") as f:
-            f.write(self.status.json())
-            f.close()
+        saved = (self.status.pins, self.status.usable, self.status.target_temp,
+                 self.status.manual_override)
+        if saved == self._saved_status or self.status_writer is None:
+            return
+        start = time.perf_counter()
+        data = to_json(self.status.as_dict(ephemeral=False))
+        self.status_writer.submit(data)
+        self._saved_status = saved
+        STATUS_WRITE_BYTES.inc(len(data))
+        STATUS_WRITE_SECONDS.observe(time.perf_counter() - start)
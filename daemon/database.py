@@ -1,155 +1,476 @@
 """
 Sends queries to postgres database
+
+Rows are not written when they are reported. They are collected in a bounded
+in-memory `WriteBuffer` and flushed in bulk by a background task, either when
+enough rows have been buffered or when the oldest row gets too old.
+Connecting and reconnecting also happen in the background, so callers never
+wait on the database.
 """
-from datetime import datetime
-import asyncpg
+import asyncio
+import time
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+
+import metrics
+import rollups
+
+FLUSH_INTERVAL = 10  # seconds the oldest buffered row may wait before a flush
+FLUSH_ROWS = 200  # buffered rows that trigger an early flush
+MAX_BUFFERED_ROWS = 10000  # rows kept in memory while the database is unreachable
+
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 2
+ACQUIRE_TIMEOUT = 5  # seconds
+STATEMENT_CACHE_SIZE = 100
+RETRY_MIN_DELAY = 1  # seconds
+RETRY_MAX_DELAY = 5 * 60  # seconds
+ROLLUP_INTERVAL = 60  # seconds between rollup runs
+MAINTENANCE_INTERVAL = 24 * 60 * 60  # seconds between partition and retention runs
+
+QUERY_SECONDS = metrics.registry.histogram(
+    "thermostat_db_query_seconds", "Duration of database inserts per table.", ("table",))
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+TABLE_COLUMNS = {
+    "sensors": ("time", "sensor_id", "temperature", "humidity"),
+    "averages": ("time", "average_temp", "target_temp"),
+    "pins": ("time",
+             "pump_available", "pump_active",
+             "ac_available", "ac_active",
+             "furnace_available", "furnace_active",
+             "fan_available", "fan_active"),
+}
+
+TABLE_DEFINITIONS = {
+    "sensors": "time timestamptz, sensor_id text, temperature real, humidity real",
+    "averages": "time timestamptz, average_temp real, target_temp real",
+    "pins": "time timestamptz, "
+            "pump_available bool, pump_active bool, "
+            "ac_available bool, ac_active bool, "
+            "furnace_available bool, furnace_active bool, "
+            "fan_available bool, fan_active bool",
+}
+
+INSERT_QUERIES = {
+    table: f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+           f"({', '.join(f'${i + 1}' for i in range(len(columns)))})"
+    for table, columns in TABLE_COLUMNS.items()
+}
+
+
+class WriteBuffer:
+    """
+    Bounded queue of rows waiting to be written, keyed by table.
+
+    When `max_rows` is reached the overflow policy decides which row is lost:
+    `DROP_OLDEST` discards the oldest buffered row, `DROP_NEWEST` discards the
+    incoming one.
+    """
+    def __init__(self, max_rows: int = MAX_BUFFERED_ROWS, policy: str = DROP_OLDEST):
+        self.max_rows = max_rows
+        self.policy = policy
+        self.tables = {table: deque() for table in TABLE_COLUMNS}
+        self.size = 0
+        self.dropped = 0
+        self.oldest_time = None
+
+    def add(self, table: str, row: tuple) -> bool:
+        """Queues `row` for `table`. Returns False if a row had to be dropped."""
+        dropped = False
+        if self.size >= self.max_rows:
+            dropped = True
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return False
+            self._drop_oldest()
+        self.tables[table].append(row)
+        self.size += 1
+        if self.oldest_time is None:
+            self.oldest_time = time.monotonic()
+        return not dropped
+
+    def take(self) -> dict:
+        """Removes and returns all buffered rows as `{table: [rows]}`."""
+        batches = {table: list(rows) for table, rows in self.tables.items() if rows}
+        for rows in self.tables.values():
+            rows.clear()
+        self.size = 0
+        self.oldest_time = None
+        return batches
+
+    def requeue(self, table: str, rows: list):
+        """Puts rows that failed to flush back in front of newer rows."""
+        queue = self.tables[table]
+        for row in reversed(rows):
+            if self.size >= self.max_rows:
+                self.dropped += 1
+                continue
+            queue.appendleft(row)
+            self.size += 1
+        if self.size and self.oldest_time is None:
+            self.oldest_time = time.monotonic()
+
+    def age(self) -> float:
+        """Seconds since the oldest buffered row was added, 0 if empty."""
+        if self.oldest_time is None:
+            return 0
+        return time.monotonic() - self.oldest_time
+
+    def _drop_oldest(self):
+        largest = max(self.tables.values(), key=len)
+        largest.popleft()
+        self.size -= 1
 
 
 class Database:
     """Handles connecting to, and sending queries to a postgres database."""
-    def __init__(self, log):
-        self.db_connection = None
+    engine = "postgres"
+
+    def __init__(self,
+                 log,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 flush_rows: int = FLUSH_ROWS,
+                 max_buffered_rows: int = MAX_BUFFERED_ROWS,
+                 overflow_policy: str = DROP_OLDEST):
+        self.pool = None
         self.log = log
         self.user = ""
         self.password = ""
         self.database = ""
         self.host = ""
+        self.pool_min_size = POOL_MIN_SIZE
+        self.pool_max_size = POOL_MAX_SIZE
+        self.acquire_timeout = ACQUIRE_TIMEOUT
+        self.statement_cache_size = STATEMENT_CACHE_SIZE
+        self.partition_by_month = False
+        self.raw_retention_days = 0
+        self.minute_retention_days = 0
+
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.buffer = WriteBuffer(max_buffered_rows, overflow_policy)
+        self.flush_task = None
+        self.connect_task = None
+        self.maintenance_task = None
+        # Oldest time of rows flushed since the last rollup, None if none.
+        self.rollup_since = None
+        self.rollup_watermark_loaded = False
+        self.last_maintenance_time = None
+        self.rollups = 0
+        self.flush_wakeup = asyncio.Event()
+        self.tables_created = False
+        self.retry_delay = RETRY_MIN_DELAY
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_errors = 0
+        self.reconnects = 0
+        self.last_flush_time = None
 
     async def connect_db(
             self,
             user: str,
             password: str,
             database: str,
-            host: str):
+            host: str,
+            pool_min_size: int = POOL_MIN_SIZE,
+            pool_max_size: int = POOL_MAX_SIZE,
+            acquire_timeout: float = ACQUIRE_TIMEOUT,
+            statement_cache_size: int = STATEMENT_CACHE_SIZE,
+            partition_by_month: bool = False,
+            raw_retention_days: float = 0,
+            minute_retention_days: float = 0):
         """
-        Connects to and authenticates with database.
-        Sends queries to create necessary tables if they don't exist.
+        Starts connecting to the database in the background and returns immediately.
+
+        The connection pool is created by a background task that retries with
+        exponential backoff. Tables are created once the first connection succeeds.
+        Rows reported before then stay in the write buffer.
+
+        New raw tables are partitioned by month if `partition_by_month`. Raw rows
+        and minute rollups older than their retention in days are deleted, 0
+        keeps them forever. Hourly rollups are always kept.
         """
         self.user = user
         self.password = password
         self.database = database
         self.host = host
-        self.log.info("Connecting to database at host " + host)
-        print("Connecting to database at host", host)
-        try:
-            self.db_connection = await asyncpg.connect(user=user, password=password,
-                                                       database=database, host=host)
-        except Exception as e:
-            self.log.error("Database connection failed with:\n" + str(e))
-            print("Database connection failed with:")
-            print(str(e))
-        else:
-            self.log.error("Database connection successful")
-            print("Database connection successful")
-        await self._create_tables()
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.acquire_timeout = acquire_timeout
+        self.statement_cache_size = statement_cache_size
+        self.partition_by_month = partition_by_month
+        self.raw_retention_days = raw_retention_days
+        self.minute_retention_days = minute_retention_days
+        if self.connect_task is None:
+            self.connect_task = asyncio.create_task(self._connect_loop())
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+        if self.maintenance_task is None:
+            self.maintenance_task = asyncio.create_task(self._maintenance_loop())
 
     async def disconnect_db(self):
-        """Closes connection to database."""
+        """Flushes buffered rows and closes the connection pool."""
         self.log.info("Disconnecting from database")
-        print("Disonnecting from database")
-        if self.db_connection:
-            await self.db_connection.close()
+        for task in (self.connect_task, self.flush_task, self.maintenance_task):
+            if task:
+                task.cancel()
+        self.connect_task = None
+        self.flush_task = None
+        self.maintenance_task = None
+        if self.pool:
+            try:
+                await self.flush()
+            # pylint: disable=W0718
+            except Exception as e:
+                self.log.error("Final database flush failed with: %s", e)
+            await self.pool.close()
+            self.pool = None
 
-    async def update_sensors(self, name, temperature, humidity):
-        """Adds entry to sensors table of the database using the current timestamp."""
-        await self._check_connection()
-        self.log.info("Sending sensor status to database")
-        print("Sending sensor status to database")
+    def is_connected(self) -> bool:
+        """Whether the connection pool has been created."""
+        return self.pool is not None
 
-        try:
-            dt = datetime.now()
-
-            await self.db_connection.execute(
-                "INSERT INTO sensors VALUES ($1, $2, $3, $4)",
-                dt, name, temperature, humidity
-            )
-        except Exception as e:
-            self.log.error("Database query failed with:\n" + str(e))
-            print("Database query failed with:")
-            print(str(e))
+    async def update_sensors(self, name, temperature, humidity, timestamp=None):
+        """Queues an entry for the sensors table using `timestamp` or the current time."""
+        dt = datetime.now() if timestamp is None else datetime.fromtimestamp(timestamp)
+        self._queue("sensors", (dt, name, temperature, humidity))
 
     async def update_averages(self, avg_temp, target_temp):
-        """Adds entry to averages table using current timestamp"""
-        await self._check_connection()
-        self.log.info("Sending averages to database")
-        print("Sending averages to database")
+        """Queues an entry for the averages table using the current timestamp."""
+        self._queue("averages", (datetime.now(), avg_temp, target_temp))
 
-        try:
-            dt = datetime.now()
+    async def update_pins(self, pins, usable):
+        """Queues an entry for the pins table using the current timestamp."""
+        self._queue("pins", (
+            datetime.now(),
+            usable.cooler, pins.pump,
+            usable.ac, pins.ac,
+            usable.furnace, pins.furnace,
+            usable.cooler, pins.fan_on
+        ))
 
-            await self.db_connection.execute(
-                "INSERT INTO averages VALUES ($1, $2, $3)",
-                dt, avg_temp, target_temp
-            )
-        except Exception as e:
-            self.log.error("Database query failed with:\n" + str(e))
-            print("Database query failed with:")
-            print(str(e))
+    def get_stats(self) -> dict:
+        """Returns counters describing the connection, write buffer and flushes."""
+        return {
+            "engine": self.engine,
+            "connected": self.is_connected(),
+            "reconnects": self.reconnects,
+            "buffered_rows": self.buffer.size,
+            "dropped_rows": self.buffer.dropped,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+            "last_flush_time": self.last_flush_time,
+            "rollups": self.rollups,
+        }
 
-    async def update_pins(self, pins, usable):
-        """Adds entry to pins table of database"""
-        await self._check_connection()
-        self.log.info("Sending pins to database")
-        print("Sending pins to database")
+    async def flush(self):
+        """
+        Writes every buffered row to the database.
 
-        try:
-            dt = datetime.now()
-
-            await self.db_connection.execute(
-                "INSERT INTO pins VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)",
-                dt,
-                usable.cooler, pins.pump,
-                usable.ac, pins.ac,
-                usable.furnace, pins.furnace,
-                usable.cooler, pins.fan_on
-            )
-        except Exception as e:
-            self.log.error("Database query failed with:\n" + str(e))
-            print("Database query failed with:")
-            print(str(e))
+        Each table is written with one `executemany` of its INSERT statement,
+        which asyncpg prepares once per pooled connection and keeps in the
+        connection's statement cache.
+        """
+        if not self.buffer.size or self.pool is None:
+            return
+        async with self.pool.acquire(timeout=self.acquire_timeout) as connection:
+            batches = self.buffer.take()
+            failed = None
+            for table, rows in batches.items():
+                start = time.perf_counter()
+                try:
+                    await connection.executemany(INSERT_QUERIES[table], rows)
+                except Exception as e:
+                    self.buffer.requeue(table, rows)
+                    failed = e
+                else:
+                    self.flushed_rows += len(rows)
+                    QUERY_SECONDS.labels(table).observe(time.perf_counter() - start)
+                    if table in rollups.ROLLED_UP_TABLES:
+                        self._mark_for_rollup(rollups.to_aware(min(row[0] for row in rows)))
+        self.flushes += 1
+        self.last_flush_time = time.time()
+        if failed:
+            raise failed
 
-    async def _check_connection(self):
-        if self.db_connection is None or self.db_connection.is_closed():
-            await self.connect_db(self.user, self.password, self.database, self.host)
+    async def rollup(self):
+        """Recomputes the minute and hour rollups of every hour with newly flushed rows."""
+        async with self.pool.acquire(timeout=self.acquire_timeout) as connection:
+            if not self.rollup_watermark_loaded:
+                watermark = await connection.fetchval(rollups.ROLLUP_WATERMARK_QUERY)
+                self._mark_for_rollup(datetime.min.replace(tzinfo=timezone.utc)
+                                      if watermark is None else rollups.to_aware(watermark))
+                self.rollup_watermark_loaded = True
+            if self.rollup_since is None:
+                return
+            since = self.rollup_since
+            self.rollup_since = None
+            try:
+                async with connection.transaction():
+                    for query in rollups.ROLLUP_QUERIES:
+                        await connection.execute(query, since)
+            except Exception:
+                self._mark_for_rollup(since)
+                raise
+        self.rollups += 1
 
-    async def _create_tables(self):
-        self.log.info("Sending requests to create tables on database")
-        print("Sending requests to create tables on database")
-        create_table_queries = [
-            """
-        CREATE TABLE IF NOT EXISTS sensors (
-            time timestamptz,
-            sensor_id text,
-            temperature real,
-            humidity real
-        )
-        """,
-            """
-        CREATE TABLE IF NOT EXISTS averages (
-            time timestamptz,
-            average_temp real,
-            target_temp real
-        )
-        """,
-            """
-        CREATE TABLE IF NOT EXISTS pins (
-            time timestamptz,
-            pump_available bool,
-            pump_active bool,
-            ac_available bool,
-            ac_active bool,
-            furnace_available bool,
-            furnace_active bool,
-            fan_available bool,
-            fan_active bool
-        )
+    async def maintain(self):
+        """Creates upcoming monthly partitions and deletes rows past their retention."""
+        today = date.today()
+        async with self.pool.acquire(timeout=self.acquire_timeout) as connection:
+            for table in rollups.RAW_TABLES:
+                if await connection.fetchval(rollups.IS_PARTITIONED_QUERY, table):
+                    await self._maintain_partitions(connection, table, today)
+            if self.raw_retention_days:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=self.raw_retention_days)
+                # Rows that are not rolled up yet are kept.
+                if self.rollup_since is not None:
+                    cutoff = min(cutoff, self.rollup_since)
+                for table in rollups.RAW_TABLES:
+                    await connection.execute(f"DELETE FROM {table} WHERE time < $1", cutoff)
+            if self.minute_retention_days:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=self.minute_retention_days)
+                for table in rollups.ROLLED_UP_TABLES:
+                    await connection.execute(
+                        f"DELETE FROM {table}_minute WHERE bucket < $1", cutoff)
+
+    async def get_rollup(self, table: str, since: float, until: float,
+                         resolution: str = None, sensor: str = None) -> dict:
+        """
+        Reads the rollup of `table` ("sensors" or "averages") with `since <= bucket < until`.
+        `resolution` defaults to `rollups.choose_resolution`. Returns the resolution
+        and rows with the bucket as epoch seconds.
         """
-        ]
+        if resolution is None:
+            resolution = rollups.choose_resolution(since, until)
+        if resolution not in rollups.RESOLUTIONS or table not in rollups.SELECT_ROLLUP_QUERIES:
+            raise ValueError(f"Unknown rollup {table} per {resolution}")
+        query = rollups.SELECT_ROLLUP_QUERIES[table].format(resolution=resolution)
+        args = [rollups.to_datetime(since), rollups.to_datetime(until)]
+        if table == "sensors":
+            args.append(sensor)
+        args.append(rollups.MAX_ROLLUP_ROWS)
+        async with self.pool.acquire(timeout=self.acquire_timeout) as connection:
+            rows = await connection.fetch(query, *args)
+        return {
+            "resolution": resolution,
+            "rows": [[rollups.to_epoch(row[0])] + list(row[1:]) for row in rows],
+        }
+
+    def _mark_for_rollup(self, oldest: datetime):
+        if self.rollup_since is None or oldest < self.rollup_since:
+            self.rollup_since = oldest
+
+    async def _maintain_partitions(self, connection, table: str, today: date):
+        for months_ahead in (0, 1):
+            for query in rollups.create_partition_queries(
+                    table, rollups.month_start(today, months_ahead)):
+                await connection.execute(query)
+        if not self.raw_retention_days:
+            return
+        oldest_kept = rollups.month_start(today - timedelta(days=self.raw_retention_days))
+        for record in await connection.fetch(rollups.PARTITIONS_QUERY, table):
+            month = rollups.partition_month(table, record[0])
+            if month is not None and month < oldest_kept:
+                self.log.info("Dropping partition %s", record[0])
+                await connection.execute(f"DROP TABLE {record[0]}")
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(ROLLUP_INTERVAL)
+            if not self.is_connected() or not self.tables_created:
+                continue
+            try:
+                await self.rollup()
+                now = time.monotonic()
+                if self.last_maintenance_time is None or \
+                        now - self.last_maintenance_time >= MAINTENANCE_INTERVAL:
+                    self.last_maintenance_time = now
+                    await self.maintain()
+            # pylint: disable=W0718
+            except Exception as e:
+                self.log.error("Database maintenance failed with: %s", e)
+
+    def _queue(self, table: str, row: tuple):
+        self.buffer.add(table, row)
+        if self.buffer.size >= self.flush_rows:
+            self.flush_wakeup.set()
+
+    async def _connect_loop(self):
+        # Imported here so a daemon without Postgres never pays for loading asyncpg.
+        import asyncpg  # pylint: disable=C0415
+        while self.pool is None:
+            self.log.info("Connecting to database at host %s", self.host,
+                          extra={"DB_HOST": self.host})
+            try:
+                self.pool = await asyncpg.create_pool(
+                    user=self.user, password=self.password,
+                    database=self.database, host=self.host,
+                    min_size=self.pool_min_size, max_size=self.pool_max_size,
+                    statement_cache_size=self.statement_cache_size)
+            # pylint: disable=W0718
+            except Exception as e:
+                self.log.error("Database connection failed with: %s", e,
+                               extra={"RETRY_DELAY": self.retry_delay})
+                await self._backoff()
+                self.reconnects += 1
+            else:
+                self.log.info("Database connection successful")
+                self.retry_delay = RETRY_MIN_DELAY
+        await self._create_tables()
+        self.connect_task = None
+
+    async def _backoff(self):
+        await asyncio.sleep(self.retry_delay)
+        self.retry_delay = min(self.retry_delay * 2, RETRY_MAX_DELAY)
+
+    async def _flush_loop(self):
+        while True:
+            timeout = max(self.flush_interval - self.buffer.age(), 0.1)
+            try:
+                await asyncio.wait_for(self.flush_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_wakeup.clear()
+            if not self.is_connected() or self.connect_task is not None:
+                continue
+            if not self.tables_created:
+                await self._create_tables()
+                if not self.tables_created:
+                    await self._backoff()
+                    continue
+            if self.buffer.size >= self.flush_rows or \
+                    self.buffer.age() >= self.flush_interval:
+                try:
+                    await self.flush()
+                # pylint: disable=W0718
+                except Exception as e:
+                    self.flush_errors += 1
+                    self.log.error("Database flush failed with: %s", e,
+                                   extra={"BUFFERED_ROWS": self.buffer.size})
+                    await self._backoff()
+                else:
+                    self.retry_delay = RETRY_MIN_DELAY
+
+    async def _create_tables(self):
+        if self.tables_created:
+            return
+        self.log.info("Creating tables on database")
         try:
-            for query in create_table_queries:
-                await self.db_connection.execute(query)
-                print(f"Executed: {query.strip().splitlines()[0]}...")
+            async with self.pool.acquire(timeout=self.acquire_timeout) as connection:
+                for table, columns in TABLE_DEFINITIONS.items():
+                    await connection.execute(rollups.create_table_query(
+                        table, columns, self.partition_by_month))
+                for table in rollups.RAW_TABLES:
+                    if await connection.fetchval(rollups.IS_PARTITIONED_QUERY, table):
+                        await self._maintain_partitions(connection, table, date.today())
+                for query in rollups.CREATE_ROLLUP_QUERIES:
+                    await connection.execute(query)
+                    self.log.debug("Executed: %s...", query.strip().splitlines()[0])
+            self.tables_created = True
         except Exception as e:
-            self.log.error("Database query failed with:\n" + str(e))
-            print("Database query failed with:")
-            print(str(e))
+            self.log.error("Creating tables failed with: %s", e)
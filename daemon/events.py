@@ -0,0 +1,90 @@
+"""
+Pushes changes of the thermostat's status to subscribers as Server-Sent Events.
+
+Every change is serialized once into a JSON Merge Patch (RFC 7386) against the
+previously published status and the same bytes are queued for every subscriber.
+A new subscriber first receives the full status as a `snapshot` event and then
+`diff` events.
+"""
+
+import asyncio
+import json
+
+SUBSCRIBER_QUEUE_SIZE = 32
+_RESYNC = object()
+
+
+def merge_patch(old: dict, new: dict) -> dict:
+    """Returns the JSON Merge Patch turning `old` into `new`."""
+    patch = {}
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    for key, value in new.items():
+        previous = old.get(key)
+        if value == previous and key in old:
+            continue
+        if isinstance(value, dict) and isinstance(previous, dict):
+            patch[key] = merge_patch(previous, value)
+        else:
+            patch[key] = value
+    return patch
+
+
+def format_event(event: str, data) -> bytes:
+    """Serializes `data` as a Server-Sent Event named `event`."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class StatusBroadcaster:
+    """Fans out status changes to every subscribed `/events` stream."""
+    def __init__(self):
+        self.subscribers = set()
+        self.status = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """Registers a subscriber. Its queue yields serialized events."""
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Removes a subscriber registered with `subscribe`."""
+        self.subscribers.discard(queue)
+
+    def snapshot(self) -> bytes:
+        """The current status as a `snapshot` event."""
+        return format_event("snapshot", self.status or {})
+
+    def publish(self, status: dict) -> bool:
+        """
+        Queues the difference to the previously published status for every subscriber.
+        Returns False when nothing changed.
+        """
+        if self.status is not None and status == self.status:
+            return False
+        patch = merge_patch(self.status or {}, status)
+        self.status = status
+        if not self.subscribers:
+            return True
+
+        payload = format_event("diff", patch)
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # A slow client missed diffs, send it a fresh snapshot instead.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(_RESYNC)
+        return True
+
+    async def next_event(self, queue: asyncio.Queue, timeout: float) -> bytes:
+        """Waits for the subscriber's next event, or a keep-alive comment after `timeout`."""
+        try:
+            payload = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return b": keep-alive\n\n"
+        if payload is _RESYNC:
+            return self.snapshot()
+        return payload
@@ -0,0 +1,98 @@
+"""
+Conditions the readings of one sensor before they are aggregated.
+
+`SensorFilter` keeps a fixed amount of state per sensor and costs O(1) per
+reading:
+ - outliers: a reading further from the median of the last `window`
+   readings than `outlier_threshold` times their scaled median absolute
+   deviation (MAD) is rejected. Rejected readings still enter the window,
+   so a real step change is accepted once it persists.
+ - smoothing and slope: accepted readings update a Holt linear filter, an
+   EWMA of the level with weight `smoothing` plus an EWMA of its slope with
+   weight `trend_smoothing`, both on the readings' timestamps. The slope
+   is updated from the level's change since the last update, at least
+   `MIN_TREND_INTERVAL` ago, whatever the reporting rate.
+"""
+
+from collections import deque
+from typing import NamedTuple
+
+MAD_SCALE = 1.4826  # makes the MAD comparable to a standard deviation
+MIN_SPREAD = 0.5  # degrees; keeps a steady sensor from rejecting every small change
+MIN_WINDOW = 3  # readings needed before outliers can be told apart
+# The slope is measured over at least this long, noise over a few
+# milliseconds, e.g. within one batch, would make for huge slopes.
+MIN_TREND_INTERVAL = 10  # seconds
+
+
+class Conditioning(NamedTuple):
+    """Parameters of `SensorFilter`."""
+    window: int = 5
+    # robust z-score above which a reading is rejected, 0 accepts every reading
+    outlier_threshold: float = 3.5
+    # weight of a new reading in the level, 1 follows the readings unsmoothed
+    smoothing: float = 0.5
+    trend_smoothing: float = 0.2
+
+
+def _median(ordered: list) -> float:
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class SensorFilter:
+    """Outlier rejection, smoothed temperature and its slope for one sensor."""
+    __slots__ = ("conditioning", "window", "level", "trend", "timestamp", "anchor_level",
+                 "anchor_time", "rejected")
+
+    def __init__(self, conditioning: Conditioning):
+        self.conditioning = conditioning
+        self.window = deque(maxlen=max(conditioning.window, 1))
+        self.level = None
+        # degrees per second
+        self.trend = 0.0
+        self.timestamp = None
+        # level and time of the last slope update
+        self.anchor_level = None
+        self.anchor_time = None
+        self.rejected = 0
+
+    @property
+    def slope(self) -> float:
+        """Slope of the temperature in degrees per hour."""
+        return self.trend * 3600
+
+    def is_outlier(self, temperature: float) -> bool:
+        """Whether `temperature` is too far from the recent readings."""
+        threshold = self.conditioning.outlier_threshold
+        if not threshold or len(self.window) < MIN_WINDOW:
+            return False
+        ordered = sorted(self.window)
+        median = _median(ordered)
+        mad = _median(sorted(abs(value - median) for value in ordered))
+        return abs(temperature - median) > threshold * max(MAD_SCALE * mad, MIN_SPREAD)
+
+    def update(self, temperature: float, timestamp: float) -> bool:
+        """Adds a reading. Returns False if it was rejected as an outlier."""
+        outlier = self.is_outlier(temperature)
+        self.window.append(temperature)
+        if outlier:
+            self.rejected += 1
+            return False
+        if self.level is None:
+            self.level = self.anchor_level = temperature
+            self.timestamp = self.anchor_time = timestamp
+            return True
+        alpha = self.conditioning.smoothing
+        predicted = self.level + self.trend * max(timestamp - self.timestamp, 0)
+        self.level = alpha * temperature + (1 - alpha) * predicted
+        self.timestamp = max(timestamp, self.timestamp)
+        elapsed = timestamp - self.anchor_time
+        if elapsed >= MIN_TREND_INTERVAL:
+            beta = self.conditioning.trend_smoothing
+            self.trend = beta * (self.level - self.anchor_level) / elapsed + (1 - beta) * self.trend
+            self.anchor_level = self.level
+            self.anchor_time = timestamp
+        return True
@@ -3,7 +3,8 @@
 
 import sys
 
-import models
+from relays import RELAYS_PATH, RelayStats
+from state import ALL_OFF, PinState
 
 if "unittest" in sys.modules:
     from Mock import GPIO
@@ -19,66 +20,126 @@ FAN_ON_PIN = 6
 AC_PIN = 12
 FURNACE_PIN = 13
 
+RELAYS = ("pump", "fan_on", "ac", "furnace")
+PINS = (PUMP_PIN, FAN_ON_PIN, AC_PIN, FURNACE_PIN)  # in the order of RELAYS
+
 class GpioController():
     """Encapsulates control of GPIO pins and creates aliases for each pin"""
-    def __init__(self, log):
+    def __init__(self, log, stats_path: str = RELAYS_PATH, pins: tuple = PINS,
+                 clock=None, backend=None):
+        """
+        `backend` replaces the GPIO module, e.g. with a simulation's, and
+        `clock` the time of relay transitions. The pins are not touched
+        before `set_up_pins` or the first `set_pins`, so `set_pin_numbers`
+        can still move them to the configured ones.
+        """
         self.log = log
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(PUMP_PIN, GPIO.OUT, initial=OFF)
-        GPIO.setup(FAN_ON_PIN, GPIO.OUT, initial=OFF)
-        GPIO.setup(AC_PIN, GPIO.OUT, initial=OFF)
-        GPIO.setup(FURNACE_PIN, GPIO.OUT, initial=OFF)
+        self.clock = clock
+        self.backend = backend
+        self.pins = tuple(pins)
+        self.set_up = False
 
-        self.pins_status = models.Pins(pump=False, fan_on=False, ac=False, furnace=False)
+        self.pins_status = ALL_OFF
+        # Until the first write the pins are only known from `GPIO.setup`.
+        self.written = False
+        self.relay_stats = RelayStats(RELAYS, log, stats_path)
 
 
     def fan_low_on(self):
         """Turns the cooler pump and fan on"""
-        self.log.info("Turning on fan low")
-        print("Turning on fan low")
         self.set_pins(True, True, False, False)
 
 
     def ac_on(self):
         """Turns A/C on"""
-        self.log.info("Turning on ac")
-        print("Turning on ac")
         self.set_pins(False, False, True, False)
 
 
     def furnace_on(self):
         """Turns furnace on"""
-        self.log.info("Turning on furnace")
-        print("Turning on furnace")
         self.set_pins(False, False, False, True)
 
 
     def all_off(self):
         """Turns all pins off"""
-        self.log.info("Turning on all systems off")
-        print("Turning on all systems off")
         self.set_pins(False, False, False, False)
 
 
     def set_pins(self, pump: bool, fan_on: bool, ac: bool, furnace: bool):
-        """Sets state of each system. True turns the system ON, False turns it OFF"""
-        pump_pin = OFF
-        fan_on_pin = OFF
-        ac_pin = OFF
-        furnace_pin = OFF
-
-        if pump:
-            pump_pin = ON
-        if fan_on:
-            fan_on_pin = ON
-        if ac:
-            ac_pin = ON
-        if furnace:
-            furnace_pin = ON
-
-        GPIO.output(PUMP_PIN, pump_pin)
-        GPIO.output(FAN_ON_PIN, fan_on_pin)
-        GPIO.output(AC_PIN, ac_pin)
-        GPIO.output(FURNACE_PIN, furnace_pin)
-        self.pins_status = models.Pins(
-            pump=pump, fan_on=fan_on, ac=ac, furnace=furnace)
+        """
+        Sets state of each system. True turns the system ON, False turns it OFF.
+        Nothing is written if no system changes.
+        """
+        previous = self.pins_status
+        if self.written and previous == (pump, fan_on, ac, furnace):
+            return
+        states = PinState(pump, fan_on, ac, furnace)
+        self.written = True
+
+        gpio = self.backend or GPIO
+        if not self.set_up:
+            self.set_up_pins()
+        pump_pin, fan_on_pin, ac_pin, furnace_pin = self.pins
+        gpio.output(pump_pin, ON if pump else OFF)
+        gpio.output(fan_on_pin, ON if fan_on else OFF)
+        gpio.output(ac_pin, ON if ac else OFF)
+        gpio.output(furnace_pin, ON if furnace else OFF)
+        now = self.clock() if self.clock else None
+        for relay, on, was_on in zip(RELAYS, states, previous):
+            if on != was_on:
+                self.relay_stats.transition(relay, on, now)
+        self.log.info("Relays set to %s",
+                      ", ".join(relay for relay, on in zip(RELAYS, states) if on) or "all off",
+                      extra={relay.upper(): on for relay, on in zip(RELAYS, states)})
+        self.pins_status = states
+
+
+    def set_pin_numbers(self, pins: tuple):
+        """
+        Moves the relays to other pins, in the order of `RELAYS`. The old
+        pins are switched off and the current state is written to the new
+        ones by the next `set_pins`.
+        """
+        pins = tuple(pins)
+        if pins == self.pins:
+            return
+        self.log.info("Relay pins set to %s", pins)
+        if not self.set_up:
+            self.pins = pins
+            return
+        gpio = self.backend or GPIO
+        for pin in self.pins:
+            gpio.output(pin, OFF)
+        self.pins = pins
+        self.set_up = False
+        self.set_up_pins()
+        self.written = False
+        self.set_pins(*self.pins_status)
+
+
+    def set_up_pins(self):
+        """
+        Sets the pins up as outputs switched off, which also switches off
+        relays left on by a previous run. Does nothing if they are set up.
+        """
+        if self.set_up:
+            return
+        gpio = self.backend or GPIO
+        gpio.setmode(gpio.BCM)
+        for pin in self.pins:
+            gpio.setup(pin, gpio.OUT, initial=OFF)
+        self.set_up = True
+
+
+    def close(self):
+        """
+        Switches the relays off, ends their running cycles in the stats and
+        writes them. Pins that were never set up are left alone.
+        """
+        if self.set_up:
+            try:
+                self.all_off()
+            # pylint: disable=W0718
+            except Exception as e:
+                self.log.critical("Switching the relays off failed with: %s", e)
+        self.relay_stats.close()
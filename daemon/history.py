@@ -0,0 +1,243 @@
+"""
+Keeps the thermostat's history in memory at several resolutions.
+
+Each resolution is a fixed-size ring buffer backed by `array`s, so appending
+never allocates or copies and memory use is known up front. Raw samples go
+into the finest tier and every coarser tier averages them into buckets of its
+own resolution, keeping the minimum and maximum of each bucket.
+
+A point is the tuple `(timestamp, temperature, target, pins, minimum, maximum)`
+where `timestamp` is seconds since the epoch and `pins` is a bitmask of the
+relays that were on (see `PIN_*`).
+"""
+
+from array import array
+from bisect import bisect_left
+
+PIN_PUMP = 1
+PIN_FAN_ON = 2
+PIN_AC = 4
+PIN_FURNACE = 8
+
+# (resolution in seconds, number of points kept)
+DEFAULT_TIERS = (
+    (10, 3 * 60 * 6),  # 10 seconds for 3 hours
+    (2 * 60, 7 * 24 * 30),  # 2 minutes for 7 days
+    (60 * 60, 31 * 24),  # 1 hour for 31 days
+)
+
+
+def pins_to_mask(pins) -> int:
+    """Packs a `state.PinState` or `models.Pins` into a `PIN_*` bitmask."""
+    mask = 0
+    if pins.pump:
+        mask |= PIN_PUMP
+    if pins.fan_on:
+        mask |= PIN_FAN_ON
+    if pins.ac:
+        mask |= PIN_AC
+    if pins.furnace:
+        mask |= PIN_FURNACE
+    return mask
+
+
+def downsample(points: list, max_points: int) -> list:
+    """
+    Reduces `points` to at most `max_points` with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept. Every other output point is the one in
+    its bucket forming the largest triangle with the previously chosen point and
+    the average of the next bucket, which preserves peaks and dips.
+    """
+    if max_points >= len(points) or max_points < 3:
+        return points[:max(max_points, 0)] if max_points < 3 else points
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (max_points - 2)
+    previous = points[0]
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_points = points[end:next_end] or points[-1:]
+        next_x = sum(point[0] for point in next_points) / len(next_points)
+        next_y = sum(point[1] for point in next_points) / len(next_points)
+
+        best = None
+        best_area = -1.0
+        for point in points[start:end]:
+            area = abs((previous[0] - next_x) * (point[1] - previous[1]) -
+                       (previous[0] - point[0]) * (next_y - previous[1]))
+            if area > best_area:
+                best_area = area
+                best = point
+        sampled.append(best)
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+
+class RingBuffer:
+    """Fixed-capacity circular buffer of history points in parallel arrays."""
+    __slots__ = ("capacity", "times", "temps", "targets", "pins", "mins", "maxs",
+                 "start", "count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        self.temps = array("f", [0.0]) * capacity
+        self.targets = array("f", [0.0]) * capacity
+        self.pins = array("B", [0]) * capacity
+        self.mins = array("f", [0.0]) * capacity
+        self.maxs = array("f", [0.0]) * capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index: int) -> float:
+        """Returns the timestamp of the `index`th oldest point."""
+        return self.times[(self.start + index) % self.capacity]
+
+    def append(self, timestamp: float, temp: float, target: float, pins: int,
+               minimum: float, maximum: float):
+        """Adds a point, overwriting the oldest one when full."""
+        if self.count < self.capacity:
+            i = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[i] = timestamp
+        self.temps[i] = temp
+        self.targets[i] = target
+        self.pins[i] = pins
+        self.mins[i] = minimum
+        self.maxs[i] = maximum
+
+    def oldest(self):
+        """Timestamp of the oldest point, None if empty."""
+        return self[0] if self.count else None
+
+    def newest(self):
+        """Timestamp of the newest point, None if empty."""
+        return self[self.count - 1] if self.count else None
+
+    def points(self, since: float = None, until: float = None) -> list:
+        """Returns points with `since <= timestamp < until`, oldest first."""
+        first = 0 if since is None else bisect_left(self, since, 0, self.count)
+        last = self.count if until is None else bisect_left(self, until, first, self.count)
+        result = []
+        for n in range(first, last):
+            i = (self.start + n) % self.capacity
+            result.append((self.times[i],
+                           round(self.temps[i], 2),
+                           round(self.targets[i], 2),
+                           self.pins[i],
+                           round(self.mins[i], 2),
+                           round(self.maxs[i], 2)))
+        return result
+
+
+class Tier:
+    """A ring buffer holding samples averaged into buckets of `resolution` seconds."""
+    __slots__ = ("resolution", "buffer", "bucket", "total", "samples",
+                 "minimum", "maximum", "target", "pins")
+
+    def __init__(self, resolution: int, capacity: int):
+        self.resolution = resolution
+        self.buffer = RingBuffer(capacity)
+        self.bucket = None
+        self.total = 0.0
+        self.samples = 0
+        self.minimum = 0.0
+        self.maximum = 0.0
+        self.target = 0.0
+        self.pins = 0
+
+    def add(self, timestamp: float, temp: float, target: float, pins: int):
+        """Accumulates a sample, storing the previous bucket once it is complete."""
+        bucket = timestamp - timestamp % self.resolution
+        if bucket != self.bucket:
+            self._close_bucket()
+            self.bucket = bucket
+            self.minimum = temp
+            self.maximum = temp
+        self.total += temp
+        self.samples += 1
+        self.minimum = min(self.minimum, temp)
+        self.maximum = max(self.maximum, temp)
+        self.target = target
+        self.pins |= pins
+
+    def current(self):
+        """The bucket still being accumulated as a point, None if empty."""
+        if not self.samples:
+            return None
+        return (self.bucket, round(self.total / self.samples, 2), round(float(self.target), 2),
+                self.pins, round(self.minimum, 2), round(self.maximum, 2))
+
+    def _close_bucket(self):
+        if self.samples:
+            self.buffer.append(self.bucket, self.total / self.samples, self.target,
+                               self.pins, self.minimum, self.maximum)
+        self.total = 0.0
+        self.samples = 0
+        self.pins = 0
+
+
+class History:
+    """
+    Multi-resolution history of the average temperature, target and relays.
+
+    Queries are answered from the finest tier that still covers the requested
+    start, continued with finer tiers for the time after its last bucket and
+    ending with the finest tier's incomplete bucket.
+    """
+    def __init__(self, tiers=DEFAULT_TIERS):
+        self.tiers = [Tier(resolution, capacity) for resolution, capacity in tiers]
+        self.version = 0
+
+    def append(self, timestamp: float, temp: float, target: float, pins: int):
+        """Records a sample in every tier."""
+        self.version += 1
+        for tier in self.tiers:
+            tier.add(timestamp, temp, target, pins)
+
+    def points(self, since: float = None, until: float = None) -> list:
+        """Returns points with `since <= timestamp < until`, oldest first."""
+        chosen = len(self.tiers) - 1
+        for i, tier in enumerate(self.tiers):
+            oldest = tier.buffer.oldest()
+            if oldest is not None and since is not None and oldest <= since:
+                chosen = i
+                break
+
+        tier = self.tiers[chosen]
+        result = tier.buffer.points(since, until)
+        end = result[-1][0] + tier.resolution if result else since
+        for finer in reversed(self.tiers[:chosen]):
+            tail = finer.buffer.points(end, until)
+            if tail:
+                result += tail
+                end = tail[-1][0] + finer.resolution
+        current = self.tiers[0].current()
+        if current and (end is None or current[0] >= end) and \
+                (until is None or current[0] < until):
+            result.append(current)
+        return result
+
+    def span(self) -> float:
+        """Seconds covered by the coarsest tier when it is full."""
+        return max(tier.resolution * tier.buffer.capacity for tier in self.tiers)
+
+    def memory_size(self) -> int:
+        """Bytes used by the ring buffers' arrays."""
+        size = 0
+        for tier in self.tiers:
+            buffer = tier.buffer
+            for values in (buffer.times, buffer.temps, buffer.targets,
+                           buffer.pins, buffer.mins, buffer.maxs):
+                size += values.itemsize * len(values)
+        return size
@@ -0,0 +1,102 @@
+"""
+Parses batches of sensor readings for `POST /sensor-status/batch`.
+
+Besides a JSON array, readings can be sent as line protocol, one per line:
+
+    <name> temperature=<float>,humidity=<float> [<unix timestamp>]
+
+Spaces, commas and backslashes in the name are escaped with a backslash.
+Empty lines and lines starting with `#` are ignored.
+
+Temperatures, humidities and timestamps must be finite: a NaN would break
+the sorted temperatures of `sensors.SensorRegistry`.
+"""
+
+import math
+import time
+
+MAX_BATCH_READINGS = 500
+MAX_CLOCK_SKEW = 60  # seconds a reading's timestamp may be ahead of the daemon's clock
+
+
+def parse_line_protocol(text: str) -> list:
+    """
+    Parses line protocol into `(name, temperature, humidity, timestamp)` tuples.
+    `timestamp` is None when the line has none. Raises ValueError on malformed lines.
+    """
+    readings = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            readings.append(_parse_line(line))
+        except KeyError as e:
+            raise ValueError(f"line {number}: missing field {str(e)}") from e
+        except ValueError as e:
+            raise ValueError(f"line {number}: {str(e)}") from e
+    return readings
+
+
+def check_reading(temperature: float, humidity: float, timestamp: float = None):
+    """Raises ValueError if a value of a reading is NaN or infinite."""
+    for field, value in (("temperature", temperature), ("humidity", humidity),
+                         ("timestamp", timestamp)):
+        if value is not None and not math.isfinite(value):
+            raise ValueError(f"{field} must be a finite number, got {value}")
+
+
+def clamp_timestamp(timestamp, now: float = None) -> float:
+    """Returns `timestamp`, or now if it is missing or too far in the future."""
+    if now is None:
+        now = time.time()
+    if timestamp is None or timestamp > now + MAX_CLOCK_SKEW:
+        return now
+    return timestamp
+
+
+def order_batch(readings: list, now: float = None) -> list:
+    """
+    `readings` with their timestamps resolved by `clamp_timestamp`, oldest
+    first, so every sensor ends up with its newest reading. Readings without
+    a timestamp count as now, not as older than the stamped ones.
+    """
+    if now is None:
+        now = time.time()
+    resolved = [(name, temperature, humidity, clamp_timestamp(timestamp, now))
+                for name, temperature, humidity, timestamp in readings]
+    resolved.sort(key=lambda reading: reading[3])
+    return resolved
+
+
+def _parse_line(line: str) -> tuple:
+    name, rest = _split_name(line)
+    parts = rest.split()
+    if not name or len(parts) not in (1, 2):
+        raise ValueError("expected '<name> temperature=<t>,humidity=<h> [<timestamp>]'")
+    fields = {}
+    for field in parts[0].split(","):
+        key, separator, value = field.partition("=")
+        if not separator:
+            raise ValueError(f"field '{field}' is not key=value")
+        fields[key] = value
+    timestamp = float(parts[1]) if len(parts) == 2 else None
+    temperature, humidity = float(fields["temperature"]), float(fields["humidity"])
+    check_reading(temperature, humidity, timestamp)
+    return name, temperature, humidity, timestamp
+
+
+def _split_name(line: str) -> tuple:
+    name = []
+    escaped = False
+    for i, char in enumerate(line):
+        if escaped:
+            name.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == " ":
+            return "".join(name), line[i + 1:]
+        else:
+            name.append(char)
+    return "".join(name), ""
@@ -0,0 +1,116 @@
+"""
+The daemon's one logging subsystem.
+
+Records are put on a queue and written by a `QueueListener` thread, so
+logging never blocks the event loop. Under systemd they go to the journal,
+otherwise to stderr. Structured fields are passed as upper case `extra`
+keys, e.g. `log.info("Relays set", extra={"AC": True})`: the journal stores
+them as fields and stderr shows them as `key=value`.
+
+`RateLimitFilter` lets every distinct message through at most `burst`
+times per `interval`. The next message that passes after suppression
+carries the number of suppressed copies in its `SUPPRESSED` field.
+"""
+
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOGGER_NAME = "thermostat"
+RATE_LIMIT_INTERVAL = 60  # seconds
+RATE_LIMIT_BURST = 5  # copies of a message let through per interval
+MAX_RATE_LIMIT_KEYS = 1000
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops copies of a message beyond `burst` per `interval` seconds."""
+    def __init__(self, interval: float = RATE_LIMIT_INTERVAL,
+                 burst: int = RATE_LIMIT_BURST, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        # (logger, level, message) -> [window start, passed, suppressed]
+        self.windows = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.getMessage())
+        now = self.clock()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is not None and window[2]:
+                record.SUPPRESSED = window[2]
+            if window is None and len(self.windows) >= MAX_RATE_LIMIT_KEYS:
+                self._prune(now)
+            self.windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.suppressed += 1
+        return False
+
+    def _prune(self, now: float):
+        for key, window in list(self.windows.items()):
+            if now - window[0] >= self.interval:
+                del self.windows[key]
+        if len(self.windows) >= MAX_RATE_LIMIT_KEYS:
+            self.windows.clear()
+
+
+class FieldsFormatter(logging.Formatter):
+    """Appends the upper case fields of a record as `key=value` pairs."""
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = " ".join(f"{key.lower()}={value}" for key, value in record.__dict__.items()
+                          if key.isupper())
+        return f"{message} {fields}" if fields else message
+
+
+rate_limiter = RateLimitFilter()
+
+
+def setup(level: int = logging.INFO):
+    """
+    Connects the daemon's logger to the journal, or stderr outside of
+    systemd, through a queue. Returns the logger and the started listener,
+    which must be stopped on exit to write the remaining records.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, _sink())
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(rate_limiter)
+    log = logging.getLogger(LOGGER_NAME)
+    log.addHandler(queue_handler)
+    log.setLevel(level)
+    log.propagate = False
+    listener.start()
+    return log, listener
+
+
+def configure(level: str, interval: float = RATE_LIMIT_INTERVAL,
+              burst: int = RATE_LIMIT_BURST, access_log: bool = False):
+    """
+    Applies the logging settings of the config file. Without `access_log`,
+    uvicorn's line per request, which sensors send every few seconds, is dropped.
+    """
+    logging.getLogger(LOGGER_NAME).setLevel(level.upper())
+    logging.getLogger("uvicorn.access").setLevel(logging.INFO if access_log else logging.WARNING)
+    rate_limiter.interval = interval
+    rate_limiter.burst = burst
+
+
+def _sink() -> logging.Handler:
+    # systemd sets JOURNAL_STREAM for services whose output goes to the journal.
+    if os.environ.get("JOURNAL_STREAM"):
+        # pylint: disable=C0415
+        from systemd.journal import JournalHandler
+        return JournalHandler(SYSLOG_IDENTIFIER=LOGGER_NAME)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(FieldsFormatter("%(asctime)s %(levelname)s %(message)s"))
+    return handler
@@ -1,24 +1,52 @@
 """The entry point into the project."""
 
-import logging
 import asyncio
+import json
+import time
 from contextlib import asynccontextmanager
-from systemd.journal import JournalHandler
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from controller import Controller
+from controller import HISTORY_DEFAULT_SPAN, Controller
 from database import Database
+from events import StatusBroadcaster
+from schedule import Schedule
+from zones import ZoneSet
+import gpio_controller
+import ingest
+import logger
+import metrics
 import models
 import config
 
-log = logging.getLogger("thermostat")
-log.addHandler(JournalHandler())
-log.setLevel(logging.INFO)
+log, log_listener = logger.setup()
 
 database = Database(log)
 controller = Controller(log)
+zones = ZoneSet(log, controller.io_executor)
+schedule = Schedule(log)
+broadcaster = StatusBroadcaster()
+published_version = None
+udp_protocol = None
+control_wakeup = asyncio.Event()
+schedule_wakeup = asyncio.Event()
+background_tasks = set()
+
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_STREAM_MAX_SECONDS = 60  # streams end so shutdown never waits on them
+# The schedule loop sleeps on the monotonic clock, so it checks the wall
+# clock at least this often in case that was set, e.g. by NTP after boot.
+SCHEDULE_MAX_SLEEP = 15 * 60
+
+REQUEST_SECONDS = metrics.registry.histogram(
+    "thermostat_http_request_seconds", "Time until the response starts per route.",
+    ("method", "route", "status"))
+LOOP_LAG_SECONDS = metrics.registry.histogram(
+    "thermostat_event_loop_lag_seconds",
+    "How much later than scheduled the history tick woke up.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
@@ -42,51 +70,225 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.RequestMetricsMiddleware, histogram=REQUEST_SECONDS)
 
 async def _startup():
+    global database  # pylint: disable=W0603
     try:
         config.load_config()
     except Exception as e:
-        log.info("Loading dot env file failed %s", str(e))
-        print("Loading dot env file failed " + str(e))
-    if config.config["DATABASE"]["DB_ENABLED"] == "True":
-        try:
-            await database.connect_db(config.config["DATABASE"]["DB_USER"],
-                                      config.config["DATABASE"]["DB_PASSWORD"],
-                                      config.config["DATABASE"]["DB_DATABASE"],
-                                      config.config["DATABASE"]["DB_HOST"])
-        except Exception as e:
-            log.info("Connecting to database failed with %s", str(e))
-            print("Connecting to database failed with " + str(e))
+        log.error("Loading config file failed: %s", e)
+    settings = config.settings
+    _apply_settings(settings)
+    # Relays left on by a previous run are switched off before anything else.
+    controller.set_relay_pins(settings.gpio.pins())
+    zones.configure(settings.zones, settings.control.sensor_stale_timeout)
+    db_settings = settings.database
+    if db_settings.enabled and db_settings.engine == "sqlite":
+        # pylint: disable=C0415
+        from sqlite_database import SqliteDatabase
+        database = SqliteDatabase(log, db_settings.path,
+                                  flush_interval=db_settings.local_flush_interval,
+                                  sensor_interval=db_settings.local_sensor_interval,
+                                  retention_days=db_settings.retention_days)
+
+    # Thermostat control comes first, everything else starts in the background.
+    _background(drive_status_loop())
+    _background(schedule_loop())
+    _background(_start_database())
+    _background(config_reload_loop())
+    await _start_udp_listener()
+    log.info("Thermostat daemon started")
+
+
+def _apply_settings(settings: config.Settings):
+    """Applies the settings that can change while the daemon runs."""
+    logger.configure(settings.logging.level,
+                     settings.logging.rate_limit_interval,
+                     settings.logging.rate_limit_burst,
+                     settings.logging.access_log)
+    controller.status_writer.min_interval = settings.status_write_interval
+    controller.cycle_time = settings.control.cycle_time
+    controller.anticipation = settings.control.anticipation
+    controller.sensors.stale_timeout = settings.control.sensor_stale_timeout
+    zones.cycle_time = settings.control.cycle_time
+    zones.anticipation = settings.control.anticipation
+    zones.set_stale_timeout(settings.control.sensor_stale_timeout)
+    zones.configure_sensors(settings.sensors)
+    controller.sensors.configure(settings.sensors.aggregation,
+                                 settings.sensors.weights,
+                                 settings.sensors.rooms,
+                                 settings.sensors.trim_fraction,
+                                 settings.sensors.conditioning())
+
+
+async def config_reload_loop():
+    """
+    Applies changes of the config file without a restart.
+
+    Caution: Will block forever if awaited. Use as async task instead.
+    """
+    while True:
+        await asyncio.sleep(config.settings.control.config_reload_interval)
+        settings = config.reload()
+        if settings is not None:
+            _apply_settings(settings)
+            _input_changed()
+
+
+def _background(coroutine):
+    """Runs `coroutine` as a task that is kept referenced until it finishes."""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def _start_database():
+    """
+    Connects the database and restores the history from a local database,
+    then starts recording the history.
+    """
+    db_settings = config.settings.database
+    try:
+        if not db_settings.enabled:
+            log.info("Database disabled in config")
+        elif database.engine == "sqlite":
+            await database.connect_db()
+            controller.load_history(
+                await database.load_history(time.time() - controller.history.span()))
+        else:
+            await database.connect_db(db_settings.user,
+                                      db_settings.password,
+                                      db_settings.database,
+                                      db_settings.host,
+                                      pool_min_size=db_settings.pool_min_size,
+                                      pool_max_size=db_settings.pool_max_size,
+                                      acquire_timeout=db_settings.acquire_timeout,
+                                      statement_cache_size=db_settings.statement_cache_size,
+                                      partition_by_month=db_settings.partition_by_month,
+                                      raw_retention_days=db_settings.raw_retention_days,
+                                      minute_retention_days=db_settings.minute_retention_days)
+    # pylint: disable=W0718
+    except Exception as e:
+        log.error("Starting the %s database failed with %s", database.engine, e)
+    finally:
+        # Restored history has to come before the first new point.
+        _background(drive_history_loop())
+
+
+async def _start_udp_listener():
+    global udp_protocol  # pylint: disable=W0603
+    udp_settings = config.settings.udp
+    if not udp_settings.enabled:
+        return
+    if not udp_settings.key:
+        log.error("UDP listener not started: UDP_KEY is empty")
+        return
+    import udp_listener  # pylint: disable=C0415
+    try:
+        _transport, udp_protocol = await udp_listener.start_listener(
+            udp_settings.host, udp_settings.port,
+            udp_settings.key.encode(), _ingest_datagram, log)
+    except OSError as e:
+        log.error("Starting UDP listener failed with %s", e)
     else:
-        log.info("Database disabled in config")
-        print("Database disabled in config")
-    print("the lifespan is happening")
-    asyncio.create_task(drive_status_loop())
-    asyncio.create_task(drive_history_loop())
+        log.info("Listening for sensor datagrams on port %s", udp_settings.port)
+
+
+def _ingest_datagram(name: str, temperature: float, humidity: float):
+    _background(_ingest_datagram_reading(name, temperature, humidity))
+
+
+async def _ingest_datagram_reading(name: str, temperature: float, humidity: float):
+    await _ingest_reading(name, temperature, humidity)
+    _input_changed()
 
 
 async def _shutdown():
-    if config.config["DATABASE"]["DB_ENABLED"] == "True":
+    controller.close()
+    zones.close()
+    schedule.close()
+    if config.settings.database.enabled:
         await database.disconnect_db()
+    log_listener.stop()
 
 
 async def drive_status_loop():
     """
-    Creates a heartbeat driving the thermostat's status every 'interval_seconds'.
+    Drives the thermostat's status whenever a sensor reading or setting changes.
+    Runs are debounced and at least `CONTROL_MIN_INTERVAL` seconds apart.
+    Without input it wakes when the cycle lockout or a sensor expires, and at
+    least every `CONTROL_WATCHDOG_INTERVAL` seconds. Both are settings of the
+    config file's CONTROL section.
+    Extra zones are driven in the same pass.
     Also logs the status to the database if available.
 
     Caution: Will block forever if awaited. Use as async task instead.
     """
-    interval_seconds = 10
+    loop = asyncio.get_running_loop()
+    last_logged = None
+    last_logged_time = 0
     while True:
-        print("Driving status loop")
+        last_run = loop.time()
         controller.drive_status()
-        if config.config["DATABASE"]["DB_ENABLED"] == "True":
-            await database.update_averages(controller.status.average_temp,
-                                           controller.status.target_temp)
-            await database.update_pins(controller.status.pins, controller.status.usable)
-        await asyncio.sleep(interval_seconds)
+        zones.drive()
+        _status_changed()
+        control = config.settings.control
+        if config.settings.database.enabled:
+            logged = (controller.status.average_temp, controller.status.target_temp,
+                      controller.status.pins, controller.status.usable)
+            if logged != last_logged or \
+                    last_run - last_logged_time >= control.db_heartbeat_interval:
+                last_logged = logged
+                last_logged_time = last_run
+                await database.update_averages(controller.status.average_temp,
+                                               controller.status.target_temp)
+                await database.update_pins(controller.status.pins, controller.status.usable)
+
+        timeout = control.control_watchdog_interval
+        next_checks = [seconds for seconds in (controller.seconds_until_next_check(),
+                                               zones.seconds_until_next_check())
+                       if seconds is not None]
+        if next_checks:
+            next_check = min(next_checks)
+            timeout = min(timeout, max(next_check, control.control_min_interval))
+        try:
+            await asyncio.wait_for(control_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            elapsed = loop.time() - last_run
+            await asyncio.sleep(max(control.control_debounce,
+                                    control.control_min_interval - elapsed))
+        control_wakeup.clear()
+
+
+async def schedule_loop():
+    """
+    Sets the target the schedule asks for, then sleeps until its next
+    transition or override end, or until the schedule changes.
+
+    Caution: Will block forever if awaited. Use as async task instead.
+    """
+    while True:
+        now = time.time()
+        schedule.expire(now)
+        entry = schedule.active(now)
+        version = controller.version
+        controller.set_schedule_entry(entry)
+        if entry is not None and entry["target"] != controller.status.target_temp:
+            controller.set_target_temp(entry["target"])
+        if controller.version != version:
+            _input_changed()
+        timeout = SCHEDULE_MAX_SLEEP
+        if entry is not None and entry["until"] is not None:
+            timeout = min(timeout, max(entry["until"] - time.time(), 0))
+        try:
+            await asyncio.wait_for(schedule_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        schedule_wakeup.clear()
 
 
 async def drive_history_loop():
@@ -95,41 +297,230 @@ async def drive_history_loop():
 
     Caution: Will block forever if awaited. Use as async task instead.
     """
+    loop = asyncio.get_running_loop()
     while True:
-        print("Driving history loop")
         controller.update_history()
-        await asyncio.sleep(120)
+        zones.update_history()
+        interval = config.settings.control.history_interval
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(loop.time() - start - interval, 0))
+
+
+@metrics.registry.collector
+def _collect_metrics():
+    """Values owned by other objects, read at scrape time."""
+    now = time.time()
+    db_stats = database.get_stats()
+    relays = controller.gpio_controller.relay_stats
+    yield ("thermostat_db_connected", "Whether the database pool is connected.",
+           metrics.GAUGE, [({}, db_stats["connected"])])
+    yield ("thermostat_db_reconnects_total", "Failed database connection attempts.",
+           metrics.COUNTER, [({}, db_stats["reconnects"])])
+    yield ("thermostat_db_flush_errors_total", "Database flushes that failed.",
+           metrics.COUNTER, [({}, db_stats["flush_errors"])])
+    yield ("thermostat_db_buffered_rows", "Rows waiting to be written to the database.",
+           metrics.GAUGE, [({}, db_stats["buffered_rows"])])
+    yield ("thermostat_db_dropped_rows_total", "Rows dropped because the buffer was full.",
+           metrics.COUNTER, [({}, db_stats["dropped_rows"])])
+    yield ("thermostat_sensor_age_seconds", "Seconds since each live sensor's last reading.",
+           metrics.GAUGE, [({"sensor": name}, now - reading.timestamp)
+                           for name, reading in controller.sensors.readings.items()])
+    yield ("thermostat_relay_cycles_total", "Times each relay turned on.",
+           metrics.COUNTER, [({"relay": relay}, relays.cycles[relay])
+                             for relay in gpio_controller.RELAYS])
+    yield ("thermostat_relay_on_seconds_total", "Seconds each relay has been on.",
+           metrics.COUNTER, [({"relay": relay}, relays.total_on_seconds(relay, now))
+                             for relay in gpio_controller.RELAYS])
+
+
+def _input_changed():
+    """Publishes the new status and wakes the status loop to react to it."""
+    _status_changed()
+    control_wakeup.set()
+
+
+def _status_changed():
+    """Publishes the controller's status to `/events` subscribers if it changed."""
+    global published_version  # pylint: disable=W0603
+    if controller.version != published_version:
+        published_version = controller.version
+        broadcaster.publish(controller.get_status_dict())
+
+
+def _cached_json(request: Request, etag: str, content) -> Response:
+    """
+    Answers with 304 Not Modified if the client already has `etag`,
+    otherwise with the JSON bytes returned by `content()`.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content(), media_type="application/json", headers=headers)
 
 
 @app.get("/", response_model=models.StatusObject)
-async def root() -> dict:
+async def root(request: Request) -> Response:
     """Returns the current status of the thermostat."""
-    return models.StatusObject(status = controller.get_status())
+    return _cached_json(request, controller.get_status_etag(), controller.get_status_json)
 
 
-@app.get("/history")
-async def get_history() -> models.HistoryObject:
+@app.get("/history", response_model=models.HistoryObject)
+async def get_history(request: Request,
+                      since: float | None = None,
+                      until: float | None = None,
+                      max_points: int | None = None) -> Response:
     """
-    Gets the history of the average temperatures
-    Returns: list of tuples containing timestamps and temperature.
+    Gets the history of the average temperatures with `since <= timestamp < until`.
+    `since` defaults to one day ago. Pass the previous response's `latest` + 1
+    as `since` to only fetch new points.
+    `max_points` downsamples the result on the server.
+    Returns: list of (timestamp, temperature, target, pins, min, max) tuples
+    and the timestamp of the newest point returned.
     """
-    return models.HistoryObject(history = controller.get_history())
+    return _cached_json(request,
+                        controller.get_history_etag(since, until, max_points),
+                        lambda: controller.get_history_json(since, until, max_points))
+
+
+@app.get("/events")
+async def status_events() -> StreamingResponse:
+    """
+    Streams the status as Server-Sent Events: a `snapshot` event with the full
+    status, then `diff` events holding a JSON Merge Patch whenever it changes.
+    The stream ends after a minute and browsers reconnect automatically.
+    """
+    _status_changed()
+    queue = broadcaster.subscribe()
+
+    async def stream():
+        try:
+            yield b"retry: 1000\n\n"
+            yield broadcaster.snapshot()
+            deadline = asyncio.get_running_loop().time() + EVENTS_STREAM_MAX_SECONDS
+            while asyncio.get_running_loop().time() < deadline:
+                yield await broadcaster.next_event(queue, EVENTS_KEEPALIVE_SECONDS)
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache",
+                                      "X-Accel-Buffering": "no"})
+
+
+@app.get("/database")
+async def get_database_stats() -> dict:
+    """Returns counters of the database write buffer: buffered, flushed and dropped rows."""
+    return database.get_stats()
+
+
+@app.get("/database/rollups/{table}")
+async def get_database_rollup(table: str,
+                              since: float,
+                              until: float | None = None,
+                              resolution: str | None = None,
+                              sensor: str | None = None) -> dict:
+    """
+    Returns per-minute or per-hour rollups of the Postgres `sensors` or `averages`
+    table with `since <= bucket < until`. `resolution` ("minute" or "hour")
+    defaults to hours for ranges over two days. `sensor` filters sensor rollups.
+    Sensor rows are `[bucket, sensor_id, avg, min, max, humidity, samples]`,
+    average rows `[bucket, avg, min, max, target, samples]`.
+    """
+    if database.engine != "postgres" or not database.is_connected():
+        raise HTTPException(status_code=503, detail="Rollups need a connected Postgres database")
+    try:
+        return await database.get_rollup(table, since, until or time.time(),
+                                         resolution, sensor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """Returns metrics about the daemon in the Prometheus text format."""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/relays")
+async def get_relay_stats() -> dict:
+    """
+    Returns per relay whether it is on, its cycle count, total on-time, last
+    transition and on-time and duty cycle for today and the last 7 days.
+    """
+    return controller.gpio_controller.relay_stats.summary()
+
+
+@app.get("/udp")
+async def get_udp_stats() -> dict:
+    """Returns datagram counters of the UDP listener: received, lost and rejected per sensor."""
+    if udp_protocol is None:
+        return {"enabled": False}
+    return {"enabled": True, **udp_protocol.get_stats()}
 
 
 @app.put("/sensor-status")
 async def update_sensor_status(name: str, temperature: float, humidity: float):
     """Adds or updates an entry to the sensors list keyed by `name`."""
-    controller.update_sensor_status(name, temperature, humidity)
-    if config.config["DATABASE"]["DB_ENABLED"] == "True":
-        await database.update_sensors(name, temperature, humidity)
+    try:
+        ingest.check_reading(temperature, humidity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    await _ingest_reading(name, temperature, humidity)
+    _input_changed()
 
     return "Success"
 
 
+@app.post("/sensor-status/batch")
+async def update_sensor_status_batch(request: Request) -> str:
+    """
+    Adds or updates many sensor readings at once.
+    The body is either a JSON array of `models.SensorReport` or, with any other
+    content type, line protocol as described in `ingest`.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            reports = [models.SensorReport.model_validate(report)
+                       for report in json.loads(body)]
+            readings = [(r.name, r.temperature, r.humidity, r.timestamp) for r in reports]
+        else:
+            readings = ingest.parse_line_protocol(body.decode())
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if len(readings) > ingest.MAX_BATCH_READINGS:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {ingest.MAX_BATCH_READINGS} readings per batch")
+
+    for name, temperature, humidity, timestamp in ingest.order_batch(readings):
+        await _ingest_reading(name, temperature, humidity, timestamp)
+    if readings:
+        _input_changed()
+    return f"Accepted {len(readings)} readings"
+
+
+async def _ingest_reading(name: str, temperature: float, humidity: float,
+                          timestamp: float = None):
+    """Passes one sensor reading to the controller and the database."""
+    timestamp = ingest.clamp_timestamp(timestamp)
+    if not zones.update_sensor(name, temperature, humidity, timestamp):
+        controller.update_sensor_status(name, temperature, humidity, timestamp)
+    if config.settings.database.enabled:
+        await database.update_sensors(name, temperature, humidity, timestamp)
+
+
 @app.put("/target_temperature")
 async def set_target_temp(temperature: int) -> str:
-    """Sets the temperature the thermostat aims for."""
+    """
+    Sets the temperature the thermostat aims for. While the schedule sets
+    the target this overrides it until its next transition.
+    """
+    if schedule.active() is not None:
+        schedule.set_override(temperature)
+        schedule_wakeup.set()
     controller.set_target_temp(temperature)
+    _input_changed()
     return f"Temperature set to {temperature} degrees fahrenheit"
 
 
@@ -137,6 +528,7 @@ async def set_target_temp(temperature: int) -> str:
 async def set_usable(ac: bool, cooler: bool, furnace: bool):
     """Set which systems the thermostat can use."""
     controller.set_usable(ac, cooler, furnace)
+    _input_changed()
     return "Success"
 
 
@@ -147,6 +539,96 @@ async def manual_override(override: bool, pins: models.Pins):
 
     Be careful using this if the system is hooked up to a real HVAC system.
     """
-    print(override, pins)
     controller.set_manual_override(override, pins)
+    _input_changed()
+    return "Success"
+
+
+@app.get("/schedule")
+async def get_schedule() -> dict:
+    """Returns the schedule and what of it sets the target now."""
+    return {"schedule": schedule.as_dict(), "active": schedule.active()}
+
+
+@app.put("/schedule")
+async def set_schedule(blocks: list[models.ScheduleBlock]) -> str:
+    """Replaces the blocks of the schedule."""
+    _schedule_call(schedule.set_blocks, [block.model_dump() for block in blocks])
+    return "Success"
+
+
+@app.put("/schedule/mode")
+async def set_schedule_mode(mode: str, away_temp: int | None = None) -> str:
+    """Follows the "schedule", the "away" temperature or "hold"s the current target."""
+    _schedule_call(schedule.set_mode, mode, away_temp)
+    return "Success"
+
+
+@app.put("/schedule/override")
+async def set_schedule_override(temperature: int, until: float | None = None) -> str:
+    """Holds `temperature` until `until`, by default the schedule's next transition."""
+    _schedule_call(schedule.set_override, temperature, until)
+    return "Success"
+
+
+@app.delete("/schedule/override")
+async def clear_schedule_override() -> str:
+    """Returns to the target of the schedule's mode."""
+    _schedule_call(schedule.clear_override)
     return "Success"
+
+
+def _schedule_call(function, *args):
+    """Changes the schedule and wakes its loop, answering 400 for invalid changes."""
+    try:
+        function(*args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    schedule_wakeup.set()
+
+
+@app.get("/zones")
+async def get_zones() -> dict:
+    """Returns the status of every extra zone by name, in the format of `GET /`'s status."""
+    return {"zones": zones.get_statuses()}
+
+
+@app.get("/zones/{name}")
+async def get_zone(name: str) -> dict:
+    """Returns the status of zone `name`."""
+    return {"status": _zone_call(zones.get_status, name)}
+
+
+@app.get("/zones/{name}/history")
+async def get_zone_history(name: str,
+                           since: float | None = None,
+                           until: float | None = None,
+                           max_points: int | None = None) -> dict:
+    """Gets the history of zone `name` like `GET /history`."""
+    if since is None:
+        since = time.time() - HISTORY_DEFAULT_SPAN
+    history = _zone_call(zones.get_history, name, since, until, max_points)
+    return {"history": history, "latest": history[-1][0] if history else since}
+
+
+@app.put("/zones/{name}/target_temperature")
+async def set_zone_target_temp(name: str, temperature: int) -> str:
+    """Sets the temperature zone `name` aims for."""
+    _zone_call(zones.set_target_temp, name, temperature)
+    _input_changed()
+    return f"Temperature of zone {name} set to {temperature} degrees fahrenheit"
+
+
+@app.put("/zones/{name}/usable")
+async def set_zone_usable(name: str, ac: bool, cooler: bool, furnace: bool) -> str:
+    """Set which systems zone `name` can use."""
+    _zone_call(zones.set_usable, name, ac, cooler, furnace)
+    _input_changed()
+    return "Success"
+
+
+def _zone_call(function, name: str, *args):
+    """Calls a `ZoneSet` method for zone `name`, answering 404 for unknown zones."""
+    if name not in zones.zones:
+        raise HTTPException(status_code=404, detail=f"Unknown zone {name}")
+    return function(name, *args)
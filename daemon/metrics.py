@@ -0,0 +1,231 @@
+"""
+Measures the daemon itself and renders the measurements in the Prometheus
+text format for `GET /metrics`.
+
+Metrics are plain objects updated in place: a counter increment is an
+attribute addition and a histogram observation is a bisect into
+preallocated bucket counts, so instrumentation can stay on permanently.
+There are no locks. Every metric must only be updated from one thread,
+reading it from another thread for rendering is fine under the GIL.
+
+Values that already exist elsewhere (database counters, sensor ages) are
+read at scrape time by collectors registered with `Registry.collector`
+instead of being mirrored on every update.
+"""
+
+import time
+from bisect import bisect_left
+
+# Seconds. Fits everything from a handler answering from cache to a slow SD card write.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """A value that only goes up."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        """Adds `amount`, which must not be negative."""
+        self.value += amount
+
+    def samples(self, name: str, labels: str):
+        """Yields the lines of this metric."""
+        yield f"{name}{labels} {_format_value(self.value)}"
+
+
+class Gauge:
+    """A value that can go up and down."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        """Replaces the value."""
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        """Adds `amount`."""
+        self.value += amount
+
+    def samples(self, name: str, labels: str):
+        """Yields the lines of this metric."""
+        yield f"{name}{labels} {_format_value(self.value)}"
+
+
+class Histogram:
+    """Counts observations in buckets with fixed upper bounds."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        # The last count is for observations above every bound.
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Records one observation."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str):
+        """Yields the lines of this metric with cumulative buckets."""
+        separator = labels[:-1] + "," if labels else "{"
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{separator}le="{_format_value(bound)}"}} {cumulative}'
+        yield f'{name}_bucket{separator}le="+Inf"}} {self.count}'
+        yield f"{name}_sum{labels} {_format_value(self.sum)}"
+        yield f"{name}_count{labels} {self.count}"
+
+
+class Family:
+    """
+    A metric split by labels. `labels(...)` returns the metric for one
+    combination of label values, creating it on first use. Hot paths
+    should keep the returned metric instead of looking it up every time.
+    """
+    def __init__(self, name: str, documentation: str, kind: str,
+                 label_names: tuple, factory):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children = {}
+
+    def labels(self, *values):
+        """The metric for `values`, one per label name."""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            child = self.children[values] = self.factory()
+        return child
+
+    def render(self):
+        """Yields the lines of every metric of the family."""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in list(self.children.items()):
+            yield from child.samples(self.name, format_labels(self.label_names, values))
+
+
+class Registry:
+    """All metrics of the daemon."""
+    def __init__(self):
+        self.families = {}
+        self.collectors = []
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()):
+        """Registers a counter. Returns it, or its `Family` if it has labels."""
+        return self._register(name, documentation, COUNTER, labels, Counter)
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()):
+        """Registers a gauge. Returns it, or its `Family` if it has labels."""
+        return self._register(name, documentation, GAUGE, labels, Gauge)
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS):
+        """Registers a histogram. Returns it, or its `Family` if it has labels."""
+        return self._register(name, documentation, HISTOGRAM, labels,
+                              lambda: Histogram(buckets))
+
+    def collector(self, function):
+        """
+        Registers `function` to be called on every scrape. It returns an
+        iterable of `(name, documentation, kind, samples)` where `samples`
+        is a list of `(labels dict, value)` pairs.
+        """
+        self.collectors.append(function)
+        return function
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for family in self.families.values():
+            lines.extend(family.render())
+        for function in self.collectors:
+            for name, documentation, kind, samples in function():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels.keys(), labels.values())} "
+                                 f"{_format_value(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+    def _register(self, name, documentation, kind, labels, factory):
+        if name in self.families:
+            raise ValueError(f"Metric {name} is already registered")
+        family = Family(name, documentation, kind, labels, factory)
+        self.families[name] = family
+        if not labels:
+            return family.labels()
+        return family
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording the time until the response starts per route.
+    Streaming responses such as `/events` are measured until their headers
+    are sent, not until the stream ends.
+    """
+    def __init__(self, app, histogram: Family):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                self._observe(scope, message["status"], time.perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+    def _observe(self, scope, status: int, seconds: float):
+        # The router stores the matched route in the scope. Unmatched paths
+        # share one label so scanners cannot create unbounded series.
+        route = scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        self.histogram.labels(scope["method"], path, str(status)).observe(seconds)
+
+
+def format_labels(names, values) -> str:
+    """Formats label pairs as `{name="value",...}`, or "" without labels."""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        if value == float("-inf"):
+            return "-Inf"
+    return repr(value)
+
+
+registry = Registry()
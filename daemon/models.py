@@ -1,6 +1,6 @@
 """Defines datatypes FastAPI can send/receive."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, FiniteFloat
 
 
 class Pins(BaseModel):
@@ -25,7 +25,24 @@ class Status(BaseModel):
     target_temp: int
     average_temp: float
     manual_override: bool
+    temperature_slope: float | None = None
     sensors: dict[str, dict]
+    schedule: dict | None = None
+
+
+class SensorReport(BaseModel):
+    """One reading in a batch sent to `/sensor-status/batch`."""
+    name: str
+    temperature: FiniteFloat
+    humidity: FiniteFloat
+    timestamp: FiniteFloat | None = None
+
+
+class ScheduleBlock(BaseModel):
+    """Target from `start` ("HH:MM") on `days` (0 is Monday) until the next block."""
+    days: list[int]
+    start: str
+    target: int
 
 
 class StatusObject(BaseModel):
@@ -34,3 +51,4 @@ class StatusObject(BaseModel):
 
 class HistoryObject(BaseModel):
     history: list
+    latest: float | None = None
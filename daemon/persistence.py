@@ -0,0 +1,165 @@
+"""
+Writes state files to the SD card as rarely and as safely as possible.
+
+`FileWriter` skips content that is already on disk, coalesces changes to at
+most one write per `min_interval` and writes atomically (temp file, fsync,
+rename) on a background thread so the event loop never blocks on the disk.
+A change held back by the interval is written by a timer once it expires,
+without waiting for another change.
+"""
+
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+MIN_WRITE_INTERVAL = 60  # seconds
+NEW_FILE_MODE = 0o644  # of files that did not exist, temp files are created 0600
+
+FILE_WRITE_SECONDS = metrics.registry.histogram(
+    "thermostat_file_write_seconds", "Duration of atomic state file writes.", ("path",))
+FILE_WRITE_BYTES = metrics.registry.counter(
+    "thermostat_file_write_bytes_total", "Bytes written to state files.", ("path",))
+FILE_WRITES_SKIPPED = metrics.registry.counter(
+    "thermostat_file_writes_skipped_total",
+    "Submitted state files that were already on disk.", ("path",))
+
+
+def write_atomic(path: str, data: bytes):
+    """
+    Replaces `path` with `data` so that either the old or the new content
+    survives a power loss, never a truncated file. The file keeps its mode.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = NEW_FILE_MODE
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            os.fchmod(file.fileno(), mode)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class FileWriter:
+    """Persists the latest submitted content of one file, rate limited and off the event loop."""
+    def __init__(self, path: str, log, min_interval: float = MIN_WRITE_INTERVAL):
+        self.path = path
+        self.log = log
+        self.min_interval = min_interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+        self.pending = None
+        self.written_digest = None
+        self.last_write_time = None
+        self.future = None
+        self.timer = None
+        self.closed = False
+        # Guards the pending content against the timer and write callbacks.
+        self.lock = threading.RLock()
+        self.writes = 0
+        self.skipped = 0
+        self.write_seconds = FILE_WRITE_SECONDS.labels(path)
+        self.write_bytes = FILE_WRITE_BYTES.labels(path)
+        self.skipped_metric = FILE_WRITES_SKIPPED.labels(path)
+
+    def submit(self, data: bytes):
+        """
+        Schedules `data` to be written. Unchanged content is skipped and changes
+        within `min_interval` of the last write are written when it expires,
+        only the latest of them.
+        """
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        with self.lock:
+            if digest == self.written_digest:
+                self.pending = None
+                self.skipped += 1
+                self.skipped_metric.inc()
+                return
+            self.pending = (data, digest)
+            self._start_pending()
+
+    def flush(self):
+        """Waits for the running write and writes any pending content now."""
+        while True:
+            with self.lock:
+                self._cancel_timer()
+                future = self.future
+                if future is None or future.done():
+                    pending, self.pending = self.pending, None
+                    if pending is not None:
+                        self._write(*pending)
+                    return
+            future.result()
+
+    def close(self):
+        """Flushes pending content and stops the writer thread."""
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self._cancel_timer()
+        self.executor.shutdown()
+
+    def _start_pending(self):
+        """Starts writing the pending content, or a timer for when the interval allows it."""
+        if self.pending is None or self.closed or self.timer is not None:
+            return
+        if self.future is not None and not self.future.done():
+            return  # `_write_done` comes back here
+        now = time.monotonic()
+        if self.last_write_time is not None:
+            delay = self.last_write_time + self.min_interval - now
+            if delay > 0:
+                self.timer = threading.Timer(delay, self._timer_expired)
+                self.timer.daemon = True
+                self.timer.start()
+                return
+        data, digest = self.pending
+        self.pending = None
+        self.last_write_time = now
+        self.future = self.executor.submit(self._write, data, digest)
+        self.future.add_done_callback(self._write_done)
+
+    def _timer_expired(self):
+        with self.lock:
+            self.timer = None
+            self._start_pending()
+
+    def _write_done(self, _future):
+        with self.lock:
+            self._start_pending()
+
+    def _cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def _write(self, data: bytes, digest: bytes):
+        start = time.perf_counter()
+        try:
+            write_atomic(self.path, data)
+        # pylint: disable=W0718
+        except Exception as e:
+            self.log.error("Writing %s failed with: %s", self.path, e)
+        else:
+            self.written_digest = digest
+            self.writes += 1
+            self.write_seconds.observe(time.perf_counter() - start)
+            self.write_bytes.inc(len(data))
@@ -0,0 +1,156 @@
+"""
+Accounts how long and how often each relay of the HVAC system runs.
+
+`RelayStats` keeps cumulative on-time, cycle counts and the last transition
+per relay plus on-time per local calendar day, which is enough for daily and
+weekly duty cycles without querying the `pins` table. It is updated only on
+relay transitions and persisted as a small JSON file through `FileWriter`.
+"""
+
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from persistence import FileWriter
+
+RELAYS_PATH = "relays.json"
+DAYS_KEPT = 28
+WEEK_DAYS = 7
+
+
+class RelayStats:
+    """Runtime accounting for the relays named in `relays`."""
+    def __init__(self, relays: tuple, log, path: str = RELAYS_PATH):
+        self.relays = tuple(relays)
+        self.log = log
+        self.started = time.time()
+        self.cycles = dict.fromkeys(self.relays, 0)
+        self.on_seconds = dict.fromkeys(self.relays, 0.0)
+        self.last_transition = dict.fromkeys(self.relays)
+        self.on_since = {}
+        # ISO date -> {relay: seconds on during that day}
+        self.days = {}
+        self.writer = FileWriter(path, log) if path else None
+        if path:
+            self._load(path)
+
+    def transition(self, relay: str, on: bool, now: float = None):
+        """Records that `relay` switched on or off at `now`."""
+        if now is None:
+            now = time.time()
+        if on == (relay in self.on_since):
+            return
+        self.last_transition[relay] = now
+        if on:
+            self.cycles[relay] += 1
+            self.on_since[relay] = now
+        else:
+            self._add_on_time(relay, self.on_since.pop(relay), now)
+        self._persist()
+
+    def total_on_seconds(self, relay: str, now: float = None) -> float:
+        """Seconds `relay` has been on in total, including a running cycle."""
+        seconds = self.on_seconds[relay]
+        since = self.on_since.get(relay)
+        if since is not None:
+            seconds += (now if now is not None else time.time()) - since
+        return seconds
+
+    def summary(self, now: float = None) -> dict:
+        """
+        Per relay: whether it is on, cycles, total on-time, last transition
+        and on-time plus duty cycle for today and the last `WEEK_DAYS` days.
+        """
+        if now is None:
+            now = time.time()
+        today = datetime.fromtimestamp(now).date()
+        week_first = today - timedelta(days=WEEK_DAYS - 1)
+        # ISO dates compare like the dates they represent.
+        today_key, week_key = today.isoformat(), week_first.isoformat()
+        # Duty cycles relate to the time since tracking began if that is shorter.
+        tracked_since = self.started
+        if self.days:
+            tracked_since = min(tracked_since, _day_start(date.fromisoformat(min(self.days))))
+        day_seconds = now - max(_day_start(today), tracked_since)
+        week_seconds = now - max(_day_start(week_first), tracked_since)
+
+        days = list(self.days.items())
+        result = {}
+        for relay in self.relays:
+            on_by_day = [(day, seconds.get(relay, 0.0)) for day, seconds in days]
+            since = self.on_since.get(relay)
+            if since is not None:
+                on_by_day.extend(_split_by_day(since, now))
+            today_on = sum((seconds for day, seconds in on_by_day if day == today_key), 0.0)
+            week_on = sum((seconds for day, seconds in on_by_day if day >= week_key), 0.0)
+            result[relay] = {
+                "on": since is not None,
+                "cycles": self.cycles[relay],
+                "on_seconds": self.total_on_seconds(relay, now),
+                "last_transition": self.last_transition[relay],
+                "today_on_seconds": today_on,
+                "today_duty_cycle": _ratio(today_on, day_seconds),
+                "week_on_seconds": week_on,
+                "week_duty_cycle": _ratio(week_on, week_seconds),
+            }
+        return result
+
+    def close(self, now: float = None):
+        """Ends running cycles, since the relays are switched off on exit, and writes the file."""
+        for relay in list(self.on_since):
+            self.transition(relay, False, now)
+        if self.writer is not None:
+            self.writer.close()
+
+    def _add_on_time(self, relay: str, start: float, end: float):
+        self.on_seconds[relay] += end - start
+        for day, seconds in _split_by_day(start, end):
+            totals = self.days.setdefault(day, {})
+            totals[relay] = totals.get(relay, 0.0) + seconds
+        while len(self.days) > DAYS_KEPT:
+            del self.days[min(self.days)]
+
+    def _persist(self):
+        if self.writer is None:
+            return
+        self.writer.submit(json.dumps({
+            "started": self.started,
+            "cycles": self.cycles,
+            "on_seconds": self.on_seconds,
+            "last_transition": self.last_transition,
+            "days": self.days,
+        }).encode())
+
+    def _load(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                saved = json.loads(file.read())
+            self.started = saved["started"]
+            for relay in self.relays:
+                self.cycles[relay] = saved["cycles"].get(relay, 0)
+                self.on_seconds[relay] = saved["on_seconds"].get(relay, 0.0)
+                self.last_transition[relay] = saved["last_transition"].get(relay)
+            self.days = saved["days"]
+        except FileNotFoundError:
+            pass
+        # pylint: disable=W0718
+        except Exception as e:
+            self.log.warning("Ignoring unreadable %s: %s", path, e)
+
+
+def _day_start(day: date) -> float:
+    return datetime(day.year, day.month, day.day).timestamp()
+
+
+def _split_by_day(start: float, end: float):
+    """Yields `(ISO date, seconds)` for the parts of `start`..`end` in each local day."""
+    while start < end:
+        day = datetime.fromtimestamp(start).date()
+        next_day = _day_start(day + timedelta(days=1))
+        part_end = min(end, next_day)
+        yield day.isoformat(), part_end - start
+        start = part_end
+
+
+def _ratio(part: float, whole: float) -> float:
+    return min(part / whole, 1.0) if whole > 0 else 0.0
@@ -0,0 +1,202 @@
+"""
+SQL for the Postgres rollup tables, indexes, partitions and retention.
+
+The raw `sensors` and `averages` tables are summarized per minute and per
+hour into `sensors_minute`, `sensors_hour`, `averages_minute` and
+`averages_hour`. A rollup recomputes every hour touched by newly flushed
+rows, minutes from the raw rows and hours from the minute rollup, and
+upserts the buckets, so repeating a run is harmless and late rows are picked up.
+
+All times are `timestamptz`. asyncpg returns them as aware UTC datetimes and
+reads naive datetimes, like the raw rows' `datetime.now()`, as local time,
+so conversions use aware datetimes and never drop the time zone.
+"""
+
+from datetime import date, datetime, timezone
+
+MINUTE = "minute"
+HOUR = "hour"
+RESOLUTIONS = {MINUTE: 60, HOUR: 60 * 60}
+AUTO_HOUR_SPAN = 2 * 24 * 60 * 60  # ranges longer than this are served per hour
+MAX_ROLLUP_ROWS = 10000
+RAW_TABLES = ("sensors", "averages", "pins")
+ROLLED_UP_TABLES = ("sensors", "averages")
+
+CREATE_ROLLUP_QUERIES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS sensors_{resolution} (
+        bucket timestamptz,
+        sensor_id text,
+        temperature_avg real,
+        temperature_min real,
+        temperature_max real,
+        humidity_avg real,
+        samples integer,
+        PRIMARY KEY (sensor_id, bucket)
+    )
+    """ for resolution in RESOLUTIONS
+] + [
+    f"""
+    CREATE TABLE IF NOT EXISTS averages_{resolution} (
+        bucket timestamptz PRIMARY KEY,
+        average_temp_avg real,
+        average_temp_min real,
+        average_temp_max real,
+        target_temp real,
+        samples integer
+    )
+    """ for resolution in RESOLUTIONS
+] + [
+    # BRIN indexes stay tiny on append-only tables ordered by time.
+    f"CREATE INDEX IF NOT EXISTS {table}_time_brin ON {table} USING brin (time)"
+    for table in RAW_TABLES
+] + [
+    f"CREATE INDEX IF NOT EXISTS sensors_{resolution}_bucket ON sensors_{resolution} (bucket)"
+    for resolution in RESOLUTIONS
+]
+
+# In order: hours are built from the minutes computed just before.
+ROLLUP_QUERIES = [
+    """
+    INSERT INTO sensors_minute
+    SELECT date_trunc('minute', time), sensor_id, avg(temperature), min(temperature),
+           max(temperature), avg(humidity), count(*)
+    FROM sensors WHERE time >= date_trunc('hour', $1::timestamptz)
+    GROUP BY 1, 2
+    ON CONFLICT (sensor_id, bucket) DO UPDATE SET
+        temperature_avg = EXCLUDED.temperature_avg,
+        temperature_min = EXCLUDED.temperature_min,
+        temperature_max = EXCLUDED.temperature_max,
+        humidity_avg = EXCLUDED.humidity_avg,
+        samples = EXCLUDED.samples
+    """,
+    """
+    INSERT INTO averages_minute
+    SELECT date_trunc('minute', time), avg(average_temp), min(average_temp),
+           max(average_temp), avg(target_temp), count(*)
+    FROM averages WHERE time >= date_trunc('hour', $1::timestamptz)
+    GROUP BY 1
+    ON CONFLICT (bucket) DO UPDATE SET
+        average_temp_avg = EXCLUDED.average_temp_avg,
+        average_temp_min = EXCLUDED.average_temp_min,
+        average_temp_max = EXCLUDED.average_temp_max,
+        target_temp = EXCLUDED.target_temp,
+        samples = EXCLUDED.samples
+    """,
+    """
+    INSERT INTO sensors_hour
+    SELECT date_trunc('hour', bucket), sensor_id,
+           sum(temperature_avg * samples) / sum(samples), min(temperature_min),
+           max(temperature_max), sum(humidity_avg * samples) / sum(samples), sum(samples)
+    FROM sensors_minute WHERE bucket >= date_trunc('hour', $1::timestamptz)
+    GROUP BY 1, 2
+    ON CONFLICT (sensor_id, bucket) DO UPDATE SET
+        temperature_avg = EXCLUDED.temperature_avg,
+        temperature_min = EXCLUDED.temperature_min,
+        temperature_max = EXCLUDED.temperature_max,
+        humidity_avg = EXCLUDED.humidity_avg,
+        samples = EXCLUDED.samples
+    """,
+    """
+    INSERT INTO averages_hour
+    SELECT date_trunc('hour', bucket),
+           sum(average_temp_avg * samples) / sum(samples), min(average_temp_min),
+           max(average_temp_max), sum(target_temp * samples) / sum(samples), sum(samples)
+    FROM averages_minute WHERE bucket >= date_trunc('hour', $1::timestamptz)
+    GROUP BY 1
+    ON CONFLICT (bucket) DO UPDATE SET
+        average_temp_avg = EXCLUDED.average_temp_avg,
+        average_temp_min = EXCLUDED.average_temp_min,
+        average_temp_max = EXCLUDED.average_temp_max,
+        target_temp = EXCLUDED.target_temp,
+        samples = EXCLUDED.samples
+    """,
+]
+
+# Where a rollup resumes after a restart: the newest minute bucket, or everything.
+ROLLUP_WATERMARK_QUERY = """
+    SELECT least((SELECT max(bucket) FROM sensors_minute),
+                 (SELECT max(bucket) FROM averages_minute))
+"""
+
+SELECT_ROLLUP_QUERIES = {
+    "sensors": """
+        SELECT bucket, sensor_id, temperature_avg, temperature_min, temperature_max,
+               humidity_avg, samples
+        FROM sensors_{resolution}
+        WHERE bucket >= $1 AND bucket < $2 AND ($3::text IS NULL OR sensor_id = $3)
+        ORDER BY bucket, sensor_id LIMIT $4
+    """,
+    "averages": """
+        SELECT bucket, average_temp_avg, average_temp_min, average_temp_max,
+               target_temp, samples
+        FROM averages_{resolution}
+        WHERE bucket >= $1 AND bucket < $2
+        ORDER BY bucket LIMIT $3
+    """,
+}
+
+IS_PARTITIONED_QUERY = "SELECT relkind = 'p' FROM pg_class WHERE relname = $1"
+PARTITIONS_QUERY = """
+    SELECT child.relname FROM pg_inherits
+    JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+    JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+    WHERE parent.relname = $1
+"""
+
+
+def choose_resolution(since: float, until: float) -> str:
+    """The rollup resolution for a range: minutes for short ranges, hours for long ones."""
+    return HOUR if until - since > AUTO_HOUR_SPAN else MINUTE
+
+
+def to_datetime(timestamp: float) -> datetime:
+    """Epoch seconds as an aware UTC datetime."""
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def to_epoch(value: datetime) -> float:
+    """A datetime read from the tables as epoch seconds."""
+    return value.timestamp()
+
+
+def to_aware(value: datetime) -> datetime:
+    """`value` as an aware UTC datetime, reading naive datetimes as local time like asyncpg."""
+    return value.astimezone(timezone.utc)
+
+
+def month_start(day: date, months_ahead: int = 0) -> date:
+    """First day of the month `months_ahead` months after the one containing `day`."""
+    month = day.month - 1 + months_ahead
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Name of the partition of `table` holding `month`."""
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(table: str, name: str):
+    """The month held by a partition named by `partition_name`, None for other names."""
+    prefix = f"{table}_y"
+    if not name.startswith(prefix) or len(name) != len(prefix) + 7 or name[-3] != "m":
+        return None
+    try:
+        return date(int(name[-7:-3]), int(name[-2:]), 1)
+    except ValueError:
+        return None
+
+
+def create_table_query(table: str, columns: str, partitioned: bool) -> str:
+    """CREATE TABLE for a raw table, partitioned by month of `time` if `partitioned`."""
+    partitioning = " PARTITION BY RANGE (time)" if partitioned else ""
+    return f"CREATE TABLE IF NOT EXISTS {table} ({columns}){partitioning}"
+
+
+def create_partition_queries(table: str, month: date) -> list:
+    """Queries creating the default partition and the partition for `month` of `table`."""
+    return [
+        f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT",
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')",
+    ]
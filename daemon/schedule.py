@@ -0,0 +1,206 @@
+"""
+Setpoint schedule of the main thermostat.
+
+The schedule is a list of blocks, each setting a target from its `start`
+("HH:MM", local time) on its `days` (0 is Monday) until the next block
+starts. The blocks compile into one table of transitions per week, sorted
+by their offset from Monday 00:00, so the active block is found with a
+bisect and the next transition is the entry after it.
+
+The mode decides what the thermostat follows:
+ - "schedule": the blocks
+ - "away": `away_temp`
+ - "hold": nothing, the target stays wherever it was set
+
+A temporary override beats every mode. It ends at its `until` time, by
+default the next transition, or when it or the mode is changed.
+
+The schedule is kept in `schedule.json` next to `status.json`.
+"""
+
+import json
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from pydantic_core import to_json
+
+from persistence import FileWriter
+
+SCHEDULE_PATH = "schedule.json"
+MODES = ("schedule", "away", "hold")
+DAY = 24 * 60 * 60
+WEEK = 7 * DAY
+
+
+def parse_block(block: dict) -> dict:
+    """
+    Checks one block, e.g. `{"days": [0, 1], "start": "06:30", "target": 70}`,
+    and returns it normalized. Raises ValueError naming the invalid field.
+    """
+    try:
+        days = sorted({int(day) for day in block["days"]})
+        start = str(block["start"])
+        target = int(block["target"])
+    except KeyError as e:
+        raise ValueError(f"Schedule block {block} has no {e}") from e
+    except TypeError as e:
+        raise ValueError(f"Invalid schedule block {block}: {e}") from e
+    if not days or days[0] < 0 or days[-1] > 6:
+        raise ValueError(f"days of schedule block {block} must be 0 (Monday) to 6 (Sunday)")
+    hours, _, minutes = start.partition(":")
+    if not (hours.isdigit() and minutes.isdigit() and int(hours) < 24 and int(minutes) < 60):
+        raise ValueError(f"start of schedule block {block} must be HH:MM, got {start!r}")
+    return {"days": days, "start": f"{int(hours):02}:{int(minutes):02}", "target": target}
+
+
+def compile_blocks(blocks: list) -> tuple:
+    """
+    The sorted transition table of `blocks`: the offsets in seconds from
+    Monday 00:00 and, at the same index, the block starting there.
+    Raises ValueError if two blocks start at the same time.
+    """
+    transitions = {}
+    for block in blocks:
+        hours, minutes = block["start"].split(":")
+        for day in block["days"]:
+            offset = day * DAY + int(hours) * 3600 + int(minutes) * 60
+            if offset in transitions:
+                raise ValueError(f"Two schedule blocks start on day {day} at {block['start']}")
+            transitions[offset] = block
+    offsets = sorted(transitions)
+    return offsets, [transitions[offset] for offset in offsets]
+
+
+class Schedule:
+    """The blocks, mode and override, and which of them sets the target at a time."""
+    def __init__(self, log, path: str = SCHEDULE_PATH):
+        self.log = log
+        self.path = path
+        self.blocks = []
+        self.offsets = []
+        self.entries = []
+        self.mode = "schedule"
+        self.away_temp = 62
+        # (target, until) with until None for an override without end
+        self.override = None
+        self.writer = FileWriter(path, log, min_interval=0) if path else None
+        self._load()
+
+    def set_blocks(self, blocks: list):
+        """Replaces the blocks. Raises ValueError and keeps the old ones if one is invalid."""
+        blocks = [parse_block(block) for block in blocks]
+        self.offsets, self.entries = compile_blocks(blocks)
+        self.blocks = blocks
+        self._persist()
+
+    def set_mode(self, mode: str, away_temp: int = None):
+        """Switches to `mode`, ending any override. Raises ValueError for unknown modes."""
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}, got {mode!r}")
+        self.mode = mode
+        if away_temp is not None:
+            self.away_temp = int(away_temp)
+        self.override = None
+        self._persist()
+
+    def set_override(self, target: int, until: float = None, now: float = None):
+        """
+        Holds `target` until `until`, by default until the next transition of
+        the schedule, or without end if the schedule has none coming.
+        """
+        if until is None and self.mode == "schedule" and self.offsets:
+            until = self._locate(time.time() if now is None else now)[1]
+        self.override = (int(target), until)
+        self._persist()
+
+    def clear_override(self):
+        """Returns to the mode's target."""
+        self.override = None
+        self._persist()
+
+    def expire(self, now: float = None) -> bool:
+        """Drops an override whose time is up. Returns whether it did."""
+        if self.override is None or self.override[1] is None:
+            return False
+        if (time.time() if now is None else now) < self.override[1]:
+            return False
+        self.override = None
+        self._persist()
+        return True
+
+    def active(self, now: float = None) -> dict:
+        """
+        What sets the target at `now`: its `source` ("override", "away" or
+        "schedule"), `target` and `until` when it ends, plus `days` and
+        `start` of a block. None in hold mode or without blocks.
+        """
+        if now is None:
+            now = time.time()
+        if self.override is not None:
+            target, until = self.override
+            if until is None or now < until:
+                return {"source": "override", "target": target, "until": until}
+        if self.mode == "away":
+            return {"source": "away", "target": self.away_temp, "until": None}
+        if self.mode == "hold" or not self.offsets:
+            return None
+        index, until = self._locate(now)
+        block = self.entries[index]
+        return {"source": "schedule", "target": block["target"], "until": until,
+                "days": block["days"], "start": block["start"]}
+
+    def as_dict(self) -> dict:
+        """The schedule in the format of the schedule file."""
+        override = None
+        if self.override is not None:
+            override = {"target": self.override[0], "until": self.override[1]}
+        return {"mode": self.mode, "away_temp": self.away_temp, "blocks": self.blocks,
+                "override": override}
+
+    def close(self):
+        """Writes pending changes."""
+        if self.writer is not None:
+            self.writer.close()
+
+    def _locate(self, now: float) -> tuple:
+        """Index of the block active at `now` and the time of the next transition."""
+        local = datetime.fromtimestamp(now)
+        week_start = datetime.combine(local.date() - timedelta(days=local.weekday()),
+                                      datetime.min.time())
+        offset = (local - week_start).total_seconds()
+        # -1 is the last block of the week before, which is still running.
+        index = bisect_right(self.offsets, offset) - 1
+        if index + 1 < len(self.offsets):
+            next_offset = self.offsets[index + 1]
+        else:
+            next_offset = self.offsets[0] + WEEK
+        # Local wall time arithmetic keeps transitions right across DST changes.
+        return index, (week_start + timedelta(seconds=next_offset)).timestamp()
+
+    def _persist(self):
+        if self.writer is not None:
+            self.writer.submit(to_json(self.as_dict()))
+
+    def _load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                saved = json.loads(file.read())
+            blocks = [parse_block(block) for block in saved["blocks"]]
+            offsets, entries = compile_blocks(blocks)
+            if saved["mode"] not in MODES:
+                raise ValueError(f"unknown mode {saved['mode']!r}")
+            away_temp = int(saved["away_temp"])
+            override = saved.get("override")
+            if override is not None:
+                override = (int(override["target"]), override["until"])
+        except FileNotFoundError:
+            return
+        # pylint: disable=W0718
+        except Exception as e:
+            self.log.warning("Ignoring unreadable %s: %s", self.path, e)
+            return
+        self.blocks, self.offsets, self.entries = blocks, offsets, entries
+        self.mode, self.away_temp, self.override = saved["mode"], away_temp, override
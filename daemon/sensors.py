@@ -0,0 +1,254 @@
+"""
+Keeps the latest reading of every sensor and aggregates them incrementally.
+
+`SensorRegistry` maintains a running weighted sum, a sorted list of
+temperatures and a min-heap of report times, so updating a sensor, expiring
+stale sensors and reading the mean cost O(1)/O(log n) instead of a rescan of
+every sensor.
+
+With `conditioning` each sensor's readings pass a `filters.SensorFilter`
+first: outliers are rejected and the aggregate is taken over the smoothed
+temperatures, along with the mean slope.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+
+import metrics
+from filters import SensorFilter
+
+MEAN = "mean"
+MEDIAN = "median"
+TRIMMED_MEAN = "trimmed_mean"
+AGGREGATIONS = (MEAN, MEDIAN, TRIMMED_MEAN)
+
+DEFAULT_TRIM_FRACTION = 0.2  # share of readings dropped at each end by TRIMMED_MEAN
+RECOMPUTE_EVERY = 10000  # updates between exact recomputations of the running sums
+
+# Metric label of every sensor the config does not name, so clients cannot
+# create label values without bound.
+OTHER_SENSORS = "other"
+SENSOR_OUTLIERS = metrics.registry.counter(
+    "thermostat_sensor_outliers_total", "Readings rejected as outliers per sensor.", ("sensor",))
+
+
+class SensorReading:
+    """
+    Latest reading reported by one sensor. `temperature` is what the
+    aggregate uses, the smoothed temperature if the sensor is conditioned,
+    and `reported` what the sensor sent.
+    """
+    __slots__ = ("name", "temperature", "humidity", "timestamp", "weight", "reported", "slope")
+
+    def __init__(self, name: str, temperature: float, humidity: float,
+                 timestamp: float, weight: float, reported: float = None, slope: float = None):
+        self.name = name
+        self.temperature = temperature
+        self.humidity = humidity
+        self.timestamp = timestamp
+        self.weight = weight
+        self.reported = temperature if reported is None else reported
+        self.slope = slope
+
+    def as_dict(self) -> dict:
+        """The reading in the format of `models.Status.sensors`."""
+        result = {
+            "humidity": self.humidity,
+            "temperature": self.reported,
+            "timestamp": self.timestamp}
+        if self.slope is not None:
+            result["filtered_temperature"] = self.temperature
+            result["slope"] = self.slope
+        return result
+
+
+class SensorRegistry:
+    """
+    Latest readings of all sensors that reported within `stale_timeout` seconds.
+
+    The aggregate is a weighted mean, a median or a trimmed mean. Weights are
+    looked up by sensor name, then by the sensor's room, and default to 1.
+    Median and trimmed mean ignore weights. Names are matched case-insensitively
+    against `weights` and `rooms`. Slopes are in degrees per hour and
+    averaged with the weights of the mean.
+    """
+    def __init__(self, stale_timeout: float, aggregation: str = MEAN,
+                 weights: dict = None, rooms: dict = None,
+                 trim_fraction: float = DEFAULT_TRIM_FRACTION, conditioning=None):
+        self.stale_timeout = stale_timeout
+        self.aggregation = MEAN
+        self.weights = {}
+        self.rooms = {}
+        self.trim_fraction = trim_fraction
+        self.readings = {}
+        self.heap = []
+        self.sorted_temps = []
+        self.weighted_sum = 0.0
+        self.total_weight = 0.0
+        self.slope_sum = 0.0
+        self.slope_weight = 0.0
+        self.updates = 0
+        self.conditioning = None
+        # name -> SensorFilter of every live sensor
+        self.filters = {}
+        # lower case names besides `weights` and `rooms` that get their own metric label
+        self.labelled = set()
+        self.configure(aggregation, weights, rooms, trim_fraction, conditioning)
+
+    def __len__(self):
+        return len(self.readings)
+
+    def __contains__(self, name: str):
+        return name in self.readings
+
+    def get(self, name: str):
+        """Latest `SensorReading` of `name`, None if unknown or stale."""
+        return self.readings.get(name)
+
+    def configure(self, aggregation: str = MEAN, weights: dict = None,
+                  rooms: dict = None, trim_fraction: float = DEFAULT_TRIM_FRACTION,
+                  conditioning=None):
+        """
+        Changes the aggregation method, weights and the `filters.Conditioning`
+        of the readings, None for none. Changed conditioning restarts the filters.
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {aggregation}, use one of {AGGREGATIONS}")
+        self.aggregation = aggregation
+        self.weights = {key.lower(): float(value) for key, value in (weights or {}).items()}
+        self.rooms = {key.lower(): value.lower() for key, value in (rooms or {}).items()}
+        self.trim_fraction = trim_fraction
+        if conditioning != self.conditioning:
+            self.conditioning = conditioning
+            self.filters = {}
+        for reading in self.readings.values():
+            reading.weight = self.weight_of(reading.name)
+        self._recompute()
+
+    def weight_of(self, name: str) -> float:
+        """Weight of the sensor `name` in the mean."""
+        key = name.lower()
+        if key in self.weights:
+            return self.weights[key]
+        return self.weights.get(self.rooms.get(key), 1.0)
+
+    def metric_label(self, name: str) -> str:
+        """Label of `name` in metrics: its lower case name if the config names it, else "other"."""
+        key = name.lower()
+        if key in self.weights or key in self.rooms or key in self.labelled:
+            return key
+        return OTHER_SENSORS
+
+    def update(self, name: str, temperature: float, humidity: float, timestamp: float):
+        """Adds or replaces the reading of `name`. Older readings than the current one are ignored."""
+        previous = self.readings.get(name)
+        if previous is not None:
+            if timestamp < previous.timestamp:
+                return previous
+            self._remove(previous)
+        reported, slope = temperature, None
+        if self.conditioning is not None:
+            sensor_filter = self.filters.get(name)
+            if sensor_filter is None:
+                sensor_filter = self.filters[name] = SensorFilter(self.conditioning)
+            if not sensor_filter.update(temperature, timestamp):
+                SENSOR_OUTLIERS.labels(self.metric_label(name)).inc()
+                if previous is not None:
+                    # Keep the previous values, but the sensor is alive.
+                    temperature, reported = previous.temperature, previous.reported
+            if sensor_filter.level is not None:
+                temperature, slope = sensor_filter.level, sensor_filter.slope
+        reading = SensorReading(name, temperature, humidity, timestamp, self.weight_of(name),
+                                reported, slope)
+        self.readings[name] = reading
+        self.weighted_sum += temperature * reading.weight
+        self.total_weight += reading.weight
+        if slope is not None:
+            self.slope_sum += slope * reading.weight
+            self.slope_weight += reading.weight
+        insort(self.sorted_temps, temperature)
+        heapq.heappush(self.heap, (timestamp, name))
+
+        self.updates += 1
+        if self.updates % RECOMPUTE_EVERY == 0:
+            self._recompute()
+        if len(self.heap) > 4 * len(self.readings) + 16:
+            self.heap = [(r.timestamp, r.name) for r in self.readings.values()]
+            heapq.heapify(self.heap)
+        return reading
+
+    def expire(self, now: float) -> list:
+        """Removes sensors that have not reported for `stale_timeout` seconds. Returns their names."""
+        expired = []
+        while self.heap and self.heap[0][0] + self.stale_timeout <= now:
+            timestamp, name = heapq.heappop(self.heap)
+            reading = self.readings.get(name)
+            if reading is not None and reading.timestamp == timestamp:
+                self._remove(reading)
+                del self.readings[name]
+                self.filters.pop(name, None)
+                expired.append(name)
+        if not self.readings:
+            self._recompute()
+        return expired
+
+    def next_expiry(self):
+        """Time at which the oldest sensor goes stale, None without sensors."""
+        while self.heap:
+            timestamp, name = self.heap[0]
+            reading = self.readings.get(name)
+            if reading is not None and reading.timestamp == timestamp:
+                return timestamp + self.stale_timeout
+            heapq.heappop(self.heap)
+        return None
+
+    def average(self):
+        """Aggregated temperature of all sensors, None without sensors."""
+        if not self.readings:
+            return None
+        if self.aggregation == MEDIAN:
+            return self._median()
+        if self.aggregation == TRIMMED_MEAN:
+            return self._trimmed_mean()
+        if self.total_weight <= 0:
+            return None
+        return self.weighted_sum / self.total_weight
+
+    def slope(self):
+        """Weighted mean slope of the conditioned sensors, None without any."""
+        if self.slope_weight <= 0:
+            return None
+        return self.slope_sum / self.slope_weight
+
+    def as_dicts(self) -> dict:
+        """All readings in the format of `models.Status.sensors`."""
+        return {name: reading.as_dict() for name, reading in self.readings.items()}
+
+    def _median(self):
+        temps = self.sorted_temps
+        middle = len(temps) // 2
+        if len(temps) % 2:
+            return temps[middle]
+        return (temps[middle - 1] + temps[middle]) / 2
+
+    def _trimmed_mean(self):
+        temps = self.sorted_temps
+        trim = int(len(temps) * self.trim_fraction)
+        kept = temps[trim:len(temps) - trim] or temps
+        return sum(kept) / len(kept)
+
+    def _remove(self, reading: SensorReading):
+        self.weighted_sum -= reading.temperature * reading.weight
+        self.total_weight -= reading.weight
+        if reading.slope is not None:
+            self.slope_sum -= reading.slope * reading.weight
+            self.slope_weight -= reading.weight
+        del self.sorted_temps[bisect_left(self.sorted_temps, reading.temperature)]
+
+    def _recompute(self):
+        self.weighted_sum = sum(r.temperature * r.weight for r in self.readings.values())
+        self.total_weight = sum(r.weight for r in self.readings.values())
+        self.sorted_temps = sorted(r.temperature for r in self.readings.values())
+        sloped = [r for r in self.readings.values() if r.slope is not None]
+        self.slope_sum = sum(r.slope * r.weight for r in sloped)
+        self.slope_weight = sum(r.weight for r in sloped)
@@ -0,0 +1,180 @@
+"""
+Runs the `Controller` against a simulated house in virtual time.
+
+The controller gets a `SimulatedClock`, a `SimulatedGpio` backend whose pin
+levels drive the `House` model, and runs its GPIO writes inline, so a
+simulation is deterministic and weeks of virtual time take seconds. Every
+`sensor_interval` a sensor reports the house temperature and the status is
+driven, like `main.drive_status_loop` does on a reading.
+
+The house is a first order thermal model: the indoor temperature relaxes
+towards the outdoor temperature with `time_constant` and each running
+system adds or removes a fixed number of degrees per hour. Outdoor
+temperature follows one of the daily `TRACES`.
+
+`simulate` returns relay cycles and runtime and how long and how far the
+temperature left the comfort band around the target. `benchmarks/simulate.py`
+runs it from the command line.
+"""
+
+import logging
+import math
+import random
+from concurrent.futures import Future
+
+from controller import Controller
+from gpio_controller import AC_PIN, FAN_ON_PIN, FURNACE_PIN, ON, PUMP_PIN, RELAYS
+
+DAY = 24 * 60 * 60
+START_TIME = 1735689600  # 2025-01-01 UTC, any fixed time keeps runs repeatable
+
+# name -> (mean outdoor temperature, daily amplitude), both in degrees F
+TRACES = {
+    "winter": (30, 10),
+    "spring": (60, 15),
+    "summer": (88, 12),
+}
+HOTTEST_HOUR = 15
+
+
+class SimulatedClock:
+    """A clock that only moves when `advance` is called."""
+    def __init__(self, now: float = START_TIME):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        """Moves the time forward."""
+        self.now += seconds
+
+
+class SimulatedGpio:
+    """Stands in for `RPi.GPIO`, keeping the level of every pin."""
+    BCM = 11
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.levels = {}
+
+    def setmode(self, mode):
+        """Accepts the numbering mode."""
+
+    def setup(self, pin: int, _direction, initial=HIGH):
+        """Sets `pin` to `initial`."""
+        self.levels[pin] = initial
+
+    def output(self, pin: int, level):
+        """Sets `pin` to `level`."""
+        self.levels[pin] = level
+
+    def is_on(self, pin: int) -> bool:
+        """Whether the relay on `pin` is on."""
+        return self.levels.get(pin) == ON
+
+
+class InlineExecutor:
+    """Runs submitted functions right away, in place of the GPIO thread."""
+    def submit(self, function, *args) -> Future:
+        """Calls `function` and returns its finished future."""
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        # pylint: disable=W0718
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait: bool = True):
+        """Nothing to wait for."""
+
+
+class House:
+    """Indoor temperature in degrees F driven by the outdoor temperature and the relays."""
+    def __init__(self, temperature: float, time_constant: float = 8 * 60 * 60,
+                 furnace_rate: float = 10, ac_rate: float = 8, cooler_rate: float = 3):
+        """Rates are degrees per hour while the system runs."""
+        self.temperature = temperature
+        self.time_constant = time_constant
+        self.furnace_rate = furnace_rate
+        self.ac_rate = ac_rate
+        self.cooler_rate = cooler_rate
+
+    def step(self, seconds: float, outdoor: float, gpio: SimulatedGpio):
+        """Advances the temperature by `seconds` with the relays as they are on `gpio`."""
+        rate = 0.0
+        if gpio.is_on(FURNACE_PIN):
+            rate += self.furnace_rate
+        if gpio.is_on(AC_PIN):
+            rate -= self.ac_rate
+        if gpio.is_on(PUMP_PIN) and gpio.is_on(FAN_ON_PIN):
+            rate -= self.cooler_rate
+        self.temperature += (outdoor - self.temperature) * seconds / self.time_constant
+        self.temperature += rate * seconds / 3600
+
+
+def outdoor_temperature(trace: str, timestamp: float) -> float:
+    """Outdoor temperature of `trace` at `timestamp`, peaking at `HOTTEST_HOUR` UTC."""
+    mean, amplitude = TRACES[trace]
+    hours = (timestamp % DAY) / 3600
+    return mean + amplitude * math.cos((hours - HOTTEST_HOUR) / 24 * 2 * math.pi)
+
+
+def simulate(days: float = 7, trace: str = "winter", target: int = 72,
+             comfort_band: float = 2, step: float = 10, sensor_interval: float = 60,
+             sensor_noise: float = 0.2, seed: int = 0, house: House = None,
+             conditioning=None, anticipation: float = 0) -> dict:
+    """
+    Runs a `Controller` for `days` of virtual time and returns its performance:
+    cycles and on-hours per relay, hours and the largest distance outside
+    `target` ± `comfort_band`, and the mean absolute error from the target.
+    `conditioning` and `anticipation` are those of the sensors and the controller.
+    """
+    clock = SimulatedClock()
+    gpio = SimulatedGpio()
+    log = logging.getLogger("simulation")
+    controller = Controller(log, clock=clock, status_path=None, stats_path=None,
+                            gpio_backend=gpio)
+    controller.io_executor.shutdown()
+    controller.io_executor = InlineExecutor()
+    controller.set_target_temp(target)
+    controller.sensors.configure(conditioning=conditioning)
+    controller.anticipation = anticipation
+    if house is None:
+        house = House(target)
+    noise = random.Random(seed)
+
+    end = clock.now + days * DAY
+    next_report = clock.now
+    outside_seconds = 0.0
+    worst = 0.0
+    error_sum = 0.0
+    steps = 0
+    while clock.now < end:
+        if clock.now >= next_report:
+            controller.update_sensor_status(
+                "simulated", house.temperature + noise.gauss(0, sensor_noise), 50)
+            controller.drive_status()
+            next_report += sensor_interval
+        house.step(step, outdoor_temperature(trace, clock.now), gpio)
+        clock.advance(step)
+        deviation = abs(house.temperature - target)
+        error_sum += deviation
+        steps += 1
+        if deviation > comfort_band:
+            outside_seconds += step
+            worst = max(worst, deviation - comfort_band)
+
+    stats = controller.gpio_controller.relay_stats
+    result = {}
+    for relay in RELAYS:
+        result[f"{relay}_cycles"] = stats.cycles[relay]
+        result[f"{relay}_on_hours"] = stats.total_on_seconds(relay, clock.now) / 3600
+    result["outside_band_hours"] = outside_seconds / 3600
+    result["worst_outside_band"] = worst
+    result["mean_abs_error"] = error_sum / steps if steps else 0.0
+    controller.close()
+    return result
@@ -0,0 +1,232 @@
+"""
+Stores sensor, average and pin rows in a local SQLite database
+
+An alternative to the remote Postgres of `database.Database` with the same
+interface, for a thermostat without a database server. To spare the SD
+card, rows stay in the write buffer for `flush_interval` (5 minutes by
+default) and are written in a single transaction. The database runs in WAL
+mode with `synchronous=NORMAL`, so a flush appends to the write-ahead log
+and only checkpoints rewrite pages. Sensor rows are thinned to one per
+sensor every `sensor_interval` seconds and rows older than `retention_days`
+are deleted once a day, which keeps weeks of data in a few megabytes.
+
+SQLite blocks, so every query runs on one dedicated thread.
+"""
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import (Database, DROP_OLDEST, MAX_BUFFERED_ROWS, QUERY_SECONDS,
+                      TABLE_COLUMNS)
+from history import PIN_AC, PIN_FAN_ON, PIN_FURNACE, PIN_PUMP
+
+SQLITE_PATH = "history.db"
+SQLITE_FLUSH_INTERVAL = 5 * 60  # seconds
+SQLITE_FLUSH_ROWS = 2000
+SENSOR_INTERVAL = 60  # seconds between stored rows of one sensor
+RETENTION_DAYS = 35
+RETENTION_INTERVAL = 24 * 60 * 60  # seconds between deletions of old rows
+# The pins row of a status is queued just after its averages row.
+PINS_MATCH_WINDOW = 1  # seconds
+
+SQLITE_INSERT_QUERIES = {
+    table: f"INSERT INTO {table} ({', '.join(columns)}) "
+           f"VALUES ({', '.join('?' for _ in columns)})"
+    for table, columns in TABLE_COLUMNS.items()
+}
+
+CREATE_TABLE_QUERIES = [
+    """
+    CREATE TABLE IF NOT EXISTS sensors (
+        time real,
+        sensor_id text,
+        temperature real,
+        humidity real
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS averages (
+        time real,
+        average_temp real,
+        target_temp real
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pins (
+        time real,
+        pump_available integer,
+        pump_active integer,
+        ac_available integer,
+        ac_active integer,
+        furnace_available integer,
+        furnace_active integer,
+        fan_available integer,
+        fan_active integer
+    )
+    """,
+] + [f"CREATE INDEX IF NOT EXISTS {table}_time ON {table} (time)" for table in TABLE_COLUMNS]
+
+
+class SqliteDatabase(Database):
+    """Handles writing rows to, and reading the history from a local SQLite database."""
+    engine = "sqlite"
+
+    def __init__(self,
+                 log,
+                 path: str = SQLITE_PATH,
+                 flush_interval: float = SQLITE_FLUSH_INTERVAL,
+                 flush_rows: int = SQLITE_FLUSH_ROWS,
+                 max_buffered_rows: int = MAX_BUFFERED_ROWS,
+                 overflow_policy: str = DROP_OLDEST,
+                 sensor_interval: float = SENSOR_INTERVAL,
+                 retention_days: float = RETENTION_DAYS):
+        super().__init__(log, flush_interval, flush_rows, max_buffered_rows, overflow_policy)
+        self.path = path
+        self.sensor_interval = sensor_interval
+        self.retention_days = retention_days
+        self.connection = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.sensor_times = {}
+        self.last_retention_time = None
+        self.skipped_rows = 0
+
+    async def connect_db(self):  # pylint: disable=W0221
+        """Opens the database, creates missing tables and starts the flush task."""
+        self.log.info("Opening local database %s", self.path)
+        await self._run(self._open)
+        self.tables_created = True
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def disconnect_db(self):
+        """Flushes buffered rows and closes the database."""
+        self.log.info("Closing local database")
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        if self.connection is not None:
+            try:
+                await self.flush()
+            # pylint: disable=W0718
+            except Exception as e:
+                self.log.error("Final database flush failed with: %s", e)
+            await self._run(self.connection.close)
+            self.connection = None
+        self.executor.shutdown()
+
+    def is_connected(self) -> bool:
+        """Whether the database file is open."""
+        return self.connection is not None
+
+    async def update_sensors(self, name, temperature, humidity, timestamp=None):
+        """
+        Queues an entry for the sensors table unless the sensor already has one
+        within `sensor_interval` seconds.
+        """
+        now = time.time() if timestamp is None else timestamp
+        last = self.sensor_times.get(name)
+        if last is not None and 0 <= now - last < self.sensor_interval:
+            self.skipped_rows += 1
+            return
+        self.sensor_times[name] = now
+        await super().update_sensors(name, temperature, humidity, now)
+
+    def get_stats(self) -> dict:
+        """Returns the counters of `Database.get_stats` and the thinned sensor rows."""
+        return {**super().get_stats(), "skipped_sensor_rows": self.skipped_rows}
+
+    async def flush(self):
+        """Writes every buffered row in one transaction and deletes expired rows once a day."""
+        if not self.buffer.size or self.connection is None:
+            return
+        batches = self.buffer.take()
+        try:
+            await self._run(self._write, batches)
+        except Exception:
+            for table, rows in batches.items():
+                self.buffer.requeue(table, rows)
+            raise
+        self.flushed_rows += sum(len(rows) for rows in batches.values())
+        self.flushes += 1
+        self.last_flush_time = time.time()
+
+        if self.last_retention_time is None or \
+                self.last_flush_time - self.last_retention_time >= RETENTION_INTERVAL:
+            self.last_retention_time = self.last_flush_time
+            # The rows are written, a failed deletion is retried on the next day.
+            try:
+                await self._run(self._delete_before,
+                                self.last_flush_time - self.retention_days * 24 * 60 * 60)
+            # pylint: disable=W0718
+            except Exception as e:
+                self.log.error("Deleting expired rows from the local database failed with: %s", e)
+
+    async def load_history(self, since: float) -> list:
+        """
+        Returns `(timestamp, average_temp, target_temp, pins)` for every averages
+        row since `since`, oldest first, where `pins` is the `history.PIN_*` mask
+        of the latest pins row at that time.
+        """
+        if self.connection is None:
+            return []
+        return await self._run(self._read_history, since)
+
+    async def _create_tables(self):
+        await self._run(self._open)
+        self.tables_created = True
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _open(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        for query in CREATE_TABLE_QUERIES:
+            self.connection.execute(query)
+
+    def _write(self, batches: dict):
+        self.connection.execute("BEGIN")
+        try:
+            for table, rows in batches.items():
+                start = time.perf_counter()
+                self.connection.executemany(SQLITE_INSERT_QUERIES[table],
+                                            [(row[0].timestamp(),) + row[1:] for row in rows])
+                QUERY_SECONDS.labels(table).observe(time.perf_counter() - start)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def _delete_before(self, cutoff: float):
+        self.connection.execute("BEGIN")
+        try:
+            for table in TABLE_COLUMNS:
+                self.connection.execute(f"DELETE FROM {table} WHERE time < ?", (cutoff,))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def _read_history(self, since: float) -> list:
+        averages = self.connection.execute(
+            "SELECT time, average_temp, target_temp FROM averages "
+            "WHERE time >= ? ORDER BY time", (since,)).fetchall()
+        pins = self.connection.execute(
+            "SELECT time, pump_active, fan_active, ac_active, furnace_active FROM pins "
+            "WHERE time >= ? ORDER BY time", (since,)).fetchall()
+        history = []
+        mask = 0
+        next_pins = 0
+        for timestamp, average_temp, target_temp in averages:
+            while next_pins < len(pins) and \
+                    pins[next_pins][0] <= timestamp + PINS_MATCH_WINDOW:
+                _time, pump, fan_on, ac, furnace = pins[next_pins]
+                mask = (PIN_PUMP if pump else 0) | (PIN_FAN_ON if fan_on else 0) | \
+                    (PIN_AC if ac else 0) | (PIN_FURNACE if furnace else 0)
+                next_pins += 1
+            if average_temp is not None:
+                history.append((timestamp, average_temp, target_temp, mask))
+        return history
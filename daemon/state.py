@@ -0,0 +1,104 @@
+"""
+The thermostat's live state as compact records.
+
+The control path reads and updates these on every tick, so they avoid
+pydantic: pins and usable systems are immutable named tuples that can be
+shared, e.g. one instance per `GpioController` action, and the status is a
+slotted object updated in place. `to_model` converts to the `models` types
+at the API boundary.
+"""
+
+from typing import NamedTuple
+
+import models
+
+
+class PinState(NamedTuple):
+    """Whether each relay is on."""
+    pump: bool = False
+    fan_on: bool = False
+    ac: bool = False
+    furnace: bool = False
+
+    def to_model(self) -> models.Pins:
+        """The pins as `models.Pins`."""
+        return models.Pins(pump=self.pump, fan_on=self.fan_on, ac=self.ac, furnace=self.furnace)
+
+
+class UsableState(NamedTuple):
+    """Whether each system can be turned on."""
+    ac: bool = True
+    cooler: bool = True
+    furnace: bool = True
+
+    def to_model(self) -> models.Usable:
+        """The usable systems as `models.Usable`."""
+        return models.Usable(ac=self.ac, cooler=self.cooler, furnace=self.furnace)
+
+
+ALL_OFF = PinState()
+
+
+def pin_state(pins) -> PinState:
+    """A `PinState` from any object with the pin attributes, e.g. `models.Pins`."""
+    return PinState(bool(pins.pump), bool(pins.fan_on), bool(pins.ac), bool(pins.furnace))
+
+
+def usable_state(usable) -> UsableState:
+    """A `UsableState` from any object with the usable attributes, e.g. `models.Usable`."""
+    return UsableState(bool(usable.ac), bool(usable.cooler), bool(usable.furnace))
+
+
+class ThermostatState:
+    """Everything of `models.Status` except the sensors, which `SensorRegistry` keeps."""
+    __slots__ = ("pins", "usable", "target_temp", "average_temp", "manual_override",
+                 "temperature_slope")
+
+    def __init__(self, pins: PinState = ALL_OFF, usable: UsableState = UsableState(),
+                 target_temp: int = 72, average_temp: float = 72,
+                 manual_override: bool = False, temperature_slope: float = None):
+        self.pins = pins
+        self.usable = usable
+        self.target_temp = target_temp
+        self.average_temp = average_temp
+        self.manual_override = manual_override
+        # degrees per hour, None without conditioned sensors
+        self.temperature_slope = temperature_slope
+
+    @classmethod
+    def from_dict(cls, saved: dict) -> "ThermostatState":
+        """
+        Reads the state from the format written by `as_dict`.
+        Raises KeyError, TypeError or ValueError if a field is missing or invalid.
+        """
+        pins, usable = saved["pins"], saved["usable"]
+        return cls(PinState(*(bool(pins[name]) for name in PinState._fields)),
+                   UsableState(*(bool(usable[name]) for name in UsableState._fields)),
+                   int(saved["target_temp"]),
+                   float(saved.get("average_temp", 72)),
+                   bool(saved["manual_override"]))
+
+    def as_dict(self, ephemeral: bool = True) -> dict:
+        """
+        The state in the format of `models.Status` without sensors. Without
+        `ephemeral` the average temperature and its slope, which only
+        describe the moment, are left out.
+        """
+        result = {
+            "pins": self.pins._asdict(),
+            "usable": self.usable._asdict(),
+            "target_temp": self.target_temp,
+            "manual_override": self.manual_override,
+        }
+        if ephemeral:
+            result["average_temp"] = self.average_temp
+            result["temperature_slope"] = self.temperature_slope
+        return result
+
+    def to_model(self, sensors: dict, schedule: dict = None) -> models.Status:
+        """The state, `sensors` and the active `schedule` entry as `models.Status`."""
+        return models.Status(pins=self.pins.to_model(), usable=self.usable.to_model(),
+                             target_temp=self.target_temp, average_temp=self.average_temp,
+                             manual_override=self.manual_override, sensors=sensors,
+                             schedule=schedule, temperature_slope=self.temperature_slope)
+
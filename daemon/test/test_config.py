@@ -0,0 +1,130 @@
+# pylint: disable-all
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import config
+
+
+class TestParseSettings(unittest.TestCase):
+    def parser(self, **values):
+        parser = config.ConfigParser()
+        config._fill_defaults(parser)
+        for key, value in values.items():
+            section, name = key.split("__")
+            parser[section][name] = value
+        return parser
+
+
+    def test_parse_settings__converts_defaults(self):
+        settings = config.parse_settings(self.parser())
+        self.assertIs(settings.database.enabled, False)
+        self.assertEqual(settings.database.pool_max_size, 2)
+        self.assertEqual(settings.control.cycle_time, 120)
+        self.assertEqual(settings.gpio.pins(), (5, 6, 12, 13))
+        self.assertEqual(settings.logging.level, "INFO")
+
+
+    def test_parse_settings__reads_weights(self):
+        parser = self.parser()
+        parser["SENSOR_WEIGHTS"]["Kitchen"] = "2"
+        settings = config.parse_settings(parser)
+        self.assertEqual(dict(settings.sensors.weights), {"kitchen": 2.0})
+
+
+    def test_parse_settings__names_invalid_key(self):
+        with self.assertRaisesRegex(ValueError, "CONTROL.CYCLE_TIME"):
+            config.parse_settings(self.parser(CONTROL__CYCLE_TIME="soon"))
+        with self.assertRaisesRegex(ValueError, "CONTROL.HISTORY_INTERVAL"):
+            config.parse_settings(self.parser(CONTROL__HISTORY_INTERVAL="0"))
+        with self.assertRaisesRegex(ValueError, "DATABASE.DB_ENGINE"):
+            config.parse_settings(self.parser(DATABASE__DB_ENGINE="mysql"))
+
+
+    def test_parse_settings__rejects_shared_pins(self):
+        with self.assertRaisesRegex(ValueError, "GPIO"):
+            config.parse_settings(self.parser(GPIO__AC_PIN="5"))
+
+
+    def test_settings__immutable(self):
+        settings = config.parse_settings(self.parser())
+        with self.assertRaises(AttributeError):
+            settings.control.cycle_time = 1
+
+
+class TestReload(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "config.ini")
+        for name, value in (("CONFIG_PATH", self.path), ("log", unittest.mock.MagicMock())):
+            patcher = patch.object(config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(setattr, config, "settings", config.settings)
+        self.addCleanup(setattr, config, "config", config.config)
+        config.config = config.ConfigParser()
+        config.load_config()
+
+
+    def write(self, text):
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write(text)
+        # A different size makes the change visible within one mtime tick.
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 1))
+
+
+    def test_reload__none_when_unchanged(self):
+        self.assertIsNone(config.reload())
+
+
+    def test_reload__applies_changed_values(self):
+        self.write("[CONTROL]\nCYCLE_TIME = 300\n")
+        settings = config.reload()
+        self.assertEqual(settings.control.cycle_time, 300)
+        self.assertIs(config.settings, settings)
+
+
+    def test_reload__keeps_settings_when_invalid(self):
+        before = config.settings
+        self.write("[CONTROL]\nCYCLE_TIME = soon\n")
+        self.assertIsNone(config.reload())
+        self.assertIs(config.settings, before)
+
+
+    def test_reload__keeps_restart_sections(self):
+        self.write("[DATABASE]\nDB_ENABLED = True\n[CONTROL]\nCYCLE_TIME = 300\n")
+        settings = config.reload()
+        self.assertFalse(settings.database.enabled)
+        self.assertEqual(settings.control.cycle_time, 300)
+
+
+class TestZoneSettings(unittest.TestCase):
+    def parser(self):
+        parser = config.ConfigParser()
+        config._fill_defaults(parser)
+        parser["ZONE:Upstairs"] = {"SENSORS": "Bedroom, Office", "PUMP_PIN": "20",
+                                   "FAN_ON_PIN": "21", "AC_PIN": "22", "FURNACE_PIN": "23"}
+        return parser
+
+
+    def test_parse_settings__reads_zones(self):
+        settings = config.parse_settings(self.parser())
+        self.assertEqual(settings.zones, (config.ZoneSettings(
+            "Upstairs", ("Bedroom", "Office"), (20, 21, 22, 23)),))
+
+
+    def test_parse_settings__rejects_pin_of_main_relays(self):
+        parser = self.parser()
+        parser["ZONE:Upstairs"]["AC_PIN"] = "12"
+        with self.assertRaisesRegex(ValueError, "own pin"):
+            config.parse_settings(parser)
+
+
+    def test_parse_settings__requires_zone_pins(self):
+        parser = self.parser()
+        del parser["ZONE:Upstairs"]["FURNACE_PIN"]
+        with self.assertRaisesRegex(ValueError, "FURNACE_PIN is missing"):
+            config.parse_settings(parser)
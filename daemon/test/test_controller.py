@@ -4,7 +4,9 @@ import unittest
 from unittest.mock import patch, mock_open
 
 import controller
+import gpio_controller
 import models
+from state import ThermostatState
 
 STATUS_STRING = """{
                 "pins":{"pump":false,"fan_on":false,"ac":false,"furnace":false},
@@ -51,23 +53,160 @@ class TestController(unittest.TestCase):
     
 
     def test_get_history__returns_history(self):
-        history_list = ["heck"]
-        self.controller.history = history_list
-        history = self.controller.get_history()
-        self.assertEqual(history, history_list)
+        with patch("time.time", return_value=1000):
+            self.controller.update_history()
+        history = self.controller.get_history(since=0)
+        self.assertEqual(history, [(1000, 34, 12, 0, 34, 34)])
 
     
     def test_update_sensor_status__adds_new_sensor(self):
-        self.assertTrue("test_name" not in self.controller.status.sensors)
+        self.assertTrue("test_name" not in self.controller.get_status().sensors)
         self.controller.update_sensor_status("test_name", 70, 30)
-        self.assertTrue("test_name" in self.controller.status.sensors)
-        self.assertEqual(self.controller.status.sensors["test_name"]["temperature"], 70)
-        self.assertEqual(self.controller.status.sensors["test_name"]["humidity"], 30)
+        self.assertTrue("test_name" in self.controller.get_status().sensors)
+        self.assertEqual(self.controller.get_status().sensors["test_name"]["temperature"], 70)
+        self.assertEqual(self.controller.get_status().sensors["test_name"]["humidity"], 30)
     
 
     def test_update_sensor_status__updates_existing_sensor(self):
         self.controller.update_sensor_status("test_name", 70, 30)
         self.controller.update_sensor_status("test_name", 75, 35)
-        self.assertTrue("test_name" in self.controller.status.sensors)
-        self.assertEqual(self.controller.status.sensors["test_name"]["temperature"], 75)
-        self.assertEqual(self.controller.status.sensors["test_name"]["humidity"], 35)
+        self.assertTrue("test_name" in self.controller.get_status().sensors)
+        self.assertEqual(self.controller.get_status().sensors["test_name"]["temperature"], 75)
+        self.assertEqual(self.controller.get_status().sensors["test_name"]["humidity"], 35)
+
+
+    def test_set_target_temp__bumps_version_and_status_json(self):
+        version = self.controller.version
+        etag = self.controller.get_status_etag()
+        self.controller.set_target_temp(65)
+        self.assertEqual(self.controller.version, version + 1)
+        self.assertNotEqual(self.controller.get_status_etag(), etag)
+        self.assertIn(b'"target_temp":65', self.controller.get_status_json())
+
+
+    def test_get_status_json__cached_per_version(self):
+        first = self.controller.get_status_json()
+        self.assertIs(self.controller.get_status_json(), first)
+        self.controller.update_sensor_status("test_name", 70, 30)
+        self.assertIsNot(self.controller.get_status_json(), first)
+
+
+    def test_get_history_json__caches_a_bounded_number_of_queries(self):
+        default = self.controller.get_history_json()
+        for since in range(controller.HISTORY_JSON_CACHE_SIZE * 2):
+            self.controller.get_history_json(since)
+            self.assertIs(self.controller.get_history_json(), default)
+        self.assertEqual(len(self.controller._history_json), controller.HISTORY_JSON_CACHE_SIZE)
+
+
+    @patch("gpio_controller.GPIO")
+    def test_set_relay_pins__sets_up_configured_pins_switched_off(self, mock_gpio):
+        self.controller.set_relay_pins((20, 21, 22, 23))
+        self.controller.io_executor.shutdown()
+        for pin in (20, 21, 22, 23):
+            mock_gpio.setup.assert_any_call(pin, mock_gpio.OUT, initial=gpio_controller.OFF)
+        mock_gpio.output.assert_not_called()
+
+
+OFF = models.Pins(pump=False, fan_on=False, ac=False, furnace=False)
+AC = models.Pins(pump=False, fan_on=False, ac=True, furnace=False)
+FURNACE = models.Pins(pump=False, fan_on=False, ac=False, furnace=True)
+ALL_USABLE = models.Usable(ac=True, cooler=True, furnace=True)
+COOLER_ONLY = models.Usable(ac=False, cooler=True, furnace=True)
+
+
+class TestDriveStatus(unittest.TestCase):
+    def setUp(self):
+        with patch("builtins.open", mock_open(read_data=STATUS_STRING)):
+            self.controller = controller.Controller(unittest.mock.MagicMock())
+        self.controller.status_writer = unittest.mock.MagicMock()
+        self.controller.status.manual_override = False
+        self.controller.sensors.expire(float("inf"))
+
+
+    def test_drive_status__removes_stale_sensors_and_averages(self):
+        with patch("time.time", return_value=1000):
+            self.controller.update_sensor_status("old", 50, 30)
+        with patch("time.time", return_value=1000 + controller.SENSOR_STALE_TIMEOUT):
+            self.controller.update_sensor_status("a", 70, 30)
+            self.controller.update_sensor_status("b", 72, 30)
+            self.controller.drive_status()
+        self.assertEqual(set(self.controller.get_status().sensors), {"a", "b"})
+        self.assertEqual(self.controller.status.average_temp, 71)
+
+
+    def test_drive_status__keeps_pins_without_sensors(self):
+        self.controller.status.average_temp = 60
+        self.controller.drive_status()
+        self.assertEqual(self.controller.status.average_temp, 60)
+        self.assertFalse(self.controller.status.pins.furnace)
+
+
+    def test_drive_status__submits_status_file_only_when_changed(self):
+        self.controller.drive_status()
+        self.controller.drive_status()
+        self.assertEqual(self.controller.status_writer.submit.call_count, 1)
+        self.controller.set_target_temp(70)
+        self.controller.drive_status()
+        self.assertEqual(self.controller.status_writer.submit.call_count, 2)
+        self.assertIn(b'"target_temp":70', self.controller.status_writer.submit.call_args[0][0])
+
+
+class TestDecide(unittest.TestCase):
+    def test_decide__starts_furnace_when_cold(self):
+        self.assertEqual(controller.decide(69, 72, OFF, ALL_USABLE), ("furnace_on", True))
+
+
+    def test_decide__starts_ac_when_hot(self):
+        self.assertEqual(controller.decide(75, 72, OFF, ALL_USABLE), ("ac_on", True))
+
+
+    def test_decide__starts_cooler_when_ac_unusable(self):
+        self.assertEqual(controller.decide(75, 72, OFF, COOLER_ONLY), ("fan_low_on", True))
+
+
+    def test_decide__keeps_off_within_band(self):
+        self.assertEqual(controller.decide(73, 72, OFF, ALL_USABLE), ("all_off", False))
+
+
+    def test_decide__keeps_furnace_on_until_within_one_degree(self):
+        self.assertEqual(controller.decide(70.5, 72, FURNACE, ALL_USABLE), ("furnace_on", False))
+        self.assertEqual(controller.decide(71, 72, FURNACE, ALL_USABLE), ("all_off", True))
+
+
+    def test_decide__turns_ac_off_within_one_degree(self):
+        self.assertEqual(controller.decide(73, 72, AC, ALL_USABLE), ("all_off", True))
+
+
+    def test_decide__leaves_pins_when_nothing_can_cool(self):
+        usable = models.Usable(ac=False, cooler=False, furnace=True)
+        self.assertEqual(controller.decide(80, 72, OFF, usable), (None, False))
+
+
+    def test_anticipated__extrapolates_along_slope(self):
+        status = ThermostatState(average_temp=70, temperature_slope=3)
+        self.assertEqual(controller.anticipated(status, 0), 70)
+        self.assertEqual(controller.anticipated(status, 20 * 60), 71)
+        status.temperature_slope = None
+        self.assertEqual(controller.anticipated(status, 20 * 60), 70)
+
+
+class TestNextCheck(unittest.TestCase):
+    def setUp(self):
+        with patch("builtins.open", mock_open(read_data=STATUS_STRING)):
+            self.controller = controller.Controller(unittest.mock.MagicMock())
+        self.controller.sensors.expire(float("inf"))
+
+
+    def test_seconds_until_next_check__none_without_deadlines(self):
+        self.assertIsNone(self.controller.seconds_until_next_check())
+
+
+    def test_seconds_until_next_check__waits_for_lockout_or_stale_sensor(self):
+        with patch("time.time", return_value=1000):
+            self.controller.update_sensor_status("test_name", 70, 30)
+            self.controller.last_update_time = 1000 - controller.CYCLE_TIME + 5
+            self.assertEqual(self.controller.seconds_until_next_check(), 5)
+            self.controller.last_update_time = None
+            self.assertEqual(self.controller.seconds_until_next_check(),
+                             controller.SENSOR_STALE_TIMEOUT)
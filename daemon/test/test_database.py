@@ -0,0 +1,111 @@
+# pylint: disable-all
+
+import os
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import database
+import rollups
+
+
+class TestWriteBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = database.WriteBuffer(max_rows=3)
+
+
+    def test_take__returns_rows_per_table_and_empties_buffer(self):
+        self.buffer.add("sensors", (1, "a", 70, 30))
+        self.buffer.add("averages", (1, 70, 72))
+        batches = self.buffer.take()
+        self.assertEqual(batches, {"sensors": [(1, "a", 70, 30)], "averages": [(1, 70, 72)]})
+        self.assertEqual(self.buffer.size, 0)
+        self.assertEqual(self.buffer.age(), 0)
+
+
+    def test_add__drops_oldest_when_full(self):
+        for i in range(4):
+            self.buffer.add("sensors", (i,))
+        self.assertEqual(self.buffer.dropped, 1)
+        self.assertEqual(self.buffer.take(), {"sensors": [(1,), (2,), (3,)]})
+
+
+    def test_add__drops_newest_when_full_with_drop_newest_policy(self):
+        self.buffer = database.WriteBuffer(max_rows=3, policy=database.DROP_NEWEST)
+        for i in range(4):
+            self.buffer.add("sensors", (i,))
+        self.assertEqual(self.buffer.dropped, 1)
+        self.assertEqual(self.buffer.take(), {"sensors": [(0,), (1,), (2,)]})
+
+
+    def test_requeue__puts_rows_before_newer_rows(self):
+        self.buffer.add("sensors", (3,))
+        self.buffer.requeue("sensors", [(1,), (2,)])
+        self.assertEqual(self.buffer.take(), {"sensors": [(1,), (2,), (3,)]})
+
+
+class TestRollupTracking(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.database = database.Database(MagicMock())
+        self.connection = AsyncMock()
+        self.database.pool = MagicMock()
+        self.database.pool.acquire.return_value.__aenter__.return_value = self.connection
+
+
+    async def test_flush__marks_oldest_rolled_up_row(self):
+        await self.database.update_sensors("Den", 70, 30, 2000)
+        await self.database.update_sensors("Den", 70, 30, 1000)
+        await self.database.update_pins(MagicMock(), MagicMock())
+        await self.database.flush()
+        self.assertEqual(self.database.rollup_since, datetime.fromtimestamp(1000, timezone.utc))
+
+
+    async def test_rollup__runs_queries_from_mark_and_clears_it(self):
+        self.database.rollup_watermark_loaded = True
+        self.database.rollup_since = datetime.fromtimestamp(1000, timezone.utc)
+        self.connection.transaction = MagicMock()
+        await self.database.rollup()
+        self.assertEqual(self.connection.execute.await_count, len(rollups.ROLLUP_QUERIES))
+        self.connection.execute.assert_awaited_with(rollups.ROLLUP_QUERIES[-1],
+                                                    datetime.fromtimestamp(1000, timezone.utc))
+        self.assertIsNone(self.database.rollup_since)
+        self.assertEqual(self.database.rollups, 1)
+
+
+class TestRollupTimes(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tz = os.environ.get("TZ")
+        os.environ["TZ"] = "America/Denver"
+        time.tzset()
+        self.database = database.Database(MagicMock())
+        self.connection = AsyncMock()
+        self.database.pool = MagicMock()
+        self.database.pool.acquire.return_value.__aenter__.return_value = self.connection
+
+
+    def tearDown(self):
+        if self.tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = self.tz
+        time.tzset()
+
+
+    async def test_get_rollup__keeps_buckets_in_utc(self):
+        bucket = datetime(2026, 1, 15, 12, tzinfo=timezone.utc)
+        self.connection.fetch.return_value = [(bucket, 70.0)]
+        result = await self.database.get_rollup("averages", 0, 3600)
+        self.assertEqual(result["rows"], [[bucket.timestamp(), 70.0]])
+        self.assertEqual(self.connection.fetch.call_args.args[1],
+                         datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+
+    async def test_rollup__keeps_watermark_aware(self):
+        watermark = datetime(2026, 1, 15, 12, tzinfo=timezone.utc)
+        self.connection.fetchval.return_value = watermark
+        self.connection.transaction = MagicMock()
+        await self.database.update_sensors("Den", 70, 30, watermark.timestamp() + 60)
+        await self.database.flush()
+        await self.database.rollup()
+        self.connection.execute.assert_awaited_with(rollups.ROLLUP_QUERIES[-1], watermark)
@@ -0,0 +1,40 @@
+# pylint: disable-all
+
+import asyncio
+import unittest
+
+import events
+
+
+class TestMergePatch(unittest.TestCase):
+    def test_merge_patch__only_contains_changes(self):
+        old = {"target_temp": 72, "sensors": {"a": {"temperature": 70}, "b": {"temperature": 71}}}
+        new = {"target_temp": 72, "sensors": {"a": {"temperature": 75}}}
+        self.assertEqual(events.merge_patch(old, new),
+                         {"sensors": {"a": {"temperature": 75}, "b": None}})
+
+
+class TestStatusBroadcaster(unittest.TestCase):
+    def setUp(self):
+        self.broadcaster = events.StatusBroadcaster()
+
+
+    def test_publish__skips_unchanged_status(self):
+        self.assertTrue(self.broadcaster.publish({"target_temp": 72}))
+        self.assertFalse(self.broadcaster.publish({"target_temp": 72}))
+
+
+    def test_publish__queues_diff_for_every_subscriber(self):
+        self.broadcaster.publish({"target_temp": 72, "average_temp": 70})
+        queues = [self.broadcaster.subscribe(), self.broadcaster.subscribe()]
+        self.broadcaster.publish({"target_temp": 68, "average_temp": 70})
+        for queue in queues:
+            self.assertEqual(queue.get_nowait(), b'event: diff\ndata: {"target_temp":68}\n\n')
+
+
+    def test_next_event__sends_snapshot_to_slow_subscriber(self):
+        queue = self.broadcaster.subscribe()
+        for temp in range(events.SUBSCRIBER_QUEUE_SIZE + 1):
+            self.broadcaster.publish({"target_temp": temp})
+        payload = asyncio.run(self.broadcaster.next_event(queue, 1))
+        self.assertTrue(payload.startswith(b"event: snapshot"))
@@ -0,0 +1,58 @@
+# pylint: disable-all
+
+import unittest
+
+from filters import Conditioning, SensorFilter
+
+
+class TestSensorFilter(unittest.TestCase):
+    def setUp(self):
+        self.filter = SensorFilter(Conditioning())
+        for i, temp in enumerate([70, 70.2, 69.9, 70.1, 70]):
+            self.assertTrue(self.filter.update(temp, i * 60))
+
+
+    def test_update__rejects_spike(self):
+        level = self.filter.level
+        self.assertFalse(self.filter.update(120, 300))
+        self.assertEqual(self.filter.level, level)
+        self.assertEqual(self.filter.rejected, 1)
+
+
+    def test_update__accepts_step_that_persists(self):
+        accepted = [self.filter.update(75, 300 + i * 60) for i in range(4)]
+        self.assertFalse(accepted[0])
+        self.assertTrue(accepted[-1])
+
+
+    def test_update__smooths_toward_reading(self):
+        level = self.filter.level
+        self.filter.update(71, 300)
+        self.assertGreater(self.filter.level, level)
+        self.assertLess(self.filter.level, 71)
+
+
+    def test_slope__follows_ramp(self):
+        sensor_filter = SensorFilter(Conditioning())
+        for minute in range(120):
+            sensor_filter.update(68 + minute / 30, minute * 60)  # 2 degrees per hour
+        self.assertAlmostEqual(sensor_filter.slope, 2, delta=0.1)
+
+
+    def test_slope__follows_ramp_reported_every_two_seconds(self):
+        sensor_filter = SensorFilter(Conditioning())
+        for step in range(3600):
+            sensor_filter.update(68 + step / 900, step * 2)  # 2 degrees per hour
+        self.assertAlmostEqual(sensor_filter.slope, 2, delta=0.1)
+
+
+    def test_update__without_threshold_accepts_all(self):
+        sensor_filter = SensorFilter(Conditioning(outlier_threshold=0, smoothing=1))
+        for i, temp in enumerate([70, 70, 70, 120]):
+            self.assertTrue(sensor_filter.update(temp, i))
+        self.assertEqual(sensor_filter.level, 120)
+
+
+    def test_slope__ignores_readings_close_together(self):
+        self.filter.update(70.2, 240.001)
+        self.assertLess(abs(self.filter.slope), 1)
@@ -17,19 +17,30 @@ pins = [
 class TestGpioController(unittest.TestCase):
     def setUp(self):
         self.log = unittest.mock.MagicMock()
-        self.controller = gpio_controller.GpioController(self.log)
+        self.controller = gpio_controller.GpioController(self.log, stats_path=None)
 
     # def test_init__sets_pin_mode(self):
     #     self.assertTrue(GPIO.setModeDone)
     #     self.assertEqual(GPIO.getmode(), GPIO.BCM)
 
 
-    def test_init__sets_pins_to_out(self):
+    def test_set_up_pins__sets_pins_to_out(self):
+        self.controller.set_up_pins()
         for pin in pins:
             self.assertEqual(GPIO.channel_config[pin].direction, GPIO.OUT)
             self.assertEqual(GPIO.channel_config[pin].initial, GPIO.HIGH)
 
 
+    @patch("gpio_controller.GPIO")
+    def test_set_up_pins__sets_up_the_configured_pins(self, mock_gpio):
+        self.controller.set_pin_numbers((20, 21, 22, 23))
+        self.controller.set_up_pins()
+        mock_gpio.setmode.assert_called_once_with(mock_gpio.BCM)
+        for pin in (20, 21, 22, 23):
+            mock_gpio.setup.assert_any_call(pin, mock_gpio.OUT, initial=gpio_controller.OFF)
+        self.assertEqual(mock_gpio.setup.call_count, 4)
+
+
     def test_initial_pins_status_off(self):
         self.assertFalse(self.controller.pins_status.pump)
         self.assertFalse(self.controller.pins_status.fan_on)
@@ -218,3 +229,57 @@ class TestGpioController(unittest.TestCase):
         self.assertFalse(self.controller.pins_status.fan_on)
         self.assertFalse(self.controller.pins_status.ac)
         self.assertTrue(self.controller.pins_status.furnace)
+
+
+    @patch("gpio_controller.GPIO")
+    def test_set_pins__skips_unchanged_pins(self, mock_gpio: unittest.mock.MagicMock):
+        self.controller.ac_on()
+        mock_gpio.output.reset_mock()
+        self.controller.ac_on()
+        mock_gpio.output.assert_not_called()
+
+
+    @patch("gpio_controller.GPIO")
+    def test_set_pins__writes_first_call_even_if_unchanged(self, mock_gpio: unittest.mock.MagicMock):
+        self.controller.all_off()
+        self.assertEqual(mock_gpio.output.call_count, 4)
+
+
+    @patch("gpio_controller.GPIO")
+    def test_set_pins__records_relay_transitions(self, mock_gpio: unittest.mock.MagicMock):
+        stats = self.controller.relay_stats
+        self.controller.ac_on()
+        self.assertEqual(stats.cycles["ac"], 1)
+        self.assertIn("ac", stats.on_since)
+        self.controller.fan_low_on()
+        self.assertNotIn("ac", stats.on_since)
+        self.assertEqual(stats.cycles, {"pump": 1, "fan_on": 1, "ac": 1, "furnace": 0})
+
+
+    @patch("gpio_controller.GPIO")
+    def test_set_pin_numbers__moves_state_to_new_pins(self, mock_gpio):
+        self.controller.set_pins(False, False, True, False)
+        mock_gpio.reset_mock()
+        self.controller.set_pin_numbers((20, 21, 22, 23))
+        mock_gpio.output.assert_any_call(gpio_controller.AC_PIN, gpio_controller.OFF)
+        mock_gpio.setup.assert_any_call(22, mock_gpio.OUT, initial=gpio_controller.OFF)
+        mock_gpio.output.assert_any_call(22, gpio_controller.ON)
+        mock_gpio.output.assert_any_call(20, gpio_controller.OFF)
+        self.assertEqual(self.controller.relay_stats.cycles["ac"], 1)
+
+
+    @patch("gpio_controller.GPIO")
+    def test_close__switches_relays_off_and_ends_cycles(self, mock_gpio):
+        self.controller.furnace_on()
+        mock_gpio.reset_mock()
+        self.controller.close()
+        mock_gpio.output.assert_any_call(gpio_controller.FURNACE_PIN, gpio_controller.OFF)
+        self.assertEqual(self.controller.pins_status, gpio_controller.ALL_OFF)
+        self.assertNotIn("furnace", self.controller.relay_stats.on_since)
+
+
+    @patch("gpio_controller.GPIO")
+    def test_close__leaves_pins_never_set_up_alone(self, mock_gpio):
+        self.controller.close()
+        mock_gpio.setup.assert_not_called()
+        mock_gpio.output.assert_not_called()
@@ -0,0 +1,66 @@
+# pylint: disable-all
+
+import unittest
+
+import history
+import models
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_append__overwrites_oldest_when_full(self):
+        buffer = history.RingBuffer(3)
+        for i in range(5):
+            buffer.append(i, i, 70, 0, i, i)
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual([point[0] for point in buffer.points()], [2, 3, 4])
+
+
+    def test_points__filters_by_since_and_until(self):
+        buffer = history.RingBuffer(10)
+        for i in range(10):
+            buffer.append(i * 10, i, 70, 0, i, i)
+        self.assertEqual([point[0] for point in buffer.points(25, 60)], [30, 40, 50])
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.history = history.History(tiers=((10, 6), (60, 100)))
+
+
+    def test_append__averages_coarser_tier(self):
+        for i, temp in enumerate([70, 72, 74, 76, 78, 80, 82]):
+            self.history.append(i * 10, temp, 72, history.PIN_FURNACE if i == 2 else 0)
+        point = self.history.tiers[1].buffer.points()[0]
+        self.assertEqual(point, (0, 75, 72, history.PIN_FURNACE, 70, 80))
+
+
+    def test_points__uses_coarse_tier_then_finer_tail(self):
+        for i in range(13):
+            self.history.append(i * 10, 70, 72, 0)
+        timestamps = [point[0] for point in self.history.points(since=0)]
+        self.assertEqual(timestamps, [0, 60, 120])
+
+
+    def test_pins_to_mask(self):
+        pins = models.Pins(pump=True, fan_on=True, ac=False, furnace=False)
+        self.assertEqual(history.pins_to_mask(pins), history.PIN_PUMP | history.PIN_FAN_ON)
+
+
+class TestDownsample(unittest.TestCase):
+    def test_downsample__keeps_endpoints_and_limits_points(self):
+        points = [(i, i % 7, 70, 0, 0, 0) for i in range(100)]
+        sampled = history.downsample(points, 10)
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+
+
+    def test_downsample__keeps_spike(self):
+        points = [(i, 70, 70, 0, 0, 0) for i in range(100)]
+        points[50] = (50, 90, 70, 0, 0, 0)
+        self.assertIn(points[50], history.downsample(points, 10))
+
+
+    def test_downsample__returns_points_when_under_limit(self):
+        points = [(i, 70, 70, 0, 0, 0) for i in range(5)]
+        self.assertEqual(history.downsample(points, 10), points)
@@ -0,0 +1,51 @@
+# pylint: disable-all
+
+import unittest
+
+import ingest
+import models
+
+
+class TestParseLineProtocol(unittest.TestCase):
+    def test_parse_line_protocol__reads_fields_and_timestamp(self):
+        text = "Kitchen temperature=71.5,humidity=40\n\n# comment\nDen humidity=30,temperature=70 1700000000\n"
+        self.assertEqual(ingest.parse_line_protocol(text), [
+            ("Kitchen", 71.5, 40, None),
+            ("Den", 70, 30, 1700000000)])
+
+
+    def test_parse_line_protocol__unescapes_name(self):
+        readings = ingest.parse_line_protocol("Living\\ Room temperature=70,humidity=30")
+        self.assertEqual(readings[0][0], "Living Room")
+
+
+    def test_parse_line_protocol__reports_bad_line(self):
+        with self.assertRaisesRegex(ValueError, "line 2: missing field 'humidity'"):
+            ingest.parse_line_protocol("a temperature=70,humidity=30\nb temperature=70")
+        with self.assertRaisesRegex(ValueError, "line 1"):
+            ingest.parse_line_protocol("a temperature=warm,humidity=30")
+
+
+
+    def test_parse_line_protocol__rejects_non_finite_values(self):
+        for line in ("a temperature=nan,humidity=30", "a temperature=70,humidity=inf",
+                     "a temperature=70,humidity=30 -inf"):
+            with self.assertRaisesRegex(ValueError, "line 1: .* must be a finite number"):
+                ingest.parse_line_protocol(line)
+        with self.assertRaises(ValueError):
+            models.SensorReport.model_validate({"name": "a", "temperature": "NaN", "humidity": 30})
+
+
+class TestClampTimestamp(unittest.TestCase):
+    def test_clamp_timestamp(self):
+        self.assertEqual(ingest.clamp_timestamp(None, now=1000), 1000)
+        self.assertEqual(ingest.clamp_timestamp(900, now=1000), 900)
+        self.assertEqual(ingest.clamp_timestamp(5000, now=1000), 1000)
+
+
+class TestOrderBatch(unittest.TestCase):
+    def test_order_batch__unstamped_readings_count_as_now(self):
+        readings = [("a", 70, 30, 950), ("a", 71, 30, None), ("a", 72, 30, 990),
+                    ("b", 69, 30, 5000)]
+        self.assertEqual(ingest.order_batch(readings, now=1000), [
+            ("a", 70, 30, 950), ("a", 72, 30, 990), ("a", 71, 30, 1000), ("b", 69, 30, 1000)])
@@ -0,0 +1,59 @@
+# pylint: disable-all
+
+import logging
+import unittest
+
+import logger
+
+
+def record(message: str, *args, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("thermostat", level, __file__, 1, message, args, None)
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.filter = logger.RateLimitFilter(interval=60, burst=2, clock=lambda: self.now)
+
+
+    def test_filter__passes_burst_then_suppresses(self):
+        results = [self.filter.filter(record("Database flush failed")) for _ in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(self.filter.suppressed, 3)
+
+
+    def test_filter__distinct_messages_are_limited_separately(self):
+        for _ in range(3):
+            self.filter.filter(record("Relays set to %s", "ac"))
+        self.assertTrue(self.filter.filter(record("Relays set to %s", "all off")))
+        self.assertTrue(self.filter.filter(record("Relays set to %s", "ac", level=logging.WARNING)))
+
+
+    def test_filter__reports_suppressed_count_after_interval(self):
+        for _ in range(4):
+            self.filter.filter(record("Database flush failed"))
+        self.now = 61
+        passed = record("Database flush failed")
+        self.assertTrue(self.filter.filter(passed))
+        self.assertEqual(passed.SUPPRESSED, 2)
+        self.now = 200
+        passed = record("Database flush failed")
+        self.filter.filter(passed)
+        self.assertFalse(hasattr(passed, "SUPPRESSED"))
+
+
+    def test_filter__prunes_expired_keys(self):
+        for i in range(logger.MAX_RATE_LIMIT_KEYS):
+            self.filter.filter(record("Message %d", i))
+        self.now = 61
+        self.filter.filter(record("New message"))
+        self.assertEqual(len(self.filter.windows), 1)
+
+
+class TestFieldsFormatter(unittest.TestCase):
+    def test_format__appends_upper_case_fields(self):
+        formatter = logger.FieldsFormatter("%(message)s")
+        message = record("Relays set to %s", "ac")
+        message.AC = True
+        message.PUMP = False
+        self.assertEqual(formatter.format(message), "Relays set to ac ac=True pump=False")
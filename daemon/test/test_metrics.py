@@ -0,0 +1,66 @@
+# pylint: disable-all
+
+import unittest
+
+import metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_observe__counts_in_first_bucket_not_below_value(self):
+        histogram = metrics.Histogram((1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 6)
+
+
+    def test_samples__renders_cumulative_buckets(self):
+        histogram = metrics.Histogram((1, 2))
+        histogram.observe(0.5)
+        histogram.observe(1.5)
+        self.assertEqual(list(histogram.samples("latency", '{route="/"}')), [
+            'latency_bucket{route="/",le="1"} 1',
+            'latency_bucket{route="/",le="2"} 2',
+            'latency_bucket{route="/",le="+Inf"} 2',
+            'latency_sum{route="/"} 2.0',
+            'latency_count{route="/"} 2',
+        ])
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+
+    def test_render__counter_with_and_without_labels(self):
+        self.registry.counter("requests_total", "Requests.").inc(3)
+        family = self.registry.counter("reports_total", "Reports.", ("sensor",))
+        family.labels('Living "room"').inc()
+        self.assertEqual(self.registry.render(), "\n".join([
+            "# HELP requests_total Requests.",
+            "# TYPE requests_total counter",
+            "requests_total 3",
+            "# HELP reports_total Reports.",
+            "# TYPE reports_total counter",
+            'reports_total{sensor="Living \\"room\\""} 1',
+            "",
+        ]))
+
+
+    def test_labels__returns_same_metric(self):
+        family = self.registry.gauge("age", "Age.", ("sensor",))
+        self.assertIs(family.labels("a"), family.labels("a"))
+        with self.assertRaises(ValueError):
+            family.labels("a", "b")
+
+
+    def test_register__rejects_duplicate_name(self):
+        self.registry.gauge("age", "Age.")
+        with self.assertRaises(ValueError):
+            self.registry.counter("age", "Age.")
+
+
+    def test_render__includes_collectors(self):
+        self.registry.collector(lambda: [("up", "Up.", metrics.GAUGE, [({"db": "pg"}, True)])])
+        self.assertIn('up{db="pg"} 1', self.registry.render())
@@ -0,0 +1,81 @@
+# pylint: disable-all
+
+import os
+import stat
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import persistence
+
+
+class TestFileWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "status.json")
+        self.log = MagicMock()
+        self.writer = persistence.FileWriter(self.path, self.log, min_interval=60)
+
+
+    def tearDown(self):
+        self.writer.close()
+        self.directory.cleanup()
+
+
+    def read(self):
+        with open(self.path, "rb") as file:
+            return file.read()
+
+
+    def test_submit__writes_file(self):
+        self.writer.submit(b"first")
+        self.writer.flush()
+        self.assertEqual(self.read(), b"first")
+        self.assertEqual(self.writer.writes, 1)
+
+
+    def test_submit__skips_unchanged_content(self):
+        self.writer.submit(b"first")
+        self.writer.flush()
+        self.writer.submit(b"first")
+        self.writer.flush()
+        self.assertEqual(self.writer.writes, 1)
+        self.assertEqual(self.writer.skipped, 1)
+
+
+    def test_submit__coalesces_changes_within_interval(self):
+        self.writer.submit(b"first")
+        self.writer.future.result()
+        self.writer.submit(b"second")
+        self.writer.submit(b"third")
+        self.assertEqual(self.read(), b"first")
+        self.writer.flush()
+        self.assertEqual(self.read(), b"third")
+        self.assertEqual(self.writer.writes, 2)
+
+
+    def test_submit__writes_held_back_change_when_interval_expires(self):
+        self.writer.min_interval = 0.05
+        self.writer.submit(b"first")
+        self.writer.submit(b"second")
+        self.assertEqual(self.writer.pending[0], b"second")
+        deadline = time.monotonic() + 5
+        while self.writer.writes < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.writer.future.result()
+        self.assertEqual(self.read(), b"second")
+        self.assertIsNone(self.writer.pending)
+
+
+    def test_write_atomic__leaves_no_temp_files(self):
+        persistence.write_atomic(self.path, b"data")
+        self.assertEqual(os.listdir(self.directory.name), ["status.json"])
+
+
+    def test_write_atomic__keeps_file_mode(self):
+        persistence.write_atomic(self.path, b"data")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), persistence.NEW_FILE_MODE)
+        os.chmod(self.path, 0o640)
+        persistence.write_atomic(self.path, b"other")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
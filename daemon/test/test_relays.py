@@ -0,0 +1,76 @@
+# pylint: disable-all
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import relays
+
+RELAYS = ("ac", "furnace")
+
+
+def at(day: int, hour: int, minute: int = 0) -> float:
+    return datetime(2026, 3, day, hour, minute).timestamp()
+
+
+class TestRelayStats(unittest.TestCase):
+    def setUp(self):
+        self.log = MagicMock()
+        self.stats = relays.RelayStats(RELAYS, self.log, path=None)
+        self.stats.started = at(1, 0)
+
+
+    def test_transition__counts_cycles_and_on_time(self):
+        self.stats.transition("ac", True, at(2, 10))
+        self.stats.transition("ac", True, at(2, 10, 5))
+        self.stats.transition("ac", False, at(2, 10, 30))
+        self.assertEqual(self.stats.cycles["ac"], 1)
+        self.assertEqual(self.stats.on_seconds["ac"], 30 * 60)
+        self.assertEqual(self.stats.last_transition["ac"], at(2, 10, 30))
+        self.assertEqual(self.stats.total_on_seconds("furnace"), 0)
+
+
+    def test_transition__splits_on_time_at_midnight(self):
+        self.stats.transition("furnace", True, at(2, 23))
+        self.stats.transition("furnace", False, at(3, 1))
+        self.assertEqual(self.stats.days, {"2026-03-02": {"furnace": 3600.0},
+                                           "2026-03-03": {"furnace": 3600.0}})
+
+
+    def test_summary__duty_cycles_include_running_cycle(self):
+        self.stats.transition("ac", True, at(3, 1))
+        self.stats.transition("ac", False, at(3, 2))
+        self.stats.transition("ac", True, at(3, 5))
+        summary = self.stats.summary(at(3, 6))["ac"]
+        self.assertTrue(summary["on"])
+        self.assertEqual(summary["cycles"], 2)
+        self.assertEqual(summary["today_on_seconds"], 2 * 3600)
+        self.assertAlmostEqual(summary["today_duty_cycle"], 2 / 6)
+        # Tracking started two days earlier
+        self.assertAlmostEqual(summary["week_duty_cycle"], 2 / (2 * 24 + 6))
+
+
+    def test_summary__week_ignores_older_days(self):
+        self.stats.started = at(1, 0) - 30 * 86400
+        self.stats.days = {"2026-02-01": {"ac": 500.0}, "2026-03-02": {"ac": 100.0}}
+        summary = self.stats.summary(at(3, 12))["ac"]
+        self.assertEqual(summary["week_on_seconds"], 100)
+        self.assertEqual(summary["today_on_seconds"], 0)
+
+
+    def test_close__ends_cycles_and_persists(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "relays.json")
+            stats = relays.RelayStats(RELAYS, self.log, path)
+            stats.transition("ac", True, at(2, 10))
+            stats.close(at(2, 11))
+            with open(path) as file:
+                self.assertEqual(json.load(file)["on_seconds"]["ac"], 3600)
+
+            restored = relays.RelayStats(RELAYS, self.log, path)
+            self.assertEqual(restored.cycles["ac"], 1)
+            self.assertEqual(restored.on_seconds["ac"], 3600)
+            self.assertEqual(restored.days, {"2026-03-02": {"ac": 3600.0}})
@@ -0,0 +1,39 @@
+# pylint: disable-all
+
+import unittest
+from datetime import date
+
+import rollups
+
+
+class TestRollups(unittest.TestCase):
+    def test_choose_resolution__hours_for_long_ranges(self):
+        self.assertEqual(rollups.choose_resolution(0, 3600), rollups.MINUTE)
+        self.assertEqual(rollups.choose_resolution(0, 3 * 86400), rollups.HOUR)
+
+
+    def test_month_start__wraps_year(self):
+        self.assertEqual(rollups.month_start(date(2026, 12, 15)), date(2026, 12, 1))
+        self.assertEqual(rollups.month_start(date(2026, 12, 15), 1), date(2027, 1, 1))
+        self.assertEqual(rollups.month_start(date(2026, 1, 31), 13), date(2027, 2, 1))
+
+
+    def test_partition_month__reverses_partition_name(self):
+        name = rollups.partition_name("sensors", date(2026, 3, 1))
+        self.assertEqual(name, "sensors_y2026m03")
+        self.assertEqual(rollups.partition_month("sensors", name), date(2026, 3, 1))
+        self.assertIsNone(rollups.partition_month("sensors", "sensors_default"))
+        self.assertIsNone(rollups.partition_month("sensors", "sensors_minute"))
+        self.assertIsNone(rollups.partition_month("averages", name))
+
+
+    def test_create_partition_queries__covers_one_month(self):
+        queries = rollups.create_partition_queries("pins", date(2026, 12, 1))
+        self.assertIn("pins_default PARTITION OF pins DEFAULT", queries[0])
+        self.assertIn("FROM ('2026-12-01') TO ('2027-01-01')", queries[1])
+
+
+    def test_create_table_query__partitions_only_when_asked(self):
+        self.assertNotIn("PARTITION", rollups.create_table_query("pins", "time timestamptz", False))
+        self.assertTrue(rollups.create_table_query("pins", "time timestamptz", True)
+                        .endswith("PARTITION BY RANGE (time)"))
@@ -0,0 +1,119 @@
+# pylint: disable-all
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import schedule
+
+BLOCKS = [
+    {"days": [0, 1, 2, 3, 4], "start": "6:30", "target": 70},
+    {"days": [0, 1, 2, 3, 4], "start": "22:00", "target": 64},
+    {"days": [5, 6], "start": "08:00", "target": 71},
+    {"days": [5, 6], "start": "23:00", "target": 65},
+]
+
+
+def at(day: int, hour: int, minute: int = 0) -> float:
+    # 2025-01-06 is a Monday
+    return datetime(2025, 1, 6 + day, hour, minute).timestamp()
+
+
+class TestSchedule(unittest.TestCase):
+    def setUp(self):
+        self.schedule = schedule.Schedule(MagicMock(), path=None)
+        self.schedule.set_blocks(BLOCKS)
+
+
+    def test_active__finds_block_and_next_transition(self):
+        entry = self.schedule.active(at(1, 12))
+        self.assertEqual(entry["source"], "schedule")
+        self.assertEqual(entry["target"], 70)
+        self.assertEqual(entry["start"], "06:30")
+        self.assertEqual(entry["until"], at(1, 22))
+
+
+    def test_active__transition_starts_block(self):
+        self.assertEqual(self.schedule.active(at(1, 6, 30))["target"], 70)
+        self.assertEqual(self.schedule.active(at(1, 6, 29))["target"], 64)
+
+
+    def test_active__wraps_around_the_week(self):
+        entry = self.schedule.active(at(0, 3))
+        self.assertEqual(entry["target"], 65)  # Sunday's last block
+        self.assertEqual(entry["until"], at(0, 6, 30))
+        self.assertEqual(self.schedule.active(at(6, 23, 30))["until"], at(7, 6, 30))
+
+
+    def test_active__away_and_hold(self):
+        self.schedule.set_mode("away", away_temp=58)
+        self.assertEqual(self.schedule.active(at(1, 12)),
+                         {"source": "away", "target": 58, "until": None})
+        self.schedule.set_mode("hold")
+        self.assertIsNone(self.schedule.active(at(1, 12)))
+
+
+    def test_override__lasts_until_next_transition(self):
+        self.schedule.set_override(75, now=at(1, 12))
+        self.assertEqual(self.schedule.active(at(1, 21))["target"], 75)
+        self.assertEqual(self.schedule.active(at(1, 22))["target"], 64)
+        self.assertFalse(self.schedule.expire(at(1, 21)))
+        self.assertTrue(self.schedule.expire(at(1, 22)))
+        self.assertIsNone(self.schedule.override)
+
+
+    def test_set_mode__ends_override(self):
+        self.schedule.set_override(75, now=at(1, 12))
+        self.schedule.set_mode("schedule")
+        self.assertEqual(self.schedule.active(at(1, 12))["target"], 70)
+
+
+    def test_set_blocks__rejects_invalid_blocks(self):
+        for blocks in ([{"days": [7], "start": "06:00", "target": 70}],
+                       [{"days": [0], "start": "6am", "target": 70}],
+                       [{"days": [0], "start": "06:00"}],
+                       [{"days": [0], "start": "06:00", "target": 70},
+                        {"days": [0, 1], "start": "06:00", "target": 68}]):
+            with self.assertRaises(ValueError):
+                self.schedule.set_blocks(blocks)
+        self.assertEqual(self.schedule.active(at(1, 12))["target"], 70)
+
+
+    def test_set_mode__rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.schedule.set_mode("vacation")
+
+
+class TestSchedulePersistence(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "schedule.json")
+
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_schedule_survives_restart(self):
+        saved = schedule.Schedule(MagicMock(), self.path)
+        saved.set_blocks(BLOCKS)
+        saved.set_mode("away", away_temp=60)
+        saved.set_override(68, until=at(2, 0))
+        saved.close()
+
+        loaded = schedule.Schedule(MagicMock(), self.path)
+        self.assertEqual(loaded.as_dict(), saved.as_dict())
+        self.assertEqual(loaded.active(at(1, 12))["target"], 68)
+        loaded.close()
+
+
+    def test_unreadable_file_is_ignored(self):
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write('{"mode": "party", "away_temp": 60, "blocks": []}')
+        log = MagicMock()
+        loaded = schedule.Schedule(log, self.path)
+        self.assertEqual(loaded.mode, "schedule")
+        log.warning.assert_called_once()
+        loaded.close()
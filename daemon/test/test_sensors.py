@@ -0,0 +1,93 @@
+# pylint: disable-all
+
+import unittest
+
+import sensors
+from filters import Conditioning
+
+
+class TestSensorRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = sensors.SensorRegistry(stale_timeout=60)
+
+
+    def test_average__none_without_sensors(self):
+        self.assertIsNone(self.registry.average())
+
+
+    def test_update__replaces_reading_in_average(self):
+        self.registry.update("a", 70, 30, 0)
+        self.registry.update("b", 74, 30, 0)
+        self.registry.update("a", 72, 30, 1)
+        self.assertEqual(self.registry.average(), 73)
+        self.assertEqual(len(self.registry), 2)
+
+
+    def test_update__ignores_older_reading(self):
+        self.registry.update("a", 70, 30, 10)
+        self.registry.update("a", 90, 30, 5)
+        self.assertEqual(self.registry.average(), 70)
+
+
+    def test_expire__removes_only_stale_sensors(self):
+        self.registry.update("a", 70, 30, 0)
+        self.registry.update("b", 74, 30, 30)
+        self.registry.update("a", 72, 30, 50)
+        self.assertEqual(self.registry.expire(90), ["b"])
+        self.assertEqual(self.registry.average(), 72)
+        self.assertEqual(self.registry.next_expiry(), 110)
+
+
+    def test_average__weighted_by_sensor_and_room(self):
+        self.registry.configure(weights={"a": 3, "upstairs": 0}, rooms={"B": "Upstairs"})
+        self.registry.update("A", 70, 30, 0)
+        self.registry.update("b", 90, 30, 0)
+        self.registry.update("c", 74, 30, 0)
+        self.assertEqual(self.registry.average(), 71)
+
+
+    def test_average__median_and_trimmed_mean(self):
+        for i, temp in enumerate([70, 71, 72, 73, 100]):
+            self.registry.update(str(i), temp, 30, 0)
+        self.registry.configure(sensors.MEDIAN)
+        self.assertEqual(self.registry.average(), 72)
+        self.registry.configure(sensors.TRIMMED_MEAN)
+        self.assertEqual(self.registry.average(), 72)
+
+
+    def test_configure__rejects_unknown_aggregation(self):
+        with self.assertRaises(ValueError):
+            self.registry.configure("mode")
+
+
+    def test_update__conditioned_reading_rejects_spike(self):
+        self.registry.configure(conditioning=Conditioning())
+        for i, temp in enumerate([70, 70, 70, 70]):
+            self.registry.update("a", temp, 30, i)
+        self.registry.update("a", 120, 30, 4)
+        self.assertEqual(self.registry.average(), 70)
+        self.assertEqual(self.registry.get("a").timestamp, 4)
+        self.assertEqual(self.registry.as_dicts()["a"]["temperature"], 70)
+
+
+    def test_slope__weighted_mean_of_conditioned_sensors(self):
+        self.assertIsNone(self.registry.slope())
+        self.registry.configure(conditioning=Conditioning(smoothing=1, trend_smoothing=1))
+        self.registry.update("a", 70, 30, 0)
+        self.registry.update("a", 71, 30, 3600)
+        self.registry.update("b", 70, 30, 0)
+        self.registry.update("b", 73, 30, 3600)
+        self.assertEqual(self.registry.slope(), 2)
+        self.assertEqual(self.registry.as_dicts()["a"]["slope"], 1)
+        self.registry.expire(3600 + 60)
+        self.assertIsNone(self.registry.slope())
+        self.assertEqual(self.registry.filters, {})
+
+
+    def test_metric_label__other_for_sensors_not_in_config(self):
+        self.registry.configure(weights={"Den": 2}, rooms={"Office": "upstairs"})
+        self.registry.labelled = {"cellar"}
+        self.assertEqual(self.registry.metric_label("Den"), "den")
+        self.assertEqual(self.registry.metric_label("office"), "office")
+        self.assertEqual(self.registry.metric_label("Cellar"), "cellar")
+        self.assertEqual(self.registry.metric_label("random-123"), sensors.OTHER_SENSORS)
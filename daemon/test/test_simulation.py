@@ -0,0 +1,45 @@
+# pylint: disable-all
+
+import unittest
+
+import simulation
+from gpio_controller import FURNACE_PIN, OFF, ON
+
+
+class TestSimulation(unittest.TestCase):
+    def test_clock_moves_only_when_advanced(self):
+        clock = simulation.SimulatedClock(100)
+        self.assertEqual(clock(), 100)
+        clock.advance(30)
+        self.assertEqual(clock(), 130)
+
+
+    def test_house_drifts_to_outdoor_and_heats_with_furnace(self):
+        gpio = simulation.SimulatedGpio()
+        gpio.setup(FURNACE_PIN, gpio.OUT, initial=OFF)
+        house = simulation.House(70)
+        house.step(3600, 30, gpio)
+        self.assertLess(house.temperature, 70)
+
+        cold = house.temperature
+        gpio.output(FURNACE_PIN, ON)
+        house.step(3600, 30, gpio)
+        self.assertGreater(house.temperature, cold)
+
+
+    def test_winter_holds_target_with_furnace(self):
+        result = simulation.simulate(days=1, trace="winter")
+        self.assertGreater(result["furnace_cycles"], 0)
+        self.assertEqual(result["ac_cycles"], 0)
+        self.assertLess(result["worst_outside_band"], 1)
+
+
+    def test_summer_cools(self):
+        result = simulation.simulate(days=1, trace="summer")
+        self.assertEqual(result["furnace_cycles"], 0)
+        self.assertGreater(result["ac_on_hours"] + result["pump_on_hours"], 0)
+
+
+    def test_same_seed_gives_same_result(self):
+        self.assertEqual(simulation.simulate(days=0.5, seed=3),
+                         simulation.simulate(days=0.5, seed=3))
@@ -0,0 +1,90 @@
+# pylint: disable-all
+
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import history
+import models
+import sqlite_database
+
+
+class TestSqliteDatabase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "history.db")
+        self.database = sqlite_database.SqliteDatabase(MagicMock(), self.path)
+        await self.database.connect_db()
+
+
+    async def asyncTearDown(self):
+        await self.database.disconnect_db()
+        self.directory.cleanup()
+
+
+    async def test_flush__writes_buffered_rows_in_wal_mode(self):
+        await self.database.update_sensors("Den", 70.0, 30.0)
+        await self.database.flush()
+        self.assertEqual(self.database.buffer.size, 0)
+        self.assertEqual(self.database.flushed_rows, 1)
+        journal_mode = await self.database._run(
+            lambda: self.database.connection.execute("PRAGMA journal_mode").fetchone()[0])
+        self.assertEqual(journal_mode, "wal")
+
+
+    async def test_update_sensors__thins_rows_per_sensor(self):
+        now = time.time()
+        await self.database.update_sensors("Den", 70.0, 30.0, now)
+        await self.database.update_sensors("Den", 70.5, 30.0, now + 10)
+        await self.database.update_sensors("Kitchen", 71.0, 30.0, now + 10)
+        await self.database.update_sensors("Den", 71.0, 30.0, now + 61)
+        self.assertEqual(self.database.buffer.size, 3)
+        self.assertEqual(self.database.get_stats()["skipped_sensor_rows"], 1)
+
+
+    async def test_load_history__restores_averages_with_pins(self):
+        usable = models.Usable(ac=True, cooler=True, furnace=True)
+        await self.database.update_averages(70.0, 72)
+        await self.database.update_pins(
+            models.Pins(pump=False, fan_on=False, ac=False, furnace=True), usable)
+        await self.database.flush()
+
+        rows = await self.database.load_history(time.time() - 60)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][1:], (70.0, 72, history.PIN_FURNACE))
+        self.assertEqual(await self.database.load_history(time.time() + 60), [])
+
+
+    async def test_disconnect_db__flushes_and_data_survives_reopening(self):
+        await self.database.update_averages(70.0, 72)
+        await self.database.disconnect_db()
+
+        self.database = sqlite_database.SqliteDatabase(MagicMock(), self.path)
+        await self.database.connect_db()
+        rows = await self.database.load_history(0)
+        self.assertEqual([row[1:3] for row in rows], [(70.0, 72)])
+
+
+    async def test_flush__deletes_rows_past_retention(self):
+        await self.database.update_sensors("Den", 70.0, 30.0, time.time() - 40 * 86400)
+        await self.database.update_sensors("Kitchen", 70.0, 30.0)
+        await self.database.flush()
+        count = await self.database._run(
+            lambda: self.database.connection.execute("SELECT count(*) FROM sensors").fetchone()[0])
+        self.assertEqual(count, 1)
+
+
+    async def test_flush__failed_retention_rolls_back_and_keeps_writing(self):
+        await self.database.update_sensors("Den", 70.0, 30.0, time.time() - 40 * 86400)
+        with patch.object(sqlite_database, "TABLE_COLUMNS", ("sensors", "missing")):
+            await self.database.flush()
+        self.database.log.error.assert_called_once()
+        self.assertFalse(self.database.connection.in_transaction)
+
+        await self.database.update_sensors("Kitchen", 70.0, 30.0)
+        await self.database.flush()
+        count = await self.database._run(
+            lambda: self.database.connection.execute("SELECT count(*) FROM sensors").fetchone()[0])
+        self.assertEqual(count, 2)
@@ -0,0 +1,46 @@
+# pylint: disable-all
+
+import unittest
+
+import models
+from state import PinState, ThermostatState, UsableState, pin_state
+
+SAVED = {
+    "pins": {"pump": False, "fan_on": False, "ac": True, "furnace": False},
+    "usable": {"ac": True, "cooler": False, "furnace": True},
+    "target_temp": 70,
+    "manual_override": False,
+}
+
+class TestThermostatState(unittest.TestCase):
+    def test_from_dict__reads_saved_status(self):
+        state = ThermostatState.from_dict(SAVED)
+        self.assertEqual(state.pins, PinState(ac=True))
+        self.assertEqual(state.usable, UsableState(cooler=False))
+        self.assertEqual(state.target_temp, 70)
+        self.assertEqual(state.average_temp, 72)
+
+
+    def test_from_dict__rejects_missing_fields(self):
+        with self.assertRaises(KeyError):
+            ThermostatState.from_dict({"pins": SAVED["pins"]})
+
+
+    def test_as_dict__round_trips_without_average(self):
+        state = ThermostatState.from_dict(SAVED)
+        self.assertEqual(state.as_dict(ephemeral=False), SAVED)
+        self.assertEqual(state.as_dict()["average_temp"], 72)
+
+
+    def test_to_model__matches_status_model(self):
+        state = ThermostatState.from_dict(SAVED)
+        self.assertEqual(state.to_model({}), models.Status(**SAVED, average_temp=72, sensors={}))
+
+
+    def test_pin_state__converts_model(self):
+        pins = models.Pins(pump=True, fan_on=True, ac=False, furnace=False)
+        self.assertEqual(pin_state(pins), PinState(pump=True, fan_on=True))
+
+
+    def test_slots__no_instance_dict(self):
+        self.assertFalse(hasattr(ThermostatState(), "__dict__"))
@@ -0,0 +1,78 @@
+# pylint: disable-all
+
+import unittest
+from unittest.mock import MagicMock
+
+import udp_listener
+
+KEY = b"secret"
+
+
+class TestDatagram(unittest.TestCase):
+    def test_decode_datagram__returns_encoded_reading(self):
+        data = udp_listener.encode_datagram(KEY, "Kitchen", 71.5, 40.0, 7, 42)
+        self.assertEqual(udp_listener.decode_datagram(KEY, data), ("Kitchen", 71.5, 40.0, 7, 42))
+
+
+    def test_decode_datagram__rejects_wrong_key_and_tampering(self):
+        data = udp_listener.encode_datagram(KEY, "Kitchen", 71.5, 40.0, 7, 42)
+        with self.assertRaises(ValueError):
+            udp_listener.decode_datagram(b"other", data)
+        with self.assertRaises(ValueError):
+            udp_listener.decode_datagram(KEY, data[:5] + bytes([data[5] ^ 1]) + data[6:])
+        with self.assertRaises(ValueError):
+            udp_listener.decode_datagram(KEY, data[:10])
+
+
+
+    def test_decode_datagram__rejects_non_finite_values(self):
+        data = udp_listener.encode_datagram(KEY, "Kitchen", float("nan"), 40.0, 7, 42)
+        with self.assertRaises(ValueError):
+            udp_listener.decode_datagram(KEY, data)
+
+
+class TestSequenceWindow(unittest.TestCase):
+    def setUp(self):
+        self.window = udp_listener.SequenceWindow()
+
+
+    def test_accept__rejects_replay(self):
+        self.assertTrue(self.window.accept(1, 1))
+        self.assertFalse(self.window.accept(1, 1))
+        self.assertEqual(self.window.replayed, 1)
+
+
+    def test_accept__counts_lost_and_recovers_out_of_order(self):
+        self.window.accept(1, 1)
+        self.window.accept(1, 5)
+        self.assertEqual(self.window.lost, 3)
+        self.assertTrue(self.window.accept(1, 3))
+        self.assertEqual(self.window.lost, 2)
+        self.assertFalse(self.window.accept(1, 3))
+
+
+    def test_accept__rejects_too_old_and_old_epoch(self):
+        self.window.accept(2, 100)
+        self.assertFalse(self.window.accept(2, 100 - udp_listener.REPLAY_WINDOW))
+        self.assertFalse(self.window.accept(1, 500))
+        self.assertEqual(self.window.too_old, 2)
+
+
+    def test_accept__new_epoch_restarts_sequence(self):
+        self.window.accept(1, 100)
+        self.assertTrue(self.window.accept(2, 1))
+        self.assertEqual(self.window.lost, 0)
+
+
+class TestSensorDatagramProtocol(unittest.TestCase):
+    def test_datagram_received__passes_new_readings_only(self):
+        readings = []
+        protocol = udp_listener.SensorDatagramProtocol(
+            KEY, lambda *reading: readings.append(reading), MagicMock())
+        data = udp_listener.encode_datagram(KEY, "Den", 70.0, 30.0, 1, 1)
+        protocol.datagram_received(data, ("10.0.0.2", 5000))
+        protocol.datagram_received(data, ("10.0.0.2", 5000))
+        protocol.datagram_received(b"garbage", ("10.0.0.3", 5000))
+        self.assertEqual(readings, [("Den", 70.0, 30.0)])
+        self.assertEqual(protocol.get_stats()["rejected"], 1)
+        self.assertEqual(protocol.get_stats()["sensors"]["Den"]["replayed"], 1)
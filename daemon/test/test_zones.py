@@ -0,0 +1,116 @@
+# pylint: disable-all
+
+import unittest
+from dataclasses import replace
+from unittest.mock import MagicMock, patch
+
+import config
+import gpio_controller
+import zones
+from state import PinState
+
+ZONES = (
+    config.ZoneSettings("upstairs", ("Bedroom", "Office"), (20, 21, 22, 23)),
+    config.ZoneSettings("basement", ("Cellar",), (24, 25, 26, 27)),
+)
+
+class TestZoneSet(unittest.TestCase):
+    def setUp(self):
+        self.executor = MagicMock()
+        self.zones = zones.ZoneSet(MagicMock(), self.executor, path=None)
+        self.zones.configure(ZONES)
+        self.zones.drive(1000)
+        self.executor.reset_mock()
+
+
+    def test_update_sensor__routes_by_name(self):
+        self.assertTrue(self.zones.update_sensor("bedroom", 70, 30, 1000))
+        self.assertFalse(self.zones.update_sensor("Kitchen", 70, 30, 1000))
+        self.assertIn("bedroom", self.zones.get_status("upstairs")["sensors"])
+        self.assertEqual(self.zones.get_status("basement")["sensors"], {})
+
+
+    def test_drive__only_evaluates_changed_zones(self):
+        self.assertEqual(self.zones.drive(1001), 0)
+        self.zones.update_sensor("Cellar", 70, 30, 1001)
+        self.assertEqual(self.zones.drive(1002), 1)
+
+
+    def test_drive__batches_relay_changes(self):
+        self.zones.update_sensor("Bedroom", 60, 30, 1000)
+        self.zones.update_sensor("Cellar", 80, 30, 1000)
+        self.zones.drive(1001)
+        self.assertEqual(self.zones.zones["upstairs"].status.pins, PinState(furnace=True))
+        self.assertEqual(self.zones.zones["basement"].status.pins, PinState(ac=True))
+        self.executor.submit.assert_called_once()
+        function, changes = self.executor.submit.call_args[0]
+        self.assertEqual(len(changes), 2)
+        with patch("gpio_controller.GPIO") as mock_gpio:
+            function(changes)
+        mock_gpio.output.assert_any_call(23, gpio_controller.ON)
+        mock_gpio.output.assert_any_call(26, gpio_controller.ON)
+
+
+    def test_drive__writes_first_all_off_decision(self):
+        self.zones.update_sensor("Cellar", 72, 30, 1000)
+        self.zones.drive(1001)
+        self.assertEqual(self.zones.zones["basement"].status.pins, PinState())
+        self.executor.submit.assert_called_once()
+        function, changes = self.executor.submit.call_args[0]
+        with patch("gpio_controller.GPIO") as mock_gpio:
+            function(changes)
+        for pin in (24, 25, 26, 27):
+            mock_gpio.output.assert_any_call(pin, gpio_controller.OFF)
+
+        self.executor.reset_mock()
+        self.zones.update_sensor("Cellar", 72, 30, 1000 + zones.CYCLE_TIME)
+        self.zones.drive(1000 + zones.CYCLE_TIME)
+        self.executor.submit.assert_not_called()
+
+
+    def test_configure__sets_up_zone_pins(self):
+        executor = MagicMock()
+        zone_set = zones.ZoneSet(MagicMock(), executor, path=None)
+        zone_set.configure(ZONES)
+        with patch("gpio_controller.GPIO") as mock_gpio:
+            for call in executor.submit.call_args_list:
+                call.args[0]()
+        for pin in range(20, 28):
+            mock_gpio.setup.assert_any_call(pin, mock_gpio.OUT, initial=gpio_controller.OFF)
+
+
+    def test_drive__wakes_for_cycle_lockout(self):
+        self.zones.update_sensor("Bedroom", 60, 30, 1000)
+        self.zones.drive(1000)
+        self.zones.update_sensor("Bedroom", 75, 30, 1010)
+        self.zones.drive(1010)
+        self.assertEqual(self.zones.zones["upstairs"].status.pins, PinState(furnace=True))
+        self.assertTrue(0 < self.zones.seconds_until_next_check(1010) <= 60)
+        self.zones.update_sensor("Bedroom", 75, 30, 1000 + zones.CYCLE_TIME)
+        self.zones.drive(1000 + zones.CYCLE_TIME)
+        self.assertEqual(self.zones.zones["upstairs"].status.pins, PinState())
+
+
+    def test_configure_sensors__applies_aggregation_to_zones(self):
+        settings = replace(config.settings.sensors, aggregation="median")
+        self.zones.configure_sensors(settings)
+        self.zones.configure((config.ZoneSettings("attic", ("A", "B", "C"), (28, 29, 30, 31)),))
+        for name, temp in (("A", 70), ("B", 71), ("C", 90)):
+            self.zones.update_sensor(name, temp, 30, 1000)
+        self.zones.drive(1000)
+        self.assertEqual(self.zones.get_status("attic")["average_temp"], 71)
+        self.assertEqual(self.zones.zones["upstairs"].sensors.aggregation, "median")
+
+        self.zones.configure_sensors(settings)  # a reload keeps the aggregation
+        self.assertEqual(self.zones.zones["attic"].sensors.aggregation, "median")
+
+
+    def test_set_target_temp__unknown_zone(self):
+        with self.assertRaises(KeyError):
+            self.zones.set_target_temp("attic", 70)
+
+
+    def test_update_history__per_zone(self):
+        self.zones.set_target_temp("basement", 65)
+        self.zones.update_history(1000)
+        self.assertEqual(self.zones.get_history("basement", 0), [(1000, 72, 65, 0, 72, 72)])
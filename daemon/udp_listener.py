@@ -0,0 +1,155 @@
+"""
+Receives fire-and-forget sensor readings over UDP.
+
+A datagram is, in network byte order:
+
+    version   uint8    DATAGRAM_VERSION
+    epoch     uint32   increases whenever the sensor's sequence restarts (e.g. boot time)
+    sequence  uint32   increases with every datagram within an epoch
+    temp      float32  degrees fahrenheit
+    humidity  float32
+    name_len  uint8
+    name      name_len bytes of UTF-8
+    mac       16 bytes, HMAC-SHA256 of everything above with the shared key, truncated
+
+Datagrams with a bad MAC are dropped. Per sensor, a sliding window over the
+sequence numbers rejects replayed and duplicated datagrams while accepting
+ones that arrive slightly out of order, and gaps are counted as lost.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import struct
+
+import ingest
+
+DATAGRAM_VERSION = 1
+HEADER = struct.Struct("!BIIffB")
+MAC_SIZE = 16
+REPLAY_WINDOW = 64  # sequence numbers behind the newest that may still arrive
+
+
+def encode_datagram(key: bytes, name: str, temperature: float, humidity: float,
+                    epoch: int, sequence: int) -> bytes:
+    """Builds a signed datagram. Used by gateways and tests."""
+    encoded_name = name.encode()
+    body = HEADER.pack(DATAGRAM_VERSION, epoch, sequence, temperature, humidity,
+                       len(encoded_name)) + encoded_name
+    return body + hmac.new(key, body, hashlib.sha256).digest()[:MAC_SIZE]
+
+
+def decode_datagram(key: bytes, data: bytes) -> tuple:
+    """
+    Verifies and unpacks a datagram into `(name, temperature, humidity, epoch, sequence)`.
+    Raises ValueError if it is malformed or its MAC does not match.
+    """
+    if len(data) < HEADER.size + MAC_SIZE:
+        raise ValueError("datagram too short")
+    body, mac = data[:-MAC_SIZE], data[-MAC_SIZE:]
+    expected = hmac.new(key, body, hashlib.sha256).digest()[:MAC_SIZE]
+    if not hmac.compare_digest(mac, expected):
+        raise ValueError("bad signature")
+    version, epoch, sequence, temperature, humidity, name_len = HEADER.unpack_from(body)
+    if version != DATAGRAM_VERSION:
+        raise ValueError(f"unknown version {version}")
+    if len(body) != HEADER.size + name_len:
+        raise ValueError("name length mismatch")
+    name = body[HEADER.size:].decode()
+    ingest.check_reading(temperature, humidity)
+    return name, temperature, humidity, epoch, sequence
+
+
+class SequenceWindow:
+    """Replay protection and loss accounting for one sensor."""
+    __slots__ = ("epoch", "highest", "seen", "received", "lost", "replayed", "too_old")
+
+    def __init__(self):
+        self.epoch = None
+        self.highest = 0
+        self.seen = 0  # bit n set: highest - n was received
+        self.received = 0
+        self.lost = 0
+        self.replayed = 0
+        self.too_old = 0
+
+    def accept(self, epoch: int, sequence: int) -> bool:
+        """Records the datagram. Returns False if it must be dropped."""
+        if self.epoch is None or epoch > self.epoch:
+            self.epoch = epoch
+            self.highest = sequence
+            self.seen = 1
+            self.received += 1
+            return True
+        if epoch < self.epoch:
+            self.too_old += 1
+            return False
+
+        if sequence > self.highest:
+            shift = sequence - self.highest
+            self.lost += shift - 1
+            self.seen = ((self.seen << shift) | 1) & ((1 << REPLAY_WINDOW) - 1) \
+                if shift < REPLAY_WINDOW else 1
+            self.highest = sequence
+            self.received += 1
+            return True
+
+        offset = self.highest - sequence
+        if offset >= REPLAY_WINDOW:
+            self.too_old += 1
+            return False
+        if self.seen & (1 << offset):
+            self.replayed += 1
+            return False
+        # A late datagram filling a gap was counted as lost when the gap appeared.
+        self.seen |= 1 << offset
+        self.lost -= 1
+        self.received += 1
+        return True
+
+    def as_dict(self) -> dict:
+        """Counters of this sensor for the API."""
+        return {
+            "received": self.received,
+            "lost": self.lost,
+            "replayed": self.replayed,
+            "too_old": self.too_old,
+        }
+
+
+class SensorDatagramProtocol(asyncio.DatagramProtocol):
+    """Passes authentic, new readings to `on_reading(name, temperature, humidity)`."""
+    def __init__(self, key: bytes, on_reading, log):
+        self.key = key
+        self.on_reading = on_reading
+        self.log = log
+        self.windows = {}
+        self.rejected = 0
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            name, temperature, humidity, epoch, sequence = decode_datagram(self.key, data)
+        except (ValueError, UnicodeDecodeError) as e:
+            self.rejected += 1
+            self.log.debug("Dropped datagram from %s: %s", addr[0], e)
+            return
+        window = self.windows.get(name)
+        if window is None:
+            window = self.windows[name] = SequenceWindow()
+        if window.accept(epoch, sequence):
+            self.on_reading(name, temperature, humidity)
+
+    def get_stats(self) -> dict:
+        """Rejected datagrams and per-sensor counters."""
+        return {
+            "rejected": self.rejected,
+            "sensors": {name: window.as_dict() for name, window in self.windows.items()},
+        }
+
+
+async def start_listener(host: str, port: int, key: bytes, on_reading, log):
+    """Starts listening on `host`:`port`. Returns the transport and protocol."""
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(
+        lambda: SensorDatagramProtocol(key, on_reading, log),
+        local_addr=(host, port))
@@ -0,0 +1,269 @@
+"""
+Extra heating/cooling zones driven next to the main thermostat.
+
+A zone has its own sensors, target temperature, usable systems, relay pins
+and history, and is controlled by the same `controller.decide` as the main
+thermostat. Sensors are routed to their zone through one index from sensor
+name to zone; sensors of no zone belong to the main thermostat.
+
+`ZoneSet.drive` evaluates the zones in one pass per tick, but only the zones
+that changed: a sensor of theirs reported, a setting changed, or their cycle
+lockout or a sensor expiry came due. The resulting relay changes of all
+zones go to the GPIO thread as one job. A tick therefore costs
+O(changed zones), however many zones and sensors there are.
+"""
+
+import heapq
+import json
+import time
+
+from pydantic_core import to_json
+
+from controller import ACTION_PINS, CYCLE_TIME, SENSOR_STALE_TIMEOUT, anticipated, decide
+from gpio_controller import GpioController
+from history import History, downsample, pins_to_mask
+from persistence import FileWriter
+from sensors import SensorRegistry
+from state import ALL_OFF, ThermostatState, UsableState
+
+ZONES_PATH = "zones.json"
+
+
+class Zone:
+    """One zone: its sensors, state, relays and history."""
+    def __init__(self, name: str, sensor_names: tuple, pins: tuple, log,
+                 stale_timeout: float = SENSOR_STALE_TIMEOUT, stats_path: str = None):
+        self.name = name
+        self.sensor_names = tuple(sensor_names)
+        self.sensors = SensorRegistry(stale_timeout)
+        self.sensors.labelled = {sensor.lower() for sensor in self.sensor_names}
+        self.status = ThermostatState()
+        self.gpio_controller = GpioController(log, stats_path, pins)
+        self.history = History()
+        self.last_update_time = None
+
+    def as_dict(self) -> dict:
+        """The zone's status in the format of `models.Status`."""
+        result = self.status.as_dict()
+        result["sensors"] = self.sensors.as_dicts()
+        return result
+
+    def next_check(self, cycle_time: float):
+        """Time at which the zone has something new to do without input, None if never."""
+        deadlines = []
+        if self.last_update_time is not None:
+            deadlines.append(self.last_update_time + cycle_time)
+        next_expiry = self.sensors.next_expiry()
+        if next_expiry is not None:
+            deadlines.append(next_expiry)
+        return min(deadlines) if deadlines else None
+
+
+class ZoneSet:
+    """
+    All extra zones. GPIO writes run on `executor`, which must be the GPIO
+    thread of the main thermostat so every relay write stays in order.
+    """
+    def __init__(self, log, executor, path: str = ZONES_PATH):
+        self.log = log
+        self.executor = executor
+        self.zones = {}
+        # lower case sensor name -> Zone
+        self.sensor_zones = {}
+        self.dirty = set()
+        # (time, zone name) at which a zone needs evaluating, may hold stale entries
+        self.deadlines = []
+        self.cycle_time = CYCLE_TIME
+        self.anticipation = 0
+        # config.SensorSettings for the zones' sensors, None for the defaults
+        self.sensor_settings = None
+        self.path = path
+        self.writer = FileWriter(path, log) if path else None
+
+    def configure(self, zone_settings: tuple, stale_timeout: float = SENSOR_STALE_TIMEOUT):
+        """
+        Creates the zones of `config.ZoneSettings` and restores their
+        targets and usable systems from the zones file.
+        """
+        saved = self._load()
+        for settings in zone_settings:
+            zone = Zone(settings.name, settings.sensors, settings.pins, self.log,
+                        stale_timeout, f"relays-{settings.name}.json" if self.path else None)
+            self._configure_sensors(zone)
+            if settings.name in saved:
+                try:
+                    zone.status = ThermostatState.from_dict(saved[settings.name])
+                except (KeyError, TypeError, ValueError) as e:
+                    self.log.warning("Ignoring saved state of zone %s: %s", settings.name, e)
+                # The relays start switched off whatever they were before.
+                zone.status.pins = ALL_OFF
+            self.zones[settings.name] = zone
+            future = self.executor.submit(zone.gpio_controller.set_up_pins)
+            future.add_done_callback(self._log_io_failure)
+            for sensor in zone.sensor_names:
+                self.sensor_zones[sensor.lower()] = zone
+            self.dirty.add(settings.name)
+        if self.zones:
+            self.log.info("Controlling zones %s", ", ".join(self.zones))
+
+    def set_stale_timeout(self, stale_timeout: float):
+        """Changes after how many seconds without a report a sensor is ignored."""
+        for zone in self.zones.values():
+            zone.sensors.stale_timeout = stale_timeout
+            self.dirty.add(zone.name)
+
+    def configure_sensors(self, sensor_settings):
+        """
+        Applies the aggregation, weights, rooms and conditioning of
+        `config.SensorSettings` to the zones' sensors, like the main thermostat's.
+        """
+        self.sensor_settings = sensor_settings
+        for zone in self.zones.values():
+            self._configure_sensors(zone)
+            self.dirty.add(zone.name)
+
+    def update_sensor(self, name: str, temperature: float, humidity: float,
+                      timestamp: float) -> bool:
+        """Passes a reading to the zone of sensor `name`. Returns False if it has no zone."""
+        zone = self.sensor_zones.get(name.lower())
+        if zone is None:
+            return False
+        zone.sensors.update(name, temperature, humidity, timestamp)
+        self.dirty.add(zone.name)
+        return True
+
+    def set_target_temp(self, name: str, temp: int):
+        """Sets the temperature zone `name` aims for. Raises KeyError for unknown zones."""
+        zone = self.zones[name]
+        self.log.info("Target temperature of zone %s set to %s", name, temp,
+                      extra={"ZONE": name, "TARGET_TEMP": temp})
+        zone.status.target_temp = temp
+        self.dirty.add(name)
+
+    def set_usable(self, name: str, ac: bool, cooler: bool, furnace: bool):
+        """Sets which systems zone `name` can use. Raises KeyError for unknown zones."""
+        zone = self.zones[name]
+        zone.status.usable = UsableState(bool(ac), bool(cooler), bool(furnace))
+        self.dirty.add(name)
+
+    def drive(self, now: float = None) -> int:
+        """
+        Evaluates every zone that changed or came due since the last call and
+        hands the relay changes to the GPIO thread. Returns the number of zones evaluated.
+        """
+        if now is None:
+            now = time.time()
+        due = self.dirty
+        self.dirty = set()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            due.add(heapq.heappop(self.deadlines)[1])
+        changes = []
+        for name in due:
+            zone = self.zones[name]
+            status = zone.status
+            zone.sensors.expire(now)
+            average_temp = zone.sensors.average()
+            if average_temp is not None:
+                status.average_temp = average_temp
+                status.temperature_slope = zone.sensors.slope()
+                if not status.manual_override and (zone.last_update_time is None or
+                                                   now - zone.last_update_time >= self.cycle_time):
+                    action, cycle_changed = decide(anticipated(status, self.anticipation),
+                                                   status.target_temp, status.pins,
+                                                   status.usable)
+                    # Until the first write the relays may not be in the state assumed.
+                    if action is not None and (ACTION_PINS[action] != status.pins or
+                                               not zone.gpio_controller.written):
+                        status.pins = ACTION_PINS[action]
+                        changes.append((zone.gpio_controller, status.pins))
+                    if cycle_changed:
+                        zone.last_update_time = now
+            deadline = zone.next_check(self.cycle_time)
+            if deadline is not None and deadline > now:
+                heapq.heappush(self.deadlines, (deadline, name))
+        if changes:
+            future = self.executor.submit(_set_pins, changes)
+            future.add_done_callback(self._log_io_failure)
+        if due:
+            self._persist()
+        return len(due)
+
+    def seconds_until_next_check(self, now: float = None):
+        """Seconds until a zone needs evaluating without input, None if none does."""
+        if self.dirty:
+            return 0
+        if not self.deadlines:
+            return None
+        return max(self.deadlines[0][0] - (time.time() if now is None else now), 0)
+
+    def update_history(self, now: float = None):
+        """Adds a point with every zone's average temperature, target and pins to its history."""
+        if now is None:
+            now = time.time()
+        for zone in self.zones.values():
+            zone.history.append(now, zone.status.average_temp, zone.status.target_temp,
+                                pins_to_mask(zone.status.pins))
+
+    def get_status(self, name: str) -> dict:
+        """Status of zone `name`. Raises KeyError for unknown zones."""
+        return self.zones[name].as_dict()
+
+    def get_statuses(self) -> dict:
+        """Status of every zone by name."""
+        return {name: zone.as_dict() for name, zone in self.zones.items()}
+
+    def get_history(self, name: str, since: float, until: float = None,
+                    max_points: int = None) -> list:
+        """
+        History points of zone `name` like `Controller.get_history`.
+        Raises KeyError for unknown zones.
+        """
+        points = self.zones[name].history.points(since, until)
+        if max_points is not None:
+            points = downsample(points, max_points)
+        return points
+
+    def close(self):
+        """
+        Switches the zones' relays off, ends their cycles in the stats and
+        writes pending state. Call it once the GPIO thread is shut down.
+        """
+        for zone in self.zones.values():
+            zone.gpio_controller.close()
+        if self.writer is not None:
+            self.writer.close()
+
+    def _configure_sensors(self, zone: Zone):
+        settings = self.sensor_settings
+        if settings is not None:
+            zone.sensors.configure(settings.aggregation, settings.weights, settings.rooms,
+                                   settings.trim_fraction, settings.conditioning())
+
+    def _persist(self):
+        if self.writer is None:
+            return
+        self.writer.submit(to_json({name: zone.status.as_dict(ephemeral=False)
+                                    for name, zone in self.zones.items()}))
+
+    def _load(self) -> dict:
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.loads(file.read())
+        except FileNotFoundError:
+            return {}
+        # pylint: disable=W0718
+        except Exception as e:
+            self.log.warning("Ignoring unreadable %s: %s", self.path, e)
+            return {}
+
+    def _log_io_failure(self, future):
+        if future.exception() is not None:
+            self.log.critical("GPIO write of zones failed with: %s", future.exception())
+
+
+def _set_pins(changes: list):
+    """Writes the pins of several zones. Runs on the GPIO thread."""
+    for gpio_controller, pins in changes:
+        gpio_controller.set_pins(*pins)
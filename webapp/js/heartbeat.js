@@ -2,10 +2,18 @@ var xhr = new XMLHttpRequest()
 xhr.responseType=''
 
 var restURL = "//" + window.location.host + ":8000/"
-var heartbeat = setInterval(getStatus, 2000)
+var heartbeat = undefined
+var currentStatus = undefined
 var historyHeartBeat = setInterval(getHistory, 120000)
 var chart = undefined
 
+// The chart shows the last day. After the first full (downsampled) download
+// only points newer than `historyLatest` are fetched and appended.
+var HISTORY_SPAN_SECONDS = 24 * 60 * 60
+var HISTORY_MAX_POINTS = 500
+var historyPoints = []
+var historyLatest = undefined
+
 var grafana_iframe = document.getElementById("grafana-embed-iframe")
 var grafana_content = document.getElementById("grafana-embed")
 var history_graph_content = document.getElementById("history-chart")
@@ -29,6 +37,62 @@ fetch('config.json')
 
 getStatus()
 getHistory()
+startStatusStream()
+
+// Receives status changes pushed by the daemon. Falls back to polling every
+// 2 seconds while the stream is unavailable.
+function startStatusStream() {
+  if (!window.EventSource) {
+    startPolling()
+    return
+  }
+  let source = new EventSource(restURL + "events")
+  source.addEventListener("snapshot", (event) => {
+    stopPolling()
+    currentStatus = JSON.parse(event.data)
+    processStatus(currentStatus)
+  })
+  source.addEventListener("diff", (event) => {
+    if (currentStatus) {
+      currentStatus = applyMergePatch(currentStatus, JSON.parse(event.data))
+      processStatus(currentStatus)
+    }
+  })
+  source.onerror = () => {
+    startPolling()
+  }
+}
+
+function startPolling() {
+  if (heartbeat === undefined) {
+    heartbeat = setInterval(getStatus, 2000)
+  }
+}
+
+function stopPolling() {
+  if (heartbeat !== undefined) {
+    clearInterval(heartbeat)
+    heartbeat = undefined
+  }
+}
+
+// Applies a JSON Merge Patch (RFC 7386) to `target`.
+function applyMergePatch(target, patch) {
+  if (patch === null || typeof patch !== "object" || Array.isArray(patch)) {
+    return patch
+  }
+  if (target === null || typeof target !== "object" || Array.isArray(target)) {
+    target = {}
+  }
+  for (let key in patch) {
+    if (patch[key] === null) {
+      delete target[key]
+    } else {
+      target[key] = applyMergePatch(target[key], patch[key])
+    }
+  }
+  return target
+}
 
 function getStatus() {
   xhr.onreadystatechange=(event)=>{
@@ -40,8 +104,7 @@ function getStatus() {
       if (status) {
         processStatus(status)
       } else if (history) {
-        console.log(history)
-        processHistory(history)
+        processHistory(history, jsonResp["latest"])
       }
      }
   }
@@ -56,7 +119,13 @@ function getHistory() {
     console.log("Refreshing embedded graph")
     grafana_iframe.src = grafana_iframe.src
   } else {
-    xhr.open("GET", restURL + "history")
+    let url = restURL + "history?max_points=" + HISTORY_MAX_POINTS
+    if (historyLatest !== undefined && historyPoints.length < 2 * HISTORY_MAX_POINTS) {
+      url = restURL + "history?since=" + (historyLatest + 1)
+    } else {
+      historyPoints = []
+    }
+    xhr.open("GET", url)
     xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest')
     xhr.setRequestHeader('Access-Control-Allow-Origin', '*')
     xhr.send()
@@ -181,19 +250,32 @@ function processStatus(status) {
 
 }
 
-function processHistory(history) {
+function processHistory(history, latest) {
   const ctx = document.getElementById('history-graph');
 
+  // item: [timestamp, temperature, target, pins, min, max]
+  historyPoints = historyPoints.concat(history)
+  if (latest !== undefined && latest !== null) {
+    historyLatest = latest
+  }
+  let oldest = Date.now() / 1000 - HISTORY_SPAN_SECONDS
+  while (historyPoints.length && historyPoints[0][0] < oldest) {
+    historyPoints.shift()
+  }
+
   graphx = []
   graphy = []
 
-  history.forEach((item) => {
-    graphx.push(item[0])
+  historyPoints.forEach((item) => {
+    graphx.push(new Date(item[0] * 1000).toLocaleString())
     graphy.push(item[1])
   })
 
   if (chart) {
-    chart.destroy()
+    chart.data.labels = graphx
+    chart.data.datasets[0].data = graphy
+    chart.update('none')
+    return
   }
 
   chart = new Chart(ctx, {
@@ -217,4 +299,3 @@ function processHistory(history) {
     }
   })
 }
-